@@ -1,64 +1,173 @@
+import time
+_import_started = time.time()
+
 import io
-import zipfile
-from dataclasses import asdict
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-from csvReader import load_ratings_csv
-from stats import get_rating_data, get_obscurity_data
 import os
-import time
+import hmac
+import sys
+import tempfile
+import threading
+from typing import IO, Any, Callable, Dict, Optional
+from flask import Flask, Response, request, jsonify, stream_with_context
+from flask_cors import CORS
 from dotenv import load_dotenv
-from publicMovieData import log_stats  # Import the stats logging function
 
-# Load environment variables from .env file
+# Load environment variables from .env file; the modules below read their settings when imported
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
 
+from health import HealthMonitor, HEALTH_PROBE_INTERVAL  # noqa: E402
+import metrics  # noqa: E402
+from uploadPipeline import describe_error, open_export, parse_list_size, process_export  # noqa: E402
+from jobs import create_job_queue, JOB_POLL_INTERVAL, JOB_QUEUE, DONE, FAILED  # noqa: E402
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
 # Validate TMDB API key at startup
-try:
-    from publicMovieData import TMDB_API_KEY
-    if not TMDB_API_KEY:
-        app.logger.warning("TMDB_API_KEY is not set. Movie data features will not work properly.")
-except Exception as e:
-    app.logger.error(f"Failed to load TMDB configuration: {e}")
-    
-# Validate MongoDB connection at startup
-try:
-    from database import MovieDatabase
-    db = MovieDatabase()
-    if db.client:
-        app.logger.info("MongoDB connection successful")
-    else:
-        app.logger.warning("MongoDB connection failed. Some features may not work properly.")
-except Exception as e:
-    app.logger.error(f"Failed to initialize MongoDB: {e}")
-    
+if not os.getenv("TMDB_API_KEY"):
+    app.logger.warning("TMDB_API_KEY is not set. Movie data features will not work properly.")
+
+# pandas, the MongoDB connection and the catalog are loaded by the warm-up below rather
+# than at import, so workers start accepting health checks straight away
+health = HealthMonitor(started_at=_import_started)
+PRELOADING = os.getenv("GUNICORN_PRELOAD", "false").lower() == "true"
+
+# Largest accepted upload, in bytes
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+
+# Uploads held in memory up to this size while spooling; larger ones go to a temporary file
+UPLOAD_SPOOL_MEMORY_BYTES = 512 * 1024
+
+# Chunk size used when copying a non-seekable upload stream
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+# Serve Prometheus metrics at /metrics; off by default since they describe the deployment
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+
+# When set, /metrics also requires an "Authorization: Bearer <METRICS_TOKEN>" header
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Seconds between keep-alive comments on an idle job event stream
+JOB_EVENTS_KEEPALIVE = 15
+
+# Seconds an event stream is held open before the client is asked to reconnect, so that
+# a slow job does not tie up a server thread for its whole run
+JOB_EVENTS_MAX_SECONDS = float(os.getenv("JOB_EVENTS_MAX_SECONDS", "60"))
+
+# Werkzeug rejects bodies over this while streaming them, whether or not Content-Length is
+# sent; the slack covers the multipart boundaries and headers around the file
+app.config["MAX_CONTENT_LENGTH"] = UPLOAD_MAX_BYTES + 64 * 1024
+
+def run_upload_job(payload: bytes, progress: Callable[[int, int, Dict[str, Any]], None],
+                   list_size: Optional[int] = None) -> Dict[str, Any]:
+    """Job handler: analyze an upload queued by `POST /api/upload?async=1`"""
+    return process_export(io.BytesIO(payload), progress, list_size).response
+
+job_queue = create_job_queue(run_upload_job, describe_error)
+
 # Preload cache to speed up subsequent requests
-def preload_cache():
+def preload_cache() -> bool:
     """Preload movie cache to speed up requests"""
     try:
         app.logger.info("Preloading movie cache...")
         start_time = time.time()
-        from publicMovieData import load_cache
+        from publicMovieData import load_cache, has_snapshot, catalog
+        if has_snapshot():
+            if PRELOADING:
+                # Reconcile in the master before forking so every worker inherits a current catalog
+                catalog.sync(force=True)
+                app.logger.info(f"Started from catalog snapshot with {len(catalog)} movies")
+                return True
+            # Serve from the local snapshot right away and catch up with MongoDB in the background
+            catalog.reconcile_in_background()
+            app.logger.info(f"Started from catalog snapshot with {len(catalog)} movies; reconciling in background")
+            return True
+        if PRELOADING:
+            # Flat arrays survive copy-on-write across gunicorn workers; per-movie objects do not
+            count = catalog.load_frozen()
+            elapsed = time.time() - start_time
+            app.logger.info(f"Preloaded {count} movies into a frozen catalog in {elapsed:.2f} seconds")
+            return True
         cache = load_cache()
         elapsed = time.time() - start_time
         app.logger.info(f"Preloaded {len(cache)} movies in {elapsed:.2f} seconds")
+        return True
     except Exception as e:
         app.logger.error(f"Failed to preload movie cache: {e}")
+        return False
 
-# Call preload cache immediately to warm up cache during startup
-preload_cache()
-    
-# Validate MongoDB connection at startup
-try:
-    from database import MovieDatabase
-    db = MovieDatabase()
-    if not db.client:
-        app.logger.warning("MongoDB connection failed. Using JSON files as fallback.")
-except Exception as e:
-    app.logger.error(f"Failed to initialize MongoDB: {e}")
+def warm_up(wait_for_mongodb: bool = True) -> None:
+    """
+    Import the data layer and warm the catalog, then mark the app ready.
+
+    Args:
+        wait_for_mongodb: Keep probing until MongoDB is reachable instead of giving up
+    """
+    try:
+        import publicMovieData  # Connects to MongoDB and opens the local snapshot, if any
+        import stats  # noqa: F401 -- pulls in pandas/numpy before the first upload needs them
+    except Exception as e:
+        app.logger.error(f"Failed to load the movie data layer: {e}")
+        health.mark_failed(e)
+        return
+
+    # A snapshot can serve lookups without MongoDB; a full load cannot
+    while not publicMovieData.has_snapshot() and not health.probe():
+        if not wait_for_mongodb:
+            health.mark_failed(ConnectionError("MongoDB is unreachable"))
+            return
+        app.logger.warning(f"MongoDB unreachable; retrying catalog warm-up in {HEALTH_PROBE_INTERVAL:.0f}s")
+        time.sleep(HEALTH_PROBE_INTERVAL)
+
+    if preload_cache():
+        health.mark_ready()
+        if JOB_QUEUE == "mongo" and not PRELOADING:
+            # Take jobs submitted to any replica; preloaded workers start theirs after the fork
+            job_queue.start()
+        from titleIndex import TITLE_INDEX_ENABLED
+        if TITLE_INDEX_ENABLED and not PRELOADING:
+            # Built in the background after readiness; preloaded workers build their own after the fork
+            publicMovieData.title_index.load_in_background()
+    else:
+        health.mark_failed(RuntimeError("Catalog preload failed"))
+
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
+
+def start_warm_up() -> None:
+    """Warm up in a background thread unless this process is already ready or warming up"""
+    global _warm_up_thread
+    if health.is_ready():
+        return
+    with _warm_up_lock:
+        if _warm_up_thread is not None and _warm_up_thread.is_alive():
+            return
+        _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+        _warm_up_thread.start()
+
+def _reset_warm_up() -> None:
+    global _warm_up_lock, _warm_up_thread
+    _warm_up_lock = threading.Lock()
+    _warm_up_thread = None
+
+os.register_at_fork(after_in_child=_reset_warm_up)
+
+if PRELOADING:
+    # Threads do not survive fork, so warm up in the gunicorn master before the workers are
+    # created; if MongoDB is down, each worker retries in the background instead
+    warm_up(wait_for_mongodb=False)
+else:
+    start_warm_up()
+
+health.record_import()
+
+def _catalog_status() -> dict:
+    """Catalog size without waiting on the data layer if it is still being imported"""
+    module = sys.modules.get("publicMovieData")
+    catalog = getattr(module, "catalog", None)
+    if catalog is None:
+        return {"catalog_loaded": False, "catalog_entries": 0}
+    return {"catalog_loaded": catalog.is_loaded(), "catalog_entries": len(catalog)}
 
 @app.route("/", methods=["GET"])
 def root():
@@ -67,134 +176,173 @@ def root():
     
 @app.route("/api/health", methods=["GET"])
 def health_check():
-    """Health check endpoint to verify API key and database status"""
-    try:
-        from publicMovieData import TMDB_API_KEY
-        
-        # Check MongoDB connection - but don't fail if it's not available
-        mongodb_status = False
-        try:
-            from database import MovieDatabase
-            db = MovieDatabase()
-            # Test connection by pinging
-            if db.client:
-                db.client.admin.command('ping')
-                mongodb_status = True
-        except Exception as e:
-            app.logger.error(f"MongoDB health check failed: {e}")
-        
-        status = {
-            "status": "healthy",
-            "tmdb_configured": bool(TMDB_API_KEY),
-            "mongodb_connected": mongodb_status
-        }
-        return jsonify(status), 200
-    except Exception as e:
-        app.logger.error(f"Configuration error during health check: {e}")
-        return jsonify({
-            "status": "unhealthy", 
-            "error": "Configuration error",
-            "tmdb_configured": False
-        }), 500
+    """Health check endpoint reporting API key and database status from the last background probe"""
+    status = {
+        "status": "healthy",
+        "tmdb_configured": bool(os.getenv("TMDB_API_KEY")),
+        "ready": health.is_ready(),
+    }
+    status.update(health.status())
+    return jsonify(status), 200
+
+@app.route("/api/ready", methods=["GET"])
+def readiness_check():
+    """Readiness endpoint; 503 until the catalog is warm"""
+    start_warm_up()
+    status = {
+        "status": "ready" if health.is_ready() else "warming_up",
+        "import_seconds": health.import_seconds,
+        "ready_seconds": health.ready_seconds,
+        "warmup_error": health.warmup_error,
+    }
+    status.update(_catalog_status())
+    return jsonify(status), 200 if health.is_ready() else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus metrics, aggregated across gunicorn workers"""
+    if not METRICS_ENABLED:
+        return jsonify(error="Not found"), 404
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get("Authorization", "").encode(),
+                                                 f"Bearer {METRICS_TOKEN}".encode()):
+        return jsonify(error="Unauthorized"), 401, {"WWW-Authenticate": "Bearer"}
+    module = sys.modules.get("publicMovieData")
+    if getattr(module, "catalog", None) is not None:
+        metrics.observe_catalog(module.catalog)
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.errorhandler(413)
+def upload_too_large(error):
+    return jsonify(error=f"File too large (max {UPLOAD_MAX_BYTES // (1024 * 1024)}MB)"), 413
+
+def _spool_upload(upload) -> Optional[IO[bytes]]:
+    """
+    Get a seekable file holding an uploaded file without reading it into memory.
+
+    Werkzeug already spools multipart files larger than 500KB to a temporary file, so
+    its stream is normally used as is; anything else is copied in chunks into a
+    SpooledTemporaryFile, stopping as soon as the size limit is exceeded.
+
+    Returns:
+        The file positioned at the start, or None if it is larger than UPLOAD_MAX_BYTES
+    """
+    stream = upload.stream
+    if not stream.seekable():
+        spooled = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MEMORY_BYTES)
+        size = 0
+        while True:
+            chunk = stream.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > UPLOAD_MAX_BYTES:
+                spooled.close()
+                return None
+            spooled.write(chunk)
+        stream = spooled
+
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(0)
+    return stream if size <= UPLOAD_MAX_BYTES else None
 
 @app.route("/api/upload", methods=["POST"])
 def upload_and_stats():
+    # Security: Reject oversized uploads before reading any of the body
+    if request.content_length is not None and request.content_length > app.config["MAX_CONTENT_LENGTH"]:
+        return upload_too_large(None)
+
     if 'zip' not in request.files:
         return jsonify(error="No file part"), 400
     zip_file = request.files['zip']
     if zip_file.filename == "":
         return jsonify(error="No file selected"), 400
     
-    # Security: Check file size (10MB limit)
-    if len(zip_file.read()) > 10 * 1024 * 1024:
-        return jsonify(error="File too large (max 10MB)"), 413
-    zip_file.seek(0)  # Reset file pointer after reading
-    
     # Security: Validate file extension
     if not zip_file.filename.lower().endswith('.zip'):
         return jsonify(error="Only ZIP files are allowed"), 400
     
+    # Security: Check file size
+    upload = _spool_upload(zip_file)
+    if upload is None:
+        return upload_too_large(None)
+    
     try:
-        zip_contents = zipfile.ZipFile(io.BytesIO(zip_file.read()))
-        
-        # Security: Check for zip bombs and directory traversal
-        total_extracted_size = 0
-        for file_info in zip_contents.infolist():
-            # Check for directory traversal attacks
-            if '..' in file_info.filename or file_info.filename.startswith('/'):
-                return jsonify(error="Invalid file path in ZIP"), 400
-            
-            # Check for zip bombs (files that expand too much)
-            total_extracted_size += file_info.file_size
-            if total_extracted_size > 100 * 1024 * 1024:  # 100MB limit
-                return jsonify(error="ZIP contents too large"), 400
-
-        # Find the ratings.csv file within the uploaded ZIP archive
-        # Letterboxd exports contain a ratings.csv file that we need to process
-        ratings_csv_filename = None
-        for filename in zip_contents.namelist():
-            if filename.lower().endswith("ratings.csv"):
-                ratings_csv_filename = filename
-                break
-        
-        if ratings_csv_filename is None:
-            return jsonify(error="ratings.csv not found in ZIP archive"), 400
-
-        with zip_contents.open(ratings_csv_filename) as csvfile:
-            ratings_data = load_ratings_csv(csvfile)
-        
-        # Security: Limit the number of movies processed to prevent API abuse
-        if len(ratings_data) > 1000:
-            return jsonify(error="Too many movies to process (max 1000)"), 413
-
-        # Calculate processing time
-        start_time = time.time()
-        
-        # Calculate statistics
-        avg_rating_diff, underrated_list, overrated_list = get_rating_data(ratings_data)
-        obscurity_score, most_obscure_list, least_obscure_list = get_obscurity_data(ratings_data)
-        
-        # Log timing and data source statistics
-        elapsed = time.time() - start_time
-        app.logger.info(f"Processed {len(ratings_data)} movies in {elapsed:.2f} seconds")
-        
-        # Log movie data source statistics
-        log_stats()
-
-        # Convert movie dataclasses to JSON-serializable dictionaries and
-        # Build the response object for the frontend
-        response = {
-            "rating_stats": {
-                "average_rating_difference": avg_rating_diff,
-                "underrated_movies": [asdict(movie) for movie in underrated_list],
-                "overrated_movies": [asdict(movie) for movie in overrated_list]
-            },
-            "obscurity_stats": {
-                "obscurity_score": obscurity_score,
-                "most_obscure_movies": [asdict(movie) for movie in most_obscure_list],
-                "least_obscure_movies": [asdict(movie) for movie in least_obscure_list]
-            }
-        }
-
-        return jsonify(response)
-
-    except zipfile.BadZipFile:
-        return jsonify(error="Invalid ZIP file"), 400
-    except ValueError as e:
-        error_message = str(e)
-        app.logger.warning(f"Validation error: {error_message}")
-        
-        # Provide specific error messages for known issues
-        if "TMDB_API_KEY is not set" in error_message:
-            return jsonify(error="Movie database service is temporarily unavailable. Please try again later."), 503
-        elif "not found" in error_message.lower() or "invalid" in error_message.lower():
-            return jsonify(error="Invalid file format"), 400
+        # Movies per list, e.g. ?list_size=50 for a "see more" view
+        list_size = parse_list_size(request.args.get("list_size", request.form.get("list_size")))
+
+        if request.args.get("async", "").lower() in ("1", "true"):
+            # Reject broken archives now rather than from the job
+            open_export(upload)
+            upload.seek(0)
+            job_id = job_queue.submit(upload.read(), {"list_size": list_size})
+            return jsonify(
+                job_id=job_id,
+                status_url=f"/api/jobs/{job_id}",
+                events_url=f"/api/jobs/{job_id}/events"
+            ), 202
+
+        result = process_export(upload, list_size=list_size)
+        if result.etag is not None and result.etag in request.if_none_match:
+            # The client already holds this result
+            response = Response(status=304)
         else:
-            return jsonify(error="Error processing file data"), 400
+            response = jsonify(result.response)
+        if result.etag is not None:
+            response.set_etag(result.etag)
+        response.headers["X-Result-Cache"] = "hit" if result.cached else "miss"
+        return response
+
     except Exception as e:
-        # Log the full error internally but don't expose details
-        app.logger.exception(f"Unexpected error processing upload: {str(e)}")
-        return jsonify(error="Server error while processing file"), 500
+        # describe_error logs the full error internally but doesn't expose details
+        message, status = describe_error(e)
+        return jsonify(error=message), status
+    finally:
+        upload.close()
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """Status, progress and the partial or final result of an upload job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    return jsonify(job)
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """
+    Server-Sent Events stream of an upload job's state; ends once the job is done or failed.
+    Streams are closed after JOB_EVENTS_MAX_SECONDS and EventSource clients reconnect
+    on their own, receiving the current state first.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+
+    def stream():
+        last_state = None
+        last_sent = 0.0
+        current = job
+        deadline = time.time() + JOB_EVENTS_MAX_SECONDS
+        yield f"retry: {int(JOB_POLL_INTERVAL * 1000)}\n\n"
+        while current is not None:
+            state = (current["status"], current["progress"]["resolved"], current["progress"]["total"])
+            if state != last_state:
+                event = current["status"] if current["status"] in (DONE, FAILED) else "progress"
+                yield f"event: {event}\ndata: {app.json.dumps(current)}\n\n"
+                last_state = state
+                last_sent = time.time()
+                if current["status"] in (DONE, FAILED):
+                    return
+            elif time.time() - last_sent >= JOB_EVENTS_KEEPALIVE:
+                yield ": keep-alive\n\n"
+                last_sent = time.time()
+            if time.time() >= deadline:
+                return
+            time.sleep(JOB_POLL_INTERVAL)
+            current = job_queue.get(job_id)
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 if __name__ == "__main__":
@@ -0,0 +1,65 @@
+"""
+Benchmark the streaming and pandas ratings.csv readers on a large synthetic export
+
+    python benchmark_ratings_reader.py --rows 100000
+"""
+import argparse
+import io
+import random
+import time
+import tracemalloc
+import zipfile
+
+from csvReader import RATINGS_COLUMNS, iter_ratings, load_ratings_csv
+
+def build_export(rows: int) -> bytes:
+    """Build a Letterboxd-style ZIP whose ratings.csv has `rows` rows"""
+    lines = ["Date,Name,Year,Letterboxd URI,Rating"]
+    for i in range(rows):
+        lines.append(f"2024-01-{i % 28 + 1:02d},\"Film Number {i}, Part {i % 7}\",{1950 + i % 75},"
+                     f"https://boxd.it/{i:x},{random.randint(1, 10) / 2}")
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("ratings.csv", "\n".join(lines) + "\n")
+    return buffer.getvalue()
+
+def measure(name: str, export: bytes, read) -> None:
+    """Time one reader, then run it again under tracemalloc for its peak Python heap allocation"""
+    def run() -> int:
+        with zipfile.ZipFile(io.BytesIO(export)) as archive, archive.open("ratings.csv") as csvfile:
+            return read(csvfile)
+
+    # Timed separately: tracemalloc slows allocation-heavy code far more than native code
+    start_time = time.perf_counter()
+    count = run()
+    elapsed = time.perf_counter() - start_time
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<8} {count:>9} rows  {elapsed * 1000:>9.1f}ms  {count / elapsed:>12,.0f} rows/s  "
+          f"peak {peak / (1024 * 1024):>7.1f}MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ratings.csv readers")
+    parser.add_argument("--rows", type=int, default=100000, help="Rows in the synthetic export")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per reader")
+    args = parser.parse_args()
+
+    export = build_export(args.rows)
+    print(f"Synthetic export: {args.rows} rows, {len(export) / (1024 * 1024):.1f}MB zipped")
+
+    # Import pandas before timing so its import cost is reported once rather than
+    # counted against the first run (csvReader itself only imports it on demand)
+    start_time = time.perf_counter()
+    import pandas  # noqa: F401
+    print(f"pandas import: {(time.perf_counter() - start_time) * 1000:.0f}ms")
+
+    for _ in range(args.repeat):
+        measure("stream", export, lambda csvfile: len(list(iter_ratings(csvfile))))
+        # Note: tracemalloc only partly sees pandas' native buffers, so its peak is an underestimate
+        measure("pandas", export, lambda csvfile: len(load_ratings_csv(csvfile, columns=RATINGS_COLUMNS)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,541 @@
+"""
+Long-lived in-process movie catalog for MeterBoxd
+"""
+import os
+import sys
+import threading
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-catalog")
+
+# Minimum number of seconds between two incremental syncs with MongoDB
+CATALOG_SYNC_INTERVAL = float(os.getenv("CATALOG_SYNC_INTERVAL", "5"))
+
+# Seconds before the watermark that each sync reads again: `updated_at` is set by the
+# writing process before its write commits, so a document can become visible after a
+# sync has already moved the watermark past it
+CATALOG_SYNC_OVERLAP = float(os.getenv("CATALOG_SYNC_OVERLAP", "60"))
+
+# Follow a change stream instead of polling when the deployment supports it (replica sets only)
+CATALOG_CHANGE_STREAM = os.getenv("CATALOG_CHANGE_STREAM", "false").lower() == "true"
+
+# Memory budget of the catalog: maximum number of entries and approximate size in megabytes
+CATALOG_MAX_ENTRIES = int(os.getenv("CATALOG_MAX_ENTRIES", "250000"))
+CATALOG_MAX_MEMORY_MB = float(os.getenv("CATALOG_MAX_MEMORY_MB", "128"))
+
+# Seconds an entry is served before it is dropped and re-read from MongoDB (0 disables expiry)
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", str(6 * 3600)))
+
+POSTER_BASE_URL = "https://image.tmdb.org/t/p/w500"
+
+# Approximate per-entry cost of the OrderedDict slot and the boxed numbers, in bytes
+_ENTRY_OVERHEAD = 200
+
+def overlapped(watermark: Optional[datetime]) -> Optional[datetime]:
+    """Where an incremental sync from `watermark` starts reading (see CATALOG_SYNC_OVERLAP)"""
+    if watermark is None:
+        return None
+    return watermark - timedelta(seconds=CATALOG_SYNC_OVERLAP)
+
+class CatalogEntry:
+    """Compact cached movie holding only the fields the stats read"""
+
+    __slots__ = ("public_rating", "vote_count", "popularity", "poster_path", "expires_at")
+
+    def __init__(self, public_rating: float, vote_count: float, popularity: float,
+                 poster_path: str, expires_at: float = 0.0):
+        self.public_rating = public_rating
+        self.vote_count = vote_count
+        self.popularity = popularity
+        self.poster_path = poster_path
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "CatalogEntry":
+        """Build an entry from a movie-data or overrides document"""
+        return cls(
+            document.get("public_rating") or 0.0,
+            document.get("vote_count") or 0,
+            document.get("popularity") or 0,
+            document.get("poster_path") or "",
+        )
+
+    @property
+    def poster_url(self) -> str:
+        return f"{POSTER_BASE_URL}{self.poster_path}" if self.poster_path else ""
+
+    def as_tuple(self) -> Tuple[float, float, float, str]:
+        """(public_rating, vote_count, popularity, poster_url)"""
+        return self.public_rating, self.vote_count, self.popularity, self.poster_url
+
+    def get(self, field: str, default: Any = None) -> Any:
+        """Dict-style access kept for callers written against raw documents"""
+        return getattr(self, field) if field in self.__slots__ else default
+
+    def __getitem__(self, field: str) -> Any:
+        if field not in self.__slots__:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CatalogEntry):
+            return NotImplemented
+        return (self.public_rating == other.public_rating and self.vote_count == other.vote_count
+                and self.popularity == other.popularity and self.poster_path == other.poster_path)
+
+    def size(self, key: str) -> int:
+        """Approximate memory held by this entry and its key, in bytes"""
+        return sys.getsizeof(self) + sys.getsizeof(key) + sys.getsizeof(self.poster_path) + _ENTRY_OVERHEAD
+
+class MovieCatalog:
+    """
+    Bounded in-process cache of the movie-data and overrides collections.
+
+    The catalog is loaded from MongoDB once and then kept current by reading only
+    the documents whose `updated_at` is newer than the last sync (the watermark,
+    less CATALOG_SYNC_OVERLAP for writes that commit late), or by following a change stream where one is available. Overrides take
+    precedence over movie documents with the same key.
+
+    Entries are compact `CatalogEntry` objects. The catalog holds at most
+    CATALOG_MAX_ENTRIES entries and roughly CATALOG_MAX_MEMORY_MB of memory,
+    evicting the least recently used entries first, and drops entries older than
+    CATALOG_TTL so they are re-read from MongoDB on their next lookup.
+    """
+
+    def __init__(self, database, sync_interval: float = CATALOG_SYNC_INTERVAL,
+                 max_entries: int = CATALOG_MAX_ENTRIES, max_memory_mb: float = CATALOG_MAX_MEMORY_MB,
+                 ttl: float = CATALOG_TTL):
+        self._db = database
+        self._sync_interval = sync_interval
+        self._max_entries = max_entries
+        self._max_bytes = int(max_memory_mb * 1024 * 1024)
+        self._ttl = ttl
+        self._entries: "OrderedDict[str, CatalogEntry]" = OrderedDict()
+        self._bytes = 0
+        self._override_keys: set = set()
+        self._movie_watermark: Optional[datetime] = None
+        self._override_watermark: Optional[datetime] = None
+        self._loaded = False
+        self._last_sync = 0.0
+        self._lock = threading.RLock()
+        # Held for the duration of a full load so concurrent syncs do not start a second one
+        self._load_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        # Read-only snapshot consulted when the LRU misses (see snapshot.py)
+        self._base = None
+        # Number of LRU entries whose key is not also in the snapshot
+        self._unshadowed = 0
+        # Bumped on every change so derived views (e.g. the columnar frame) can be rebuilt lazily
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.base_hits = 0
+        # Locks and threads do not survive fork; give each worker its own
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._watcher = None
+
+    def is_loaded(self) -> bool:
+        """True once the catalog holds a full load or a snapshot"""
+        return self._loaded
+
+    def attach_snapshot(self, snapshot) -> None:
+        """
+        Serve lookups from a local snapshot instead of a full load from MongoDB.
+        The watermarks are taken from the snapshot, so the next sync only reads
+        documents changed since the snapshot was taken.
+
+        Note that the snapshot is not updated in place: changes are applied to the
+        LRU, and a changed entry later evicted from it falls back to the snapshot's
+        value until the snapshot is refreshed (`python snapshot.py refresh`).
+        """
+        movie_watermark, override_watermark = snapshot.watermarks()
+        override_keys = set(snapshot.override_keys())
+        with self._lock:
+            self._base = snapshot
+            self._entries = OrderedDict()
+            self._bytes = 0
+            self._unshadowed = 0
+            self._override_keys = override_keys
+            self._movie_watermark = movie_watermark
+            self._override_watermark = override_watermark
+            self._loaded = True
+            # Force the first sync to reconcile with MongoDB
+            self._last_sync = 0.0
+            self.version += 1
+
+    def load_frozen(self) -> int:
+        """
+        Load the full collections into an in-memory snapshot used as the read-only base.
+        Meant for the gunicorn master in preload mode: the flat arrays are inherited by
+        every worker and stay shared copy-on-write, unlike millions of per-movie objects.
+
+        Returns:
+            Number of movies in the catalog
+        """
+        from snapshot import CatalogSnapshot, merge_documents, max_updated_at
+
+        start_time = time.time()
+        movies = self._db.get_movies_updated_since(None)
+        overrides = self._db.get_overrides_updated_since(None)
+        documents: Dict[str, Dict[str, Any]] = {}
+        merge_documents(documents, movies, overrides)
+        snapshot = CatalogSnapshot.from_documents(documents, max_updated_at(movies), max_updated_at(overrides))
+        del documents, movies, overrides
+        self.attach_snapshot(snapshot)
+        # Already current with MongoDB; no need to reconcile immediately
+        self._last_sync = time.time()
+
+        elapsed = time.time() - start_time
+        logger.info(f"Loaded {len(snapshot)} movies into a frozen catalog in {elapsed:.2f} seconds")
+        return len(snapshot)
+
+    def reconcile_in_background(self) -> threading.Thread:
+        """Sync with MongoDB in a background thread (used after attaching a snapshot)"""
+        def reconcile():
+            try:
+                self.sync(force=True)
+            except Exception as e:
+                logger.error(f"Background catalog reconcile failed: {e}")
+        thread = threading.Thread(target=reconcile, name="catalog-reconcile", daemon=True)
+        thread.start()
+        return thread
+
+    def load(self) -> int:
+        """
+        Load the full collections (up to the memory budget) and reset the watermarks.
+
+        Returns:
+            Number of movies in the catalog
+        """
+        start_time = time.time()
+        movies = self._db.get_movies_updated_since(None)
+        overrides = self._db.get_overrides_updated_since(None)
+
+        with self._lock:
+            evictions_before = self.evictions
+            self._entries = OrderedDict()
+            self._bytes = 0
+            self._unshadowed = 0
+            self._override_keys = {override["title_with_year"] for override in overrides
+                                   if override.get("title_with_year")}
+            for movie in movies:
+                key = movie.get("title_with_year")
+                if key and key not in self._override_keys:
+                    self._store(key, CatalogEntry.from_document(movie))
+            for override in overrides:
+                key = override.get("title_with_year")
+                if key:
+                    self._store(key, CatalogEntry.from_document(override))
+            self._movie_watermark = self._max_updated_at(None, movies)
+            self._override_watermark = self._max_updated_at(None, overrides)
+            self._loaded = True
+            self._last_sync = time.time()
+            self.version += 1
+            count = len(self._entries)
+            evicted = self.evictions - evictions_before
+
+        elapsed = time.time() - start_time
+        logger.info(f"Loaded {count} movies from MongoDB in {elapsed:.2f} seconds "
+                    f"(~{self._bytes / (1024 * 1024):.1f}MB, {evicted} left out to fit the budget)")
+        return count
+
+    def sync(self, force: bool = False) -> int:
+        """
+        Bring the catalog up to date with MongoDB.
+
+        The first call performs a full load; later calls only read documents changed
+        since the watermark, and are skipped if the last sync was less than the sync
+        interval ago or a change stream is keeping the catalog current.
+
+        Args:
+            force: Sync even if the sync interval has not elapsed
+
+        Returns:
+            Number of documents applied
+        """
+        if not self._loaded:
+            # While another thread (e.g. the startup warm-up) is loading, don't wait for it:
+            # lookups fall through to MongoDB until the catalog is warm
+            if not self._load_lock.acquire(blocking=False):
+                return 0
+            try:
+                return 0 if self._loaded else self.load()
+            finally:
+                self._load_lock.release()
+        if self._watcher is not None and self._watcher.is_alive():
+            return 0
+        if not force and time.time() - self._last_sync < self._sync_interval:
+            return 0
+
+        start_time = time.time()
+        movies = self._db.get_movies_updated_since(overlapped(self._movie_watermark))
+        overrides = self._db.get_overrides_updated_since(overlapped(self._override_watermark))
+
+        # Documents within the overlap are seen again; only count the ones that actually
+        # differ from what is already held
+        changed = 0
+        with self._lock:
+            for movie in movies:
+                key = movie.get("title_with_year")
+                if key and key not in self._override_keys:
+                    entry = CatalogEntry.from_document(movie)
+                    if self._peek(key) != entry:
+                        self._store(key, entry)
+                        changed += 1
+            for override in overrides:
+                key = override.get("title_with_year")
+                if key:
+                    self._override_keys.add(key)
+                    entry = CatalogEntry.from_document(override)
+                    if self._peek(key) != entry:
+                        self._store(key, entry)
+                        changed += 1
+            self._movie_watermark = self._max_updated_at(self._movie_watermark, movies)
+            self._override_watermark = self._max_updated_at(self._override_watermark, overrides)
+            self._last_sync = time.time()
+            if changed:
+                self.version += 1
+
+        if changed:
+            elapsed = time.time() - start_time
+            logger.info(f"Synced {changed} changed documents in {elapsed*1000:.1f}ms")
+        return changed
+
+    def start_change_stream(self) -> bool:
+        """
+        Follow the movie-data and overrides change streams in a background thread.
+
+        Returns:
+            True if the watcher was started, False if change streams are unavailable
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return True
+        try:
+            # Opening the streams fails fast on standalone servers, which lack an oplog
+            movie_stream = self._db.movies_collection.watch(full_document="updateLookup")
+            override_stream = self._db.overrides_collection.watch(full_document="updateLookup")
+        except Exception as e:
+            logger.warning(f"Change streams unavailable, falling back to watermark polling: {e}")
+            return False
+
+        # Catch up on anything written before the streams were opened
+        self.sync(force=True)
+        self._watcher = threading.Thread(
+            target=self._follow_streams, args=(movie_stream, override_stream),
+            name="catalog-change-stream", daemon=True
+        )
+        self._watcher.start()
+        logger.info("Following movie catalog change streams")
+        return True
+
+    def _follow_streams(self, movie_stream, override_stream) -> None:
+        """Apply change stream events until either stream fails"""
+        try:
+            while True:
+                applied = False
+                for stream, is_override in ((movie_stream, False), (override_stream, True)):
+                    change = stream.try_next()
+                    while change is not None:
+                        document = change.get("fullDocument")
+                        if document and document.get("title_with_year"):
+                            self._apply(document, is_override)
+                            applied = True
+                        change = stream.try_next()
+                if not applied:
+                    time.sleep(0.5)
+        except Exception as e:
+            logger.error(f"Catalog change stream stopped, falling back to watermark polling: {e}")
+        finally:
+            movie_stream.close()
+            override_stream.close()
+
+    def _apply(self, document: Dict[str, Any], is_override: bool) -> None:
+        """Apply a single changed document"""
+        key = document["title_with_year"]
+        with self._lock:
+            if is_override:
+                self._override_keys.add(key)
+                self._override_watermark = self._max_updated_at(self._override_watermark, [document])
+            elif key in self._override_keys:
+                return
+            else:
+                self._movie_watermark = self._max_updated_at(self._movie_watermark, [document])
+            self._store(key, CatalogEntry.from_document(document))
+            self.version += 1
+
+    @staticmethod
+    def _max_updated_at(current: Optional[datetime], documents) -> Optional[datetime]:
+        """Highest `updated_at` among the current watermark and the given documents"""
+        for document in documents:
+            updated_at = document.get("updated_at")
+            if isinstance(updated_at, datetime) and (current is None or updated_at > current):
+                current = updated_at
+        return current
+
+    def _peek(self, key: str) -> Optional[CatalogEntry]:
+        """Current entry for a key from the LRU or the snapshot, without touching counters or recency"""
+        entry = self._entries.get(key)
+        if entry is None and self._base is not None:
+            index = self._base.find(key)
+            if index >= 0:
+                entry = CatalogEntry(*self._base.row(index))
+        return entry
+
+    def _store(self, key: str, entry: CatalogEntry) -> None:
+        """Insert or replace an entry as most recently used and evict to stay in budget (lock held)"""
+        if self._ttl > 0:
+            entry.expires_at = time.monotonic() + self._ttl
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.size(key)
+        elif not self._in_base(key):
+            self._unshadowed += 1
+        self._entries[key] = entry
+        self._bytes += entry.size(key)
+        while self._entries and (len(self._entries) > self._max_entries or self._bytes > self._max_bytes):
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size(evicted_key)
+            self._forget(evicted_key)
+            self.evictions += 1
+
+    def _in_base(self, key: str) -> bool:
+        return self._base is not None and self._base.find(key) >= 0
+
+    def _forget(self, key: str) -> None:
+        """Account for a key removed from the LRU (lock held)"""
+        if not self._in_base(key):
+            self._unshadowed -= 1
+
+    def get(self, key: str, default: Optional[CatalogEntry] = None) -> Optional[CatalogEntry]:
+        """Look up an entry, marking it as recently used; expired entries count as misses"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if self._base is not None:
+                    index = self._base.find(key)
+                    if index >= 0:
+                        self.base_hits += 1
+                        self.hits += 1
+                        return CatalogEntry(*self._base.row(index))
+                self.misses += 1
+                return default
+            if self._ttl > 0 and entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= entry.size(key)
+                self._forget(key)
+                self.expirations += 1
+                self.misses += 1
+                self.version += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, CatalogEntry]:
+        """Look up many entries at once; missing and expired keys are left out"""
+        found = {}
+        for key in keys:
+            entry = self.get(key)
+            if entry is not None:
+                found[key] = entry
+        return found
+
+    def put(self, key: str, data: Dict[str, Any], is_override: bool = False) -> None:
+        """Store a document written or read by this process without waiting for the next sync"""
+        with self._lock:
+            if is_override:
+                self._override_keys.add(key)
+            elif key in self._override_keys:
+                return
+            self._store(key, CatalogEntry.from_document(data))
+            self.version += 1
+
+    def clear(self) -> None:
+        """Drop every entry; the next sync performs a full load"""
+        with self._lock:
+            self._base = None
+            self._entries = OrderedDict()
+            self._bytes = 0
+            self._unshadowed = 0
+            self._override_keys = set()
+            self._movie_watermark = None
+            self._override_watermark = None
+            self._loaded = False
+            self.version += 1
+
+    def peek(self, key: str) -> Optional[CatalogEntry]:
+        """The entry held for a key, expired or not, without counting a lookup or marking it as used"""
+        with self._lock:
+            return self._peek(key)
+
+    def counters(self) -> Dict[str, int]:
+        """Hit, miss and eviction counters plus the current size"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self._bytes,
+                "snapshot_entries": len(self._base) if self._base is not None else 0,
+                "hits": self.hits,
+                "snapshot_hits": self.base_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def keys(self) -> List[str]:
+        """Every key held, in the LRU or only in the snapshot"""
+        with self._lock:
+            base = self._base
+            if base is None:
+                return list(self._entries.keys())
+            base_keys = (base.key_at(index) for index in range(len(base)))
+            return list(self._entries.keys()) + [key for key in base_keys if key not in self._entries]
+
+    def items(self) -> List[Tuple[str, CatalogEntry]]:
+        """Every (key, entry) held; a key in both the LRU and the snapshot comes from the LRU"""
+        with self._lock:
+            return list(self._entries.items()) + self._base_items()
+
+    def _base_items(self) -> List[Tuple[str, CatalogEntry]]:
+        """(key, entry) of the snapshot rows not shadowed by the LRU (lock held)"""
+        base = self._base
+        if base is None:
+            return []
+        items = []
+        for index in range(len(base)):
+            key = base.key_at(index)
+            if key not in self._entries:
+                items.append((key, CatalogEntry(*base.row(index))))
+        return items
+
+    def __getitem__(self, key: str) -> CatalogEntry:
+        entry = self._peek(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry
+
+    def __setitem__(self, key: str, data: Dict[str, Any]) -> None:
+        self.put(key, data)
+
+    def __contains__(self, key: str) -> bool:
+        return self._peek(key) is not None
+
+    def __len__(self) -> int:
+        """Number of distinct keys held, counting a key in both the LRU and the snapshot once"""
+        return self._unshadowed + (len(self._base) if self._base is not None else 0)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
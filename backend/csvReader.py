@@ -1,10 +1,138 @@
-import pandas as pd
+import csv
+import io
+from operator import itemgetter
+from typing import IO, TYPE_CHECKING, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
 
-def load_ratings_csv(path: str) -> pd.DataFrame:
-    ratings = pd.read_csv(path)
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Columns of ratings.csv used by the stats (the URI identifies the film for title resolution)
+RATINGS_COLUMNS = ("Name", "Year", "Rating", "Letterboxd URI")
+
+class RatingRecord(NamedTuple):
+    """One row of a Letterboxd ratings export"""
+    name: str
+    year: Optional[int]
+    rating: Optional[float]
+    letterboxd_uri: str
+
+class DiaryRecord(NamedTuple):
+    """One row of a Letterboxd diary (or reviews) export"""
+    name: str
+    year: Optional[int]
+    rating: Optional[float]
+    rewatch: bool
+    watched_date: str
+    letterboxd_uri: str
+
+def _to_int(value: str) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (ValueError, OverflowError):
+        return None
+
+def _to_float(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+def _iter_rows(source: Union[str, IO], columns: Tuple[str, ...]) -> Iterator[Tuple[str, ...]]:
+    """
+    Stream the selected columns of a Letterboxd CSV as tuples of strings.
+
+    Column names are matched after stripping whitespace and a UTF-8 BOM is ignored;
+    columns missing from the file, or from a short row, read as "". Rows without a
+    Name are skipped, so "Name" must be the first selected column.
+    """
+    if isinstance(source, str):
+        with open(source, newline="", encoding="utf-8-sig") as file:
+            yield from _iter_rows(file, columns)
+        return
+    if not isinstance(source, io.TextIOBase):
+        source = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+
+    reader = csv.reader(source)
+    header = [column.strip() for column in next(reader, [])]
+    if "Name" not in header:
+        raise ValueError("Invalid Letterboxd file: 'Name' column not found")
+    width = len(header)
+    # Missing columns point one past the end of the row, where an empty value is appended
+    select = itemgetter(*[header.index(column) if column in header else width for column in columns])
+
+    for row in reader:
+        if len(row) < width:
+            row = row + [""] * (width - len(row))
+        row.append("")
+        values = select(row)
+        if values[0]:
+            yield values
+
+def iter_ratings(source: Union[str, IO]) -> Iterator[RatingRecord]:
+    """
+    Stream a Letterboxd ratings export row by row without pandas.
+
+    Only the Name, Year, Rating and Letterboxd URI columns are read; Year is parsed as
+    an int and Rating as a float, either being None when missing or malformed.
+    Also reads watched.csv and watchlist.csv, whose records have no rating.
+
+    Args:
+        source: Path, text file or binary file (e.g. a ZIP member) of the CSV
+
+    Yields:
+        A `RatingRecord` per row with a title
+    """
+    for name, year, rating, uri in _iter_rows(source, ("Name", "Year", "Rating", "Letterboxd URI")):
+        yield RatingRecord(name, _to_int(year), _to_float(rating), uri)
+
+def iter_diary(source: Union[str, IO]) -> Iterator[DiaryRecord]:
+    """
+    Stream a Letterboxd diary.csv (or reviews.csv, which has the same columns plus the review).
+
+    Args:
+        source: Path, text file or binary file (e.g. a ZIP member) of the CSV
+
+    Yields:
+        A `DiaryRecord` per row with a title
+    """
+    columns = ("Name", "Year", "Rating", "Rewatch", "Watched Date", "Date", "Letterboxd URI")
+    for name, year, rating, rewatch, watched_date, logged_date, uri in _iter_rows(source, columns):
+        # Entries logged without a watched date fall back to the date they were logged
+        yield DiaryRecord(name, _to_int(year), _to_float(rating), rewatch.strip().lower() == "yes",
+                          watched_date or logged_date, uri)
+
+def read_username(source: Union[str, IO]) -> Optional[str]:
+    """The Username from a Letterboxd profile.csv, or None if it has none"""
+    if isinstance(source, str):
+        with open(source, newline="", encoding="utf-8-sig") as file:
+            return read_username(file)
+    if not isinstance(source, io.TextIOBase):
+        source = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    reader = csv.reader(source)
+    header = [column.strip() for column in next(reader, [])]
+    row = next(reader, None)
+    if "Username" not in header or row is None or len(row) <= header.index("Username"):
+        return None
+    return row[header.index("Username")].strip() or None
+
+def load_ratings_csv(path: Union[str, IO[bytes]], columns: Optional[Iterable[str]] = None) -> "pd.DataFrame":
+    """
+    Load a Letterboxd ratings export.
+
+    Args:
+        path: Path or file object of the CSV
+        columns: Only parse these columns (matched after stripping whitespace); all if None
+    """
+    import pandas as pd
+
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        usecols = lambda column: column.strip() in wanted
+    ratings = pd.read_csv(path, usecols=usecols)
     ratings.columns = ratings.columns.str.strip()
     return ratings
 
-def getStats(file_path: str) -> pd.DataFrame:
+def getStats(file_path: str) -> "pd.DataFrame":
     csv_data = load_ratings_csv(file_path)
-    return csv_data
\ No newline at end of file
+    return csv_data
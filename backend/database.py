@@ -2,16 +2,52 @@
 Database connection and operations for MeterBoxd
 """
 import os
-from typing import Dict, List, Optional
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, OperationFailure
 import logging
+from metrics import MongoCommandListener
+from timeutil import utc_now
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("meterboxd-db")
 
+# Fields read by the stats hot path; bulk lookups only fetch these
+LOOKUP_PROJECTION = {
+    "_id": 0,
+    "title_with_year": 1,
+    "public_rating": 1,
+    "vote_count": 1,
+    "popularity": 1,
+    "poster_path": 1,
+    "updated_at": 1,
+}
+
+# Index holding every LOOKUP_PROJECTION field, so bulk lookups and full loads are answered
+# from the index alone without fetching documents (covered queries)
+LOOKUP_INDEX_NAME = "lookup_covering"
+LOOKUP_INDEX_KEYS = [("title_with_year", 1), ("public_rating", 1), ("vote_count", 1),
+                     ("popularity", 1), ("poster_path", 1), ("updated_at", 1)]
+
+# Canonical key schema: one movie document per lookup key and per TMDb movie, and one
+# override per lookup key. Movies without a numeric tmdb_id are left out of its index.
+TITLE_INDEX_OPTIONS = {"name": "title_with_year_1", "unique": True}
+TMDB_ID_INDEX_OPTIONS = {"name": "tmdb_id_1", "unique": True,
+                         "partialFilterExpression": {"tmdb_id": {"$type": "number"}}}
+
+# MongoDB's error code for a unique index violation
+DUPLICATE_KEY_ERROR = 11000
+
+# Maximum number of keys sent in a single `$in` query
+BULK_QUERY_BATCH_SIZE = 1000
+
+# How long to wait for a reachable server before failing, in milliseconds (the driver default is 30s)
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "3000"))
+
 class MovieDatabase:
     """Database access layer for movie data and overrides"""
     
@@ -33,10 +69,19 @@ class MovieDatabase:
         self.db = None
         self.movies_collection = None
         self.overrides_collection = None
+        self.negatives_collection = None
+        self.letterboxd_ids_collection = None
+        # Whether the covering lookup indexes exist and can be hinted
+        self.covered_lookups = False
+        self._uri = None
+        self._db_name = None
         
         # Connect to database
         self.connect(mongodb_uri)
         self._initialized = True
+        
+        # MongoClient is not fork-safe; each gunicorn worker gets a fresh client
+        os.register_at_fork(after_in_child=self._reset_after_fork)
     
     def connect(self, mongodb_uri=None):
         """Connect to MongoDB database"""
@@ -60,16 +105,18 @@ class MovieDatabase:
                     db_name = parts[-1]
             
             logger.info(f"Connecting to MongoDB with database: {db_name}")
-            self.client = MongoClient(uri)
+            self._uri = uri
+            self._db_name = db_name
+            # Timestamps read back timezone-aware, like the ones written (see timeutil.py)
+            self.client = MongoClient(uri, serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                                      tz_aware=True, event_listeners=[MongoCommandListener()])
             
             # Test connection
             self.client.admin.command('ping')
             logger.info("Connected to MongoDB successfully")
             
             # Initialize database and collections
-            self.db = self.client[db_name]
-            self.movies_collection = self.db["movie-data"]  # Use existing collection name
-            self.overrides_collection = self.db["overrides"]  # Will be created if it doesn't exist
+            self._bind_collections()
             
             # Ensure indexes exist
             self._ensure_indexes()
@@ -82,11 +129,56 @@ class MovieDatabase:
             logger.error(f"Database connection error: {e}")
             return False
     
+    def _bind_collections(self):
+        """Point the collection handles at the current client"""
+        self.db = self.client[self._db_name]
+        self.movies_collection = self.db["movie-data"]  # Use existing collection name
+        self.overrides_collection = self.db["overrides"]  # Will be created if it doesn't exist
+        self.negatives_collection = self.db["negative-lookups"]  # Titles TMDb could not resolve
+        self.letterboxd_ids_collection = self.db["letterboxd-ids"]  # Letterboxd film URI -> tmdb_id
+    
+    def _reset_after_fork(self):
+        """Replace the client inherited from the parent process; connects lazily on first use"""
+        if self._uri is None:
+            return
+        try:
+            self.client = MongoClient(self._uri, connect=False, tz_aware=True,
+                                      serverSelectionTimeoutMS=MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                                      event_listeners=[MongoCommandListener()])
+            self._bind_collections()
+        except Exception as e:
+            logger.error(f"Failed to recreate MongoDB client after fork: {e}")
+    
+    def ping(self) -> bool:
+        """
+        Check that MongoDB is reachable, binding the collections if the initial
+        connection failed and the server has come up since.
+
+        Returns:
+            True if the server answered the ping
+        """
+        if self.client is None:
+            return False
+        try:
+            self.client.admin.command('ping')
+        except Exception as e:
+            logger.warning(f"MongoDB ping failed: {e}")
+            return False
+        if self.movies_collection is None:
+            self._bind_collections()
+            self._ensure_indexes()
+            logger.info("Connected to MongoDB successfully")
+        return True
+    
     def _ensure_indexes(self):
         """Create necessary indexes if they don't exist"""
-        self.movies_collection.create_index("title_with_year")
-        self.movies_collection.create_index("tmdb_id")
-        self.overrides_collection.create_index("title_with_year")
+        self.covered_lookups = ensure_canonical_indexes(self.movies_collection, self.overrides_collection)
+        # Finds movies due for a background refresh (see refresher.py)
+        self.movies_collection.create_index("refresh_at")
+        self.negatives_collection.create_index("title_with_year", unique=True)
+        # Let MongoDB remove negative entries once they expire
+        self.negatives_collection.create_index("expires_at", expireAfterSeconds=0)
+        self.letterboxd_ids_collection.create_index("updated_at")
     
     def get_movie(self, title_with_year: str) -> Optional[Dict]:
         """
@@ -120,6 +212,110 @@ class MovieDatabase:
             logger.error(f"Error retrieving override {title_with_year}: {e}")
             return None
     
+    def get_movies_bulk(self, keys: List[str], projection: Optional[Dict] = None) -> Dict[str, Dict]:
+        """
+        Get many movies from database in a constant number of queries
+        
+        Args:
+            keys: Movie keys in format "Title (Year)"
+            projection: Optional projection (defaults to LOOKUP_PROJECTION)
+            
+        Returns:
+            Dictionary of found movies keyed by title_with_year
+        """
+        return self._find_bulk(self.movies_collection, keys, projection, "movies")
+    
+    def get_overrides_bulk(self, keys: List[str], projection: Optional[Dict] = None) -> Dict[str, Dict]:
+        """
+        Get many movie overrides from database in a constant number of queries
+        
+        Args:
+            keys: Movie keys in format "Title (Year)"
+            projection: Optional projection (defaults to LOOKUP_PROJECTION)
+            
+        Returns:
+            Dictionary of found overrides keyed by title_with_year
+        """
+        return self._find_bulk(self.overrides_collection, keys, projection, "overrides")
+    
+    def _find_bulk(self, collection, keys: List[str], projection: Optional[Dict], label: str) -> Dict[str, Dict]:
+        """Run `$in` queries over `keys` in batches of BULK_QUERY_BATCH_SIZE"""
+        found: Dict[str, Dict] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        try:
+            for i in range(0, len(unique_keys), BULK_QUERY_BATCH_SIZE):
+                batch = unique_keys[i:i + BULK_QUERY_BATCH_SIZE]
+                cursor = collection.find(
+                    {"title_with_year": {"$in": batch}},
+                    projection or LOOKUP_PROJECTION
+                )
+                if projection is None and self.covered_lookups:
+                    # Index-only read; the planner may otherwise pick the narrower unique index
+                    cursor = cursor.hint(LOOKUP_INDEX_NAME)
+                for document in cursor:
+                    found[document["title_with_year"]] = document
+            return found
+        except Exception as e:
+            logger.error(f"Error retrieving {len(unique_keys)} {label} in bulk: {e}")
+            return found
+    
+    def get_negatives_bulk(self, keys: List[str]) -> Dict[str, Dict]:
+        """
+        Get unexpired negative lookups (titles TMDb could not resolve) for many keys
+        
+        Args:
+            keys: Movie keys in format "Title (Year)"
+            
+        Returns:
+            Dictionary of negative entries keyed by title_with_year
+        """
+        found: Dict[str, Dict] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        now = utc_now()
+        try:
+            for i in range(0, len(unique_keys), BULK_QUERY_BATCH_SIZE):
+                batch = unique_keys[i:i + BULK_QUERY_BATCH_SIZE]
+                # The TTL monitor only runs periodically, so filter expired entries explicitly
+                cursor = self.negatives_collection.find(
+                    {"title_with_year": {"$in": batch}, "expires_at": {"$gt": now}},
+                    {"_id": 0, "title_with_year": 1, "reason": 1, "expires_at": 1}
+                )
+                for document in cursor:
+                    found[document["title_with_year"]] = document
+            return found
+        except Exception as e:
+            logger.error(f"Error retrieving {len(unique_keys)} negative lookups in bulk: {e}")
+            return found
+    
+    def add_negatives(self, reasons: Dict[str, str], ttl_seconds: float) -> bool:
+        """
+        Record titles TMDb could not resolve so they are not searched again until they expire
+        
+        Args:
+            reasons: Dictionary of movie key to reason ("not_found" or "no_votes")
+            ttl_seconds: Seconds until the entries expire
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not reasons:
+            return True
+        try:
+            now = utc_now()
+            expires_at = now + timedelta(seconds=ttl_seconds)
+            result = self.negatives_collection.bulk_write([
+                UpdateOne(
+                    {"title_with_year": key},
+                    {"$set": {"reason": reason, "created_at": now, "expires_at": expires_at}},
+                    upsert=True
+                )
+                for key, reason in reasons.items()
+            ], ordered=False)
+            return result.acknowledged
+        except Exception as e:
+            logger.error(f"Error saving {len(reasons)} negative lookups: {e}")
+            return False
+    
     def add_or_update_movie(self, title_with_year: str, movie_data: Dict) -> bool:
         """
         Add or update movie in database
@@ -134,19 +330,102 @@ class MovieDatabase:
         try:
             # Ensure title_with_year is part of the data
             movie_data["title_with_year"] = title_with_year
+            # Watermark used by the in-process catalog to sync only changed documents
+            movie_data["updated_at"] = utc_now()
             
             # Use upsert to insert or update
-            result = self.movies_collection.update_one(
-                {"title_with_year": title_with_year}, 
-                {"$set": movie_data},
-                upsert=True
-            )
+            try:
+                result = self.movies_collection.update_one(
+                    {"title_with_year": title_with_year},
+                    {"$set": movie_data},
+                    upsert=True
+                )
+            except DuplicateKeyError:
+                # Two upserts of the same new key race and the loser fails on the unique key; retried,
+                # it updates the winner's document. Failing again, the TMDb movie is stored under another key
+                try:
+                    result = self.movies_collection.update_one(
+                        {"title_with_year": title_with_year},
+                        {"$set": movie_data},
+                        upsert=True
+                    )
+                except DuplicateKeyError:
+                    return self._add_aliases({title_with_year: movie_data})
             
             return result.acknowledged
         except Exception as e:
             logger.error(f"Error saving movie {title_with_year}: {e}")
             return False
     
+    def add_or_update_movies_bulk(self, movies: Dict[str, Dict]) -> bool:
+        """
+        Add or update many movies with a single unordered bulk write
+        
+        Args:
+            movies: Dictionary of movie data keyed by title_with_year
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not movies:
+            return True
+        try:
+            now = utc_now()
+            operations = {}
+            for title_with_year, movie_data in movies.items():
+                movie_data["title_with_year"] = title_with_year
+                movie_data["updated_at"] = now
+                operations[title_with_year] = UpdateOne(
+                    {"title_with_year": title_with_year},
+                    {"$set": movie_data},
+                    upsert=True
+                )
+            pending = list(movies)
+            for _ in range(2):
+                try:
+                    result = self.movies_collection.bulk_write([operations[key] for key in pending], ordered=False)
+                    return result.acknowledged
+                except BulkWriteError as e:
+                    errors = e.details.get("writeErrors", [])
+                    if (any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors)
+                            or e.details.get("writeConcernErrors")):
+                        logger.error(f"Error saving {len(movies)} movies in bulk: {e.details}")
+                        return False
+                    # Everything else was written; retry these once, since the same new key
+                    # may have been upserted concurrently (see add_or_update_movie)
+                    pending = [pending[error["index"]] for error in errors]
+            # Still rejected: these TMDb movies are already stored under another key
+            return self._add_aliases({key: movies[key] for key in pending})
+        except Exception as e:
+            logger.error(f"Error saving {len(movies)} movies in bulk: {e}")
+            return False
+
+    def _add_aliases(self, movies: Dict[str, Dict]) -> bool:
+        """
+        Record keys whose TMDb movie is already stored under another key as `aliases` of that
+        document, so the title index can still resolve them (see titleIndex.py)
+
+        Args:
+            movies: Dictionary of movie data keyed by the title_with_year that was rejected
+
+        Returns:
+            True if successful, False otherwise
+        """
+        now = utc_now()
+        operations = [
+            UpdateOne({"tmdb_id": movie_data["tmdb_id"], "title_with_year": {"$ne": key}},
+                      {"$addToSet": {"aliases": key}, "$set": {"updated_at": now}})
+            for key, movie_data in movies.items() if movie_data.get("tmdb_id") is not None
+        ]
+        try:
+            if operations:
+                self.movies_collection.bulk_write(operations, ordered=False)
+            logger.info(f"Recorded {len(operations)} movies as aliases of movies stored under another key")
+            return True
+        except Exception as e:
+            logger.error(f"Error recording {len(operations)} movie aliases: {e}")
+            return False
+    
     def add_or_update_override(self, title_with_year: str, override_data: Dict) -> bool:
         """
         Add or update movie override in database
@@ -161,6 +440,7 @@ class MovieDatabase:
         try:
             # Ensure title_with_year is part of the data
             override_data["title_with_year"] = title_with_year
+            override_data["updated_at"] = utc_now()
             
             # Use upsert to insert or update
             result = self.overrides_collection.update_one(
@@ -182,6 +462,203 @@ class MovieDatabase:
             logger.error(f"Error retrieving all movies: {e}")
             return []
     
+    def get_movies_updated_since(self, since: Optional[datetime], projection: Optional[Dict] = None,
+                                 limit: Optional[int] = None) -> List[Dict]:
+        """
+        Get movies changed at or after a watermark
+
+        Args:
+            since: Watermark from the previous sync, or None for every movie
+            projection: Optional projection (defaults to LOOKUP_PROJECTION)
+            limit: Only return this many movies, the most recently updated first
+
+        Returns:
+            List of movie documents
+        """
+        try:
+            query = {"updated_at": {"$gte": since}} if since else {}
+            cursor = self.movies_collection.find(query, projection or LOOKUP_PROJECTION)
+            if limit is not None:
+                cursor = cursor.sort("updated_at", -1).limit(limit)
+            elif since is None and projection is None and self.covered_lookups:
+                # A full load scans the covering index rather than every full document
+                cursor = cursor.hint(LOOKUP_INDEX_NAME)
+            return list(cursor)
+        except Exception as e:
+            logger.error(f"Error retrieving movies updated since {since}: {e}")
+            return []
+
+    def get_overrides_updated_since(self, since: Optional[datetime]) -> List[Dict]:
+        """
+        Get overrides changed at or after a watermark
+
+        Args:
+            since: Watermark from the previous sync, or None for every override
+
+        Returns:
+            List of override documents
+        """
+        try:
+            query = {"updated_at": {"$gte": since}} if since else {}
+            cursor = self.overrides_collection.find(query, LOOKUP_PROJECTION)
+            if since is None and self.covered_lookups:
+                cursor = cursor.hint(LOOKUP_INDEX_NAME)
+            return list(cursor)
+        except Exception as e:
+            logger.error(f"Error retrieving overrides updated since {since}: {e}")
+            return []
+
+    def get_movies_due_for_refresh(self, now: datetime, limit: int, keys: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Get movies whose data expired, longest overdue first (movies without a refresh
+        time are given one by `backfill_refresh_times` first)
+
+        Args:
+            now: Current time
+            limit: Maximum number of movies returned
+            keys: Only consider these movie keys
+
+        Returns:
+            List of documents with the fields needed to refresh them
+        """
+        query: Dict = {"refresh_at": {"$lte": now}}
+        if keys is not None:
+            query["title_with_year"] = {"$in": keys}
+        try:
+            return list(self.movies_collection.find(
+                query,
+                {"_id": 0, "title_with_year": 1, "tmdb_id": 1, "release_date": 1, "refresh_at": 1,
+                 "refresh_failures": 1}
+            ).sort("refresh_at", 1).limit(limit))
+        except Exception as e:
+            logger.error(f"Error retrieving movies due for refresh: {e}")
+            return []
+
+    def get_movies_without_refresh_time(self, limit: int) -> List[Dict]:
+        """
+        Get movies stored before refresh times were recorded
+
+        Returns:
+            List of documents with the fields needed to schedule their refresh
+        """
+        try:
+            return list(self.movies_collection.find(
+                {"refresh_at": None},
+                {"_id": 0, "title_with_year": 1, "release_date": 1}
+            ).limit(limit))
+        except Exception as e:
+            logger.error(f"Error retrieving movies without a refresh time: {e}")
+            return []
+
+    def set_refresh_times(self, times: Dict[str, datetime]) -> int:
+        """
+        Give movies without a refresh time one, in a single bulk write
+
+        Args:
+            times: Dictionary of movie key to refresh time
+
+        Returns:
+            Number of movies updated
+        """
+        if not times:
+            return 0
+        try:
+            result = self.movies_collection.bulk_write([
+                UpdateOne({"title_with_year": key, "refresh_at": None}, {"$set": {"refresh_at": refresh_at}})
+                for key, refresh_at in times.items()
+            ], ordered=False)
+            return result.modified_count
+        except Exception as e:
+            logger.error(f"Error setting refresh times: {e}")
+            return 0
+
+    def claim_refresh(self, keys: List[str], now: datetime, until: datetime) -> List[str]:
+        """
+        Take movies for refreshing by pushing their refresh time to `until`; a movie
+        another process claimed (or refreshed) in the meantime is not taken
+
+        The claim is one update tagging the movies with a fresh token, followed by one
+        read of the movies carrying it.
+
+        Returns:
+            Keys claimed by this call
+        """
+        if not keys:
+            return []
+        token = uuid.uuid4().hex
+        try:
+            self.movies_collection.update_many(
+                {"title_with_year": {"$in": keys}, "refresh_at": {"$lte": now}},
+                {"$set": {"refresh_at": until, "refresh_claim": token}}
+            )
+            return [movie["title_with_year"] for movie in self.movies_collection.find(
+                {"title_with_year": {"$in": keys}, "refresh_claim": token}, {"_id": 0, "title_with_year": 1}
+            )]
+        except Exception as e:
+            logger.error(f"Error claiming movies for refresh: {e}")
+            return []
+
+    def record_refresh_failure(self, key: str, retry_at: datetime) -> bool:
+        """
+        Count a failed refresh and leave the movie alone until `retry_at`
+
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            result = self.movies_collection.update_one(
+                {"title_with_year": key},
+                {"$set": {"refresh_at": retry_at}, "$inc": {"refresh_failures": 1}}
+            )
+            return result.acknowledged
+        except Exception as e:
+            logger.error(f"Error recording failed refresh of {key}: {e}")
+            return False
+
+    def get_letterboxd_ids_updated_since(self, since: Optional[datetime], limit: Optional[int] = None) -> List[Dict]:
+        """
+        Get Letterboxd URI to tmdb_id mappings recorded at or after a watermark
+
+        Args:
+            since: Watermark from the previous sync, or None for every mapping
+            limit: Only return this many mappings, the most recently recorded first
+
+        Returns:
+            List of documents with the URI as `_id` and its `tmdb_id`
+        """
+        try:
+            query = {"updated_at": {"$gte": since}} if since else {}
+            cursor = self.letterboxd_ids_collection.find(query)
+            if limit is not None:
+                cursor = cursor.sort("updated_at", -1).limit(limit)
+            return list(cursor)
+        except Exception as e:
+            logger.error(f"Error retrieving Letterboxd ids updated since {since}: {e}")
+            return []
+
+    def add_letterboxd_ids(self, ids: Dict[str, int]) -> bool:
+        """
+        Record the TMDb movie behind Letterboxd film URIs
+
+        Args:
+            ids: Dictionary of Letterboxd URI to tmdb_id
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not ids:
+            return True
+        try:
+            now = utc_now()
+            result = self.letterboxd_ids_collection.bulk_write([
+                UpdateOne({"_id": uri}, {"$set": {"tmdb_id": tmdb_id, "updated_at": now}}, upsert=True)
+                for uri, tmdb_id in ids.items()
+            ], ordered=False)
+            return result.acknowledged
+        except Exception as e:
+            logger.error(f"Error saving {len(ids)} Letterboxd ids: {e}")
+            return False
+
     def get_all_overrides(self) -> List[Dict]:
         """Get all overrides from database"""
         try:
@@ -195,3 +672,58 @@ class MovieDatabase:
         if self.client:
             self.client.close()
             logger.info("Database connection closed")
+
+def ensure_canonical_indexes(movies_collection, overrides_collection, replace_legacy: bool = False) -> bool:
+    """
+    Create the indexes of the canonical key schema and the covering lookup indexes.
+
+    Databases created before the schema have non-unique indexes under the same names
+    and may hold duplicates; those indexes are only replaced when `replace_legacy` is
+    set, which `dedupe.py` does once the duplicates are merged.
+
+    Returns:
+        True if the covering lookup indexes exist
+    """
+    # The covering indexes come first: they start with title_with_year, so lookups keep
+    # an index while a legacy title index is dropped and rebuilt as a unique one
+    covered = True
+    for collection in (movies_collection, overrides_collection):
+        collection.create_index("updated_at")
+        try:
+            collection.create_index(LOOKUP_INDEX_KEYS, name=LOOKUP_INDEX_NAME)
+        except OperationFailure as e:
+            logger.warning(f"Could not create the covering lookup index on {collection.name}: {e}")
+            covered = False
+
+    for collection, field, options in canonical_indexes(movies_collection, overrides_collection):
+        _ensure_unique_index(collection, field, options, replace_legacy)
+    return covered
+
+def canonical_indexes(movies_collection, overrides_collection) -> List[Tuple]:
+    """(collection, field, index options) of every unique index in the canonical key schema"""
+    return [
+        (movies_collection, "title_with_year", TITLE_INDEX_OPTIONS),
+        (movies_collection, "tmdb_id", TMDB_ID_INDEX_OPTIONS),
+        (overrides_collection, "title_with_year", TITLE_INDEX_OPTIONS),
+    ]
+
+def _ensure_unique_index(collection, field: str, options: Dict, replace_legacy: bool) -> bool:
+    """Create one unique index, falling back to a plain one while duplicates remain"""
+    existing = collection.index_information().get(options["name"])
+    if existing is not None and existing.get("unique"):
+        return True
+    if existing is not None:
+        if not replace_legacy:
+            logger.warning(f"{collection.name}.{field} has no unique index yet; run `python dedupe.py` to add it")
+            return False
+        collection.drop_index(options["name"])
+    try:
+        collection.create_index(field, **options)
+        if existing is not None:
+            logger.info(f"Replaced the {collection.name}.{field} index with a unique one")
+        return True
+    except (DuplicateKeyError, OperationFailure) as e:
+        logger.warning(f"{collection.name}.{field} still has duplicates ({e}); "
+                       f"run `python dedupe.py` to merge them")
+        collection.create_index(field, name=options["name"])
+        return False
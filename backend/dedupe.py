@@ -0,0 +1,218 @@
+"""
+Merge duplicate movie documents and move MongoDB to the canonical key schema
+
+Databases written before the unique indexes existed can hold several documents
+for one "Title (Year)" key (racing upserts, repeated migrations) or one TMDb
+movie stored under several keys. This tool runs against a live database:
+
+    1. Backfills `updated_at` on documents that lack it, so catalog syncs see them
+    2. Merges documents sharing a title_with_year (movies and overrides): the most
+       recently updated value of each field wins
+    3. Merges movies sharing a tmdb_id: the most recently updated document is kept
+       and the other keys are recorded in its `aliases` for the title index
+    4. Replaces the legacy non-unique indexes with the unique ones (see database.py),
+       merging again if new duplicates were written in the meantime
+
+Duplicates are merged in batches with a pause in between, and every kept document
+gets a new `updated_at` so running workers pick up the merged values.
+
+Usage:
+    python dedupe.py [--dry-run] [--batch-size N] [--pause SECONDS]
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple
+from pymongo import DeleteMany, UpdateOne
+from dotenv import load_dotenv
+from timeutil import as_utc, utc_now
+
+# Load environment variables from .env file
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-dedupe")
+
+# Duplicate groups merged per bulk write
+DEDUPE_BATCH_SIZE = 500
+
+# Seconds to wait between batches, leaving room for live traffic
+DEDUPE_PAUSE = 0.1
+
+# Attempts at adding the unique indexes before giving up on writers that keep adding duplicates
+INDEX_ATTEMPTS = 3
+
+def backfill(collection, dry_run: bool = False) -> int:
+    """
+    Give every document without an `updated_at` the current time
+
+    Returns:
+        Number of documents updated (or that would be)
+    """
+    query = {"updated_at": {"$exists": False}}
+    if dry_run:
+        return collection.count_documents(query)
+    return collection.update_many(query, {"$set": {"updated_at": utc_now()}}).modified_count
+
+def duplicate_groups(collection, field: str) -> Iterator[List[Any]]:
+    """
+    Yield the `_id`s of each set of documents sharing a value of `field`.
+    Documents where the field is missing, null or not a usable key are ignored.
+    """
+    value_type = "number" if field == "tmdb_id" else "string"
+    pipeline = [
+        {"$match": {field: {"$type": value_type}}},
+        {"$group": {"_id": f"${field}", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    for group in collection.aggregate(pipeline, allowDiskUse=True):
+        yield group["ids"]
+
+def merge_duplicates(documents: List[Dict[str, Any]]) -> Tuple[Any, Dict[str, Any], List[Any]]:
+    """
+    Merge documents describing the same movie.
+
+    The most recently updated document is kept, with any field it lacks taken from
+    the newest document that has it. Keys of the other documents, and their aliases,
+    become aliases of the kept one.
+
+    Returns:
+        (`_id` of the kept document, fields to set on it, `_id`s of the documents to delete)
+    """
+    ordered = sorted(documents, key=lambda document: as_utc(document.get("updated_at") or datetime.min))
+    survivor = ordered[-1]
+    merged: Dict[str, Any] = {}
+    aliases = set()
+    for document in ordered:
+        merged.update({field: value for field, value in document.items() if value is not None})
+        aliases.add(document.get("title_with_year"))
+        aliases.update(document.get("aliases") or ())
+    merged.pop("_id")
+    merged["title_with_year"] = survivor["title_with_year"]
+    aliases -= {None, survivor["title_with_year"]}
+    if aliases:
+        merged["aliases"] = sorted(aliases)
+    else:
+        merged.pop("aliases", None)
+    merged["updated_at"] = utc_now()
+    return survivor["_id"], merged, [document["_id"] for document in ordered[:-1]]
+
+def dedupe(collection, field: str, batch_size: int = DEDUPE_BATCH_SIZE, pause: float = DEDUPE_PAUSE,
+           dry_run: bool = False) -> Tuple[int, int]:
+    """
+    Merge every set of documents sharing a value of `field`, `batch_size` sets at a time
+
+    Returns:
+        (number of duplicate sets, number of documents removed)
+    """
+    groups = 0
+    removed = 0
+    start_time = time.time()
+    batch: List[List[Any]] = []
+    for ids in duplicate_groups(collection, field):
+        batch.append(ids)
+        if len(batch) >= batch_size:
+            merged_groups, merged_removed = _merge_batch(collection, batch, dry_run)
+            groups += merged_groups
+            removed += merged_removed
+            batch = []
+            time.sleep(pause)
+    if batch:
+        merged_groups, merged_removed = _merge_batch(collection, batch, dry_run)
+        groups += merged_groups
+        removed += merged_removed
+
+    elapsed = time.time() - start_time
+    action = "would remove" if dry_run else "removed"
+    logger.info(f"{collection.name}.{field}: {groups} duplicate sets, {action} {removed} documents "
+                f"in {elapsed:.2f} seconds")
+    return groups, removed
+
+def _merge_batch(collection, batch: List[List[Any]], dry_run: bool) -> Tuple[int, int]:
+    """Merge one batch of duplicate sets with a single ordered bulk write"""
+    documents = {document["_id"]: document
+                 for document in collection.find({"_id": {"$in": [_id for ids in batch for _id in ids]}})}
+    operations = []
+    groups = 0
+    removed = 0
+    for ids in batch:
+        group = [documents[_id] for _id in ids if _id in documents]
+        # Another writer (or an earlier merge) may already have removed some of them
+        if len(group) < 2:
+            continue
+        survivor, fields, losers = merge_duplicates(group)
+        # Deleted first, so the kept document never collides with them on a unique index
+        operations.append(DeleteMany({"_id": {"$in": losers}}))
+        operations.append(UpdateOne({"_id": survivor}, {"$set": fields}))
+        groups += 1
+        removed += len(losers)
+    if operations and not dry_run:
+        collection.bulk_write(operations, ordered=True)
+    return groups, removed
+
+def dedupe_all(db, batch_size: int = DEDUPE_BATCH_SIZE, pause: float = DEDUPE_PAUSE,
+               dry_run: bool = False) -> int:
+    """
+    Merge duplicates by key in movies and overrides, then by tmdb_id in movies
+
+    Returns:
+        Number of documents removed
+    """
+    removed = 0
+    for collection, field in ((db.movies_collection, "title_with_year"),
+                              (db.overrides_collection, "title_with_year"),
+                              (db.movies_collection, "tmdb_id")):
+        removed += dedupe(collection, field, batch_size, pause, dry_run)[1]
+    return removed
+
+def unique_indexes_ready(db) -> bool:
+    """Whether every unique index of the canonical key schema exists"""
+    from database import canonical_indexes
+    for collection, _, options in canonical_indexes(db.movies_collection, db.overrides_collection):
+        index = collection.index_information().get(options["name"])
+        if index is None or not index.get("unique"):
+            return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge duplicate movie documents and add the unique indexes")
+    parser.add_argument("--dry-run", action="store_true", help="Report duplicates without changing anything")
+    parser.add_argument("--batch-size", type=int, default=DEDUPE_BATCH_SIZE, help="Duplicate sets per bulk write")
+    parser.add_argument("--pause", type=float, default=DEDUPE_PAUSE, help="Seconds between batches")
+    args = parser.parse_args()
+
+    from database import MovieDatabase, ensure_canonical_indexes
+    db = MovieDatabase()
+    if db.movies_collection is None:
+        logger.error("MongoDB connection failed")
+        sys.exit(1)
+
+    start_time = time.time()
+    for collection in (db.movies_collection, db.overrides_collection):
+        count = backfill(collection, args.dry_run)
+        logger.info(f"{collection.name}: {count} documents {'need' if args.dry_run else 'given'} an updated_at")
+    removed = dedupe_all(db, args.batch_size, args.pause, args.dry_run)
+    if args.dry_run:
+        logger.info(f"Dry run: {removed} documents would be removed")
+        return
+
+    for attempt in range(INDEX_ATTEMPTS):
+        ensure_canonical_indexes(db.movies_collection, db.overrides_collection, replace_legacy=True)
+        if unique_indexes_ready(db):
+            break
+        # Writers added duplicates between the merge and the index build; merge those too
+        removed += dedupe_all(db, args.batch_size, args.pause)
+    else:
+        logger.error(f"Unique indexes still missing after {INDEX_ATTEMPTS} attempts")
+        sys.exit(1)
+
+    elapsed = time.time() - start_time
+    logger.info(f"Removed {removed} duplicate documents and added the unique indexes in {elapsed:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Gunicorn configuration for MeterBoxd
+
+Gunicorn reads this file automatically when started from the backend directory.
+Set GUNICORN_PRELOAD=true to load the app, and the movie catalog with it, once
+in the master before forking workers: the catalog is then held as flat arrays
+shared copy-on-write by every worker, so memory per worker stays roughly flat.
+Each worker recreates its MongoDB client and HTTP session after the fork.
+
+Workers are threaded (gthread): a request waiting on TMDb or a job's event stream
+holds one of a worker's GUNICORN_THREADS threads rather than the whole worker, and
+the worker keeps answering the master's heartbeat meanwhile, so long requests do
+not get it killed after `timeout` seconds. The number of workers is WEB_CONCURRENCY.
+
+Workers record Prometheus metrics to files in PROMETHEUS_MULTIPROC_DIR (a fresh
+temporary directory unless it is set), so /metrics reports all workers together.
+"""
+import gc
+import os
+import sys
+import glob
+import tempfile
+
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() == "true"
+
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# In-process upload jobs are only visible to the worker that accepted them, and with
+# several workers a status poll or event stream may reach another one
+_switched_job_queue = workers > 1 and os.getenv("JOB_QUEUE", "memory").lower() == "memory"
+if _switched_job_queue:
+    os.environ["JOB_QUEUE"] = "mongo"
+
+# Must be set before prometheus_client is imported by the app
+if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="meterboxd-metrics-")
+
+def on_starting(server):
+    if _switched_job_queue:
+        server.log.warning(f"Using JOB_QUEUE=mongo: the in-process job queue does not work across {workers} workers")
+    # Samples left by the workers of a previous run would be added to this run's
+    for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+        os.remove(path)
+
+def when_ready(server):
+    if preload_app:
+        # Move everything loaded so far out of the collector's reach so that GC
+        # passes in the workers do not write to (and so copy) the shared pages
+        gc.freeze()
+        server.log.info(f"Preloaded app; froze {gc.get_freeze_count()} objects before forking workers")
+
+def post_fork(server, worker):
+    if preload_app:
+        app_module = sys.modules.get("app")
+        if app_module is not None and not app_module.health.is_ready():
+            # The master could not warm the catalog (e.g. MongoDB was down); retry in the worker
+            app_module.start_warm_up()
+        if app_module is not None and app_module.JOB_QUEUE == "mongo":
+            # Job workers are never started in the master, which must not run jobs itself
+            app_module.job_queue.start()
+        from catalog import CATALOG_CHANGE_STREAM
+        if CATALOG_CHANGE_STREAM:
+            # The master's change stream thread does not survive the fork
+            from publicMovieData import catalog
+            catalog.start_change_stream()
+        from titleIndex import TITLE_INDEX_ENABLED
+        if app_module is not None and app_module.health.is_ready() and TITLE_INDEX_ENABLED:
+            # Never built in the master: its dicts would be copied into every worker on first write
+            from publicMovieData import title_index
+            title_index.load_in_background()
+
+def worker_exit(server, worker):
+    # Write out any movies still buffered by this worker
+    module = sys.modules.get("publicMovieData")
+    if module is not None:
+        module.write_buffer.flush()
+
+def child_exit(server, worker):
+    # Stop reporting the exited worker's catalog gauges
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
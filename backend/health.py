@@ -0,0 +1,115 @@
+"""
+Startup timing and cached health state for MeterBoxd
+"""
+import os
+import threading
+import time
+import logging
+from typing import Any, Dict, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-health")
+
+# Seconds between background MongoDB probes; health checks only read the last result
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "10"))
+
+class HealthMonitor:
+    """
+    Tracks startup progress and dependency health for the health and readiness endpoints.
+
+    A background thread pings MongoDB every HEALTH_PROBE_INTERVAL seconds and caches
+    the outcome, so a probe from the platform never waits on the database. The
+    thread is started lazily and again in a forked worker, where it no longer exists.
+    """
+
+    def __init__(self, started_at: float, interval: float = HEALTH_PROBE_INTERVAL):
+        self._started_at = started_at
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.import_seconds: Optional[float] = None
+        self.ready_seconds: Optional[float] = None
+        self.warmup_error: Optional[str] = None
+        self.mongodb_connected = False
+        self.mongodb_latency_ms: Optional[float] = None
+        self.last_probe_at: Optional[float] = None
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        # Results probed by the parent say nothing about this process's connection
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.mongodb_connected = False
+        self.mongodb_latency_ms = None
+        self.last_probe_at = None
+
+    def record_import(self) -> None:
+        """Record how long importing the app module took"""
+        self.import_seconds = time.time() - self._started_at
+        logger.info(f"App imported in {self.import_seconds * 1000:.0f}ms")
+
+    def mark_ready(self) -> None:
+        """Record the time from import to a warm catalog"""
+        self.ready_seconds = time.time() - self._started_at
+        self.warmup_error = None
+        logger.info(f"Ready to serve {self.ready_seconds:.2f} seconds after startup")
+
+    def mark_failed(self, error: Exception) -> None:
+        self.warmup_error = str(error)
+
+    def is_ready(self) -> bool:
+        return self.ready_seconds is not None
+
+    def probe(self) -> bool:
+        """Ping MongoDB once and cache the outcome"""
+        from database import MovieDatabase
+
+        database = MovieDatabase._instance
+        if database is None or not database._initialized:
+            # The data layer is still being imported by the warm-up; nothing to probe yet
+            return False
+
+        start_time = time.time()
+        try:
+            connected = database.ping()
+        except Exception as e:
+            logger.error(f"MongoDB health probe failed: {e}")
+            connected = False
+        if connected != self.mongodb_connected and self.last_probe_at is not None:
+            logger.warning(f"MongoDB is now {'reachable' if connected else 'unreachable'}")
+        self.mongodb_connected = connected
+        self.mongodb_latency_ms = (time.time() - start_time) * 1000 if connected else None
+        self.last_probe_at = time.time()
+        return connected
+
+    def status(self) -> Dict[str, Any]:
+        """The last probed state; never touches the network"""
+        self.ensure_started()
+        probe_age = time.time() - self.last_probe_at if self.last_probe_at is not None else None
+        return {
+            "mongodb_connected": self.mongodb_connected,
+            "mongodb_latency_ms": self.mongodb_latency_ms,
+            "last_probe_age_seconds": probe_age,
+            "import_seconds": self.import_seconds,
+            "ready_seconds": self.ready_seconds,
+        }
+
+    def ensure_started(self) -> None:
+        """Start the probe thread lazily, and again in a forked child where it no longer exists"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="health-probe", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self.probe()
+            time.sleep(self._interval)
@@ -0,0 +1,299 @@
+"""
+Background upload jobs for MeterBoxd
+"""
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from timeutil import as_utc, utc_now
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-jobs")
+
+# Where jobs are queued: "memory" runs them in the process that accepted them, "mongo"
+# stores them in MongoDB so any replica's workers can pick them up
+JOB_QUEUE = os.getenv("JOB_QUEUE", "memory").lower()
+
+# Worker threads per process
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+# Seconds a job and its result are kept after it was submitted
+JOB_TTL = int(os.getenv("JOB_TTL", "3600"))
+
+# Seconds between checks for queued jobs (MongoDB queue) and job updates (event streams)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+
+# A running job not updated for this many seconds is assumed lost with its worker and re-queued
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "300"))
+
+# Times a job is started before it is failed; a job that keeps taking its worker down
+# with it (e.g. by running the process out of memory) would otherwise be retried forever
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Minimum seconds between progress updates written for a job
+JOB_PROGRESS_INTERVAL = 0.5
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# (payload, progress callback, **job options) -> result; the callback takes (resolved, total, partial result)
+JobHandler = Callable[..., Dict[str, Any]]
+
+# Maps an exception raised by the handler to the (message, status) reported for the job
+ErrorDescriber = Callable[[Exception], Tuple[str, int]]
+
+class JobQueue:
+    """
+    Runs upload jobs on a pool of worker threads.
+
+    Subclasses store the jobs; this class claims them, runs the handler and records
+    progress, partial results, the final result or the error. Worker threads are
+    started lazily, and again in a forked worker where they no longer exist.
+    """
+
+    def __init__(self, handler: JobHandler, describe_error: ErrorDescriber, workers: int = JOB_WORKERS):
+        self._handler = handler
+        self._describe_error = describe_error
+        self._workers = workers
+        self._threads: List[threading.Thread] = []
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def submit(self, payload: bytes, options: Optional[Dict[str, Any]] = None) -> str:
+        """Queue a job and return its id; `options` are passed to the handler as keyword arguments"""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job's public state, or None if it is unknown or expired"""
+        raise NotImplementedError
+
+    def _update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def _claim(self) -> Optional[Tuple[str, bytes, Dict[str, Any]]]:
+        """Take the next queued job, waiting up to JOB_POLL_INTERVAL; None if there is none"""
+        raise NotImplementedError
+
+    def start(self) -> None:
+        """Start the worker threads if they are not running in this process"""
+        if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            if self._pid == os.getpid() and all(thread.is_alive() for thread in self._threads):
+                return
+            self._pid = os.getpid()
+            self._threads = [threading.Thread(target=self._run, name=f"upload-job-{i}", daemon=True)
+                             for i in range(self._workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                job = self._claim()
+            except Exception as e:
+                logger.error(f"Failed to claim upload job: {e}")
+                time.sleep(JOB_POLL_INTERVAL)
+                continue
+            if job is not None:
+                self._execute(*job)
+
+    def _execute(self, job_id: str, payload: bytes, options: Dict[str, Any]) -> None:
+        start_time = time.time()
+        last_report = 0.0
+        best = 0
+
+        def report(resolved: int, total: int, partial: Dict[str, Any]) -> None:
+            nonlocal last_report, best
+            # Keep progress monotonic; searches are counted before their results land
+            best = max(best, resolved)
+            now = time.time()
+            if now - last_report < JOB_PROGRESS_INTERVAL and best < total:
+                return
+            last_report = now
+            self._update(job_id, {"progress": _progress(best, total), "partial": partial})
+
+        try:
+            result = self._handler(payload, report, **options)
+        except Exception as e:
+            message, status = self._describe_error(e)
+            self._update(job_id, {"status": FAILED, "error": message, "error_status": status})
+            logger.warning(f"Upload job {job_id} failed after {time.time() - start_time:.2f} seconds: {message}")
+            return
+
+        self._update(job_id, {"status": DONE, "result": result, "partial": None,
+                              "progress": _progress(best, best)})
+        logger.info(f"Upload job {job_id} finished in {time.time() - start_time:.2f} seconds")
+
+class InProcessJobQueue(JobQueue):
+    """Jobs kept in this process's memory; only the process that accepted a job can report on it"""
+
+    def __init__(self, handler: JobHandler, describe_error: ErrorDescriber, workers: int = JOB_WORKERS):
+        super().__init__(handler, describe_error, workers)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._payloads: Dict[str, Tuple[bytes, Dict[str, Any]]] = {}
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._jobs_lock = threading.Lock()
+
+    def submit(self, payload: bytes, options: Optional[Dict[str, Any]] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = utc_now()
+        with self._jobs_lock:
+            self._expire(now)
+            self._jobs[job_id] = _new_job(job_id, now)
+            self._payloads[job_id] = (payload, options or {})
+        self._queue.put(job_id)
+        self.start()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+            return _public(job) if job is not None else None
+
+    def _update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        with self._jobs_lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields, updated_at=utc_now())
+
+    def _claim(self) -> Optional[Tuple[str, bytes, Dict[str, Any]]]:
+        try:
+            job_id = self._queue.get(timeout=JOB_POLL_INTERVAL)
+        except queue.Empty:
+            return None
+        with self._jobs_lock:
+            queued = self._payloads.pop(job_id, None)
+        if queued is None:
+            return None
+        self._update(job_id, {"status": RUNNING})
+        return (job_id, *queued)
+
+    def _expire(self, now: datetime) -> None:
+        """Drop jobs past JOB_TTL; called with the jobs lock held"""
+        expired = [job_id for job_id, job in self._jobs.items() if job["expires_at"] <= now]
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+            self._payloads.pop(job_id, None)
+
+class MongoJobQueue(JobQueue):
+    """
+    Jobs stored in the MongoDB "upload-jobs" collection.
+
+    Every replica's workers claim queued jobs atomically with find_one_and_update, so
+    a job can be submitted to one replica, run on another and polled through a third.
+    Running jobs whose worker stopped updating them are re-queued after JOB_STALE_AFTER,
+    up to JOB_MAX_ATTEMPTS starts in all, and failed after that.
+    """
+
+    def __init__(self, handler: JobHandler, describe_error: ErrorDescriber, workers: int = JOB_WORKERS):
+        super().__init__(handler, describe_error, workers)
+        self._collection = None
+        self._wakeup = threading.Event()
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            from database import MovieDatabase
+            collection = MovieDatabase().db["upload-jobs"]
+            collection.create_index([("status", 1), ("created_at", 1)])
+            # MongoDB removes jobs once they expire
+            collection.create_index("expires_at", expireAfterSeconds=0)
+            self._collection = collection
+        return self._collection
+
+    def submit(self, payload: bytes, options: Optional[Dict[str, Any]] = None) -> str:
+        from bson import Binary
+
+        job_id = uuid.uuid4().hex
+        job = _new_job(job_id, utc_now())
+        job["_id"] = job_id
+        job["payload"] = Binary(payload)
+        job["options"] = options or {}
+        self.collection.insert_one(job)
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.collection.find_one({"_id": job_id}, {"payload": 0})
+        return _public(job) if job is not None else None
+
+    def _update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        update: Dict[str, Any] = {"$set": dict(fields, updated_at=utc_now())}
+        if fields.get("status") in (DONE, FAILED):
+            # The upload is no longer needed once the job has finished
+            update["$unset"] = {"payload": ""}
+        self.collection.update_one({"_id": job_id}, update)
+
+    def _claim(self) -> Optional[Tuple[str, bytes, Dict[str, Any]]]:
+        from pymongo import ReturnDocument
+
+        now = utc_now()
+        stale = now - timedelta(seconds=JOB_STALE_AFTER)
+        self.collection.update_many(
+            {"status": RUNNING, "updated_at": {"$lt": stale}, "attempts": {"$gte": JOB_MAX_ATTEMPTS}},
+            {"$set": {"status": FAILED, "error": "Server error while processing file", "error_status": 500,
+                      "updated_at": now},
+             "$unset": {"payload": ""}}
+        )
+        job = self.collection.find_one_and_update(
+            {"$or": [
+                {"status": QUEUED},
+                {"status": RUNNING, "updated_at": {"$lt": stale}, "attempts": {"$lt": JOB_MAX_ATTEMPTS}},
+            ]},
+            {"$set": {"status": RUNNING, "updated_at": now, "worker": f"{socket.gethostname()}:{os.getpid()}"},
+             "$inc": {"attempts": 1}},
+            sort=[("created_at", 1)],
+            projection={"payload": 1, "options": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None or "payload" not in job:
+            self._wakeup.wait(JOB_POLL_INTERVAL)
+            self._wakeup.clear()
+            return None
+        return job["_id"], bytes(job["payload"]), job.get("options") or {}
+
+def _progress(resolved: int, total: int) -> Dict[str, Any]:
+    return {
+        "resolved": resolved,
+        "total": total,
+        "percent": round(100.0 * resolved / total, 1) if total else 100.0,
+    }
+
+def _new_job(job_id: str, now: datetime) -> Dict[str, Any]:
+    return {
+        "job_id": job_id,
+        "status": QUEUED,
+        "progress": _progress(0, 0),
+        "partial": None,
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+        "expires_at": now + timedelta(seconds=JOB_TTL),
+    }
+
+def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields of a job reported to clients, with timestamps as ISO 8601 strings"""
+    public = {key: job.get(key) for key in ("job_id", "status", "progress", "partial", "result", "error")}
+    for key in ("created_at", "updated_at"):
+        value = job.get(key)
+        if isinstance(value, datetime):
+            public[key] = as_utc(value).isoformat()
+    return public
+
+def create_job_queue(handler: JobHandler, describe_error: ErrorDescriber, kind: str = JOB_QUEUE) -> JobQueue:
+    """Build the job queue selected by JOB_QUEUE"""
+    if kind == "mongo":
+        return MongoJobQueue(handler, describe_error)
+    return InProcessJobQueue(handler, describe_error)
@@ -0,0 +1,142 @@
+"""
+Prometheus metrics for MeterBoxd
+
+Every process records into the same metric objects and `/metrics` renders them in
+the Prometheus text format. Under gunicorn each worker is a separate process, so
+gunicorn.conf.py points PROMETHEUS_MULTIPROC_DIR at a shared directory: workers then
+write their samples to files there and a scrape of any worker aggregates all of them.
+The variable must be set before prometheus_client is first imported.
+"""
+import os
+import time
+import logging
+from contextlib import contextmanager
+from typing import Iterator
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST,
+                               REGISTRY, generate_latest, multiprocess)
+from pymongo import monitoring
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-metrics")
+
+# Directory shared by the processes of a multi-process server, set by gunicorn.conf.py
+MULTIPROCESS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Content type of `render`'s output
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Tiers a movie lookup can be answered by, in the order they are tried
+LOOKUP_TIERS = ("local", "override", "db", "index", "tmdb", "negative")
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+movie_lookups = Counter(
+    "meterboxd_movie_lookups_total",
+    "Movie lookups by the tier that answered them",
+    ["tier"],
+)
+movie_lookup_requests = Counter(
+    "meterboxd_movie_lookup_requests_total",
+    "Movie lookups requested, whichever tier answered them",
+)
+coalesced_lookups = Counter(
+    "meterboxd_coalesced_lookups_total",
+    "Movie lookups that waited for the same lookup from a concurrent request",
+)
+mongo_latency = Histogram(
+    "meterboxd_mongo_command_seconds",
+    "Duration of MongoDB commands",
+    ["command"],
+    buckets=_LATENCY_BUCKETS,
+)
+tmdb_latency = Histogram(
+    "meterboxd_tmdb_request_seconds",
+    "Duration of TMDb API requests, including failed attempts",
+    ["endpoint"],
+    buckets=_LATENCY_BUCKETS,
+)
+upload_bytes = Histogram(
+    "meterboxd_upload_bytes",
+    "Size of uploaded export ZIPs",
+    buckets=(64e3, 256e3, 1e6, 4e6, 16e6, 64e6),
+)
+upload_ratings = Histogram(
+    "meterboxd_upload_ratings",
+    "Ratings in analyzed exports",
+    buckets=(10, 100, 500, 1000, 2500, 5000, 10000, 25000),
+)
+upload_processing = Histogram(
+    "meterboxd_upload_processing_seconds",
+    "Time to answer an upload, by whether the result cache answered it",
+    ["result"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+)
+# Each worker holds its own catalog; with a preloaded app most of it is shared copy-on-write
+catalog_entries = Gauge(
+    "meterboxd_catalog_entries",
+    "Movies held by the in-process catalog, in its LRU or its snapshot",
+    multiprocess_mode="livemax",
+)
+catalog_snapshot_entries = Gauge(
+    "meterboxd_catalog_snapshot_entries",
+    "Movies in the catalog's read-only snapshot",
+    multiprocess_mode="livemax",
+)
+catalog_memory = Gauge(
+    "meterboxd_catalog_memory_bytes",
+    "Estimated memory held by the in-process catalog",
+    multiprocess_mode="livesum",
+)
+
+for _tier in LOOKUP_TIERS:
+    # Export every tier from the start, so rates are defined before the first hit
+    movie_lookups.labels(_tier)
+
+def count_lookups(tier: str, amount: int = 1) -> None:
+    """Count lookups answered by one tier (see LOOKUP_TIERS)"""
+    if amount:
+        movie_lookups.labels(tier).inc(amount)
+
+@contextmanager
+def time_tmdb(path: str) -> Iterator[None]:
+    """Time one TMDb request; the endpoint label drops ids ("/movie/603" -> "movie")"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        endpoint = path.strip("/").split("/")[0] or "unknown"
+        tmdb_latency.labels(endpoint).observe(time.perf_counter() - start)
+
+def observe_catalog(catalog) -> None:
+    """Update the catalog gauges from this process's catalog"""
+    counters = catalog.counters()
+    catalog_entries.set(len(catalog))
+    catalog_snapshot_entries.set(counters["snapshot_entries"])
+    catalog_memory.set(counters["memory_bytes"])
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Records the duration of every command a MongoClient runs"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongo_latency.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        mongo_latency.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+def render() -> bytes:
+    """All metrics in the Prometheus text format, aggregated across processes when multi-process"""
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+def mark_process_dead(pid: int) -> None:
+    """Drop the live gauges of an exited worker (called from gunicorn's child_exit hook)"""
+    if MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -1,9 +1,11 @@
 import json
 import os
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from pymongo.errors import BulkWriteError, ConnectionFailure, ServerSelectionTimeoutError
 import logging
 from dotenv import load_dotenv
+from database import ensure_canonical_indexes
+from timeutil import utc_now
 
 # Load environment variables from .env file
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
@@ -13,6 +15,36 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("meterboxd-migration")
 
+# Documents upserted per bulk write
+MIGRATION_BATCH_SIZE = 1000
+
+def upsert_documents(collection, documents, label):
+    """
+    Upsert documents by title_with_year in unordered batches, so the migration can be
+    re-run (or run against live data) without creating duplicates.
+
+    Returns:
+        Number of documents inserted or updated
+    """
+    now = utc_now()
+    written = 0
+    for i in range(0, len(documents), MIGRATION_BATCH_SIZE):
+        batch = documents[i:i + MIGRATION_BATCH_SIZE]
+        operations = [
+            # The watermark lets running catalogs pick up migrated documents on their next sync
+            UpdateOne({"title_with_year": document["title_with_year"]},
+                      {"$set": {**document, "updated_at": now}}, upsert=True)
+            for document in batch if document.get("title_with_year")
+        ]
+        try:
+            result = collection.bulk_write(operations, ordered=False)
+            written += result.upserted_count + result.modified_count
+        except BulkWriteError as bwe:
+            logger.error(f"Error upserting {label}: {bwe.details}")
+            written += bwe.details.get("nUpserted", 0) + bwe.details.get("nModified", 0)
+    logger.info(f"Upserted {written} {label}")
+    return written
+
 def migrate_to_mongodb(mongodb_uri=None):
     """
     Migrate movie cache and overrides from JSON files to MongoDB.
@@ -59,15 +91,11 @@ def migrate_to_mongodb(mongodb_uri=None):
         existing_overrides = overrides_collection.count_documents({})
         
         if existing_movies > 0 or existing_overrides > 0:
-            logger.warning(f"Found existing data in MongoDB: {existing_movies} movies, {existing_overrides} overrides")
-            user_input = input("Do you want to clear existing data before migration? (y/n): ")
-            if user_input.lower() == 'y':
-                movies_collection.delete_many({})
-                overrides_collection.delete_many({})
-                logger.info("Existing data cleared")
-            else:
-                logger.info("Migration aborted to prevent duplicate data")
-                return False
+            # Documents are upserted by key, so existing ones are updated in place rather than duplicated
+            logger.info(f"Found existing data in MongoDB: {existing_movies} movies, {existing_overrides} overrides")
+        
+        # Create the unique indexes first so concurrent upserts cannot race into duplicates
+        ensure_canonical_indexes(movies_collection, overrides_collection)
 
         # Load and insert movie cache
         movie_cache_path = os.path.join(os.path.dirname(__file__), "cache", "movie_cache.json")
@@ -86,18 +114,8 @@ def migrate_to_mongodb(mongodb_uri=None):
             else:
                 processed_movies = movies
                 
-            # Insert with ordered=False to continue on errors
             logger.info(f"Migrating {len(processed_movies)} movies to MongoDB")
-            try:
-                if processed_movies:
-                    result = movies_collection.insert_many(processed_movies, ordered=False)
-                    logger.info(f"Inserted {len(result.inserted_ids)} movies")
-            except BulkWriteError as bwe:
-                logger.error(f"Error inserting movies: {bwe.details}")
-
-        # Create indexes for faster querying
-        movies_collection.create_index("title_with_year")
-        movies_collection.create_index("tmdb_id")
+            upsert_documents(movies_collection, processed_movies, "movies")
         
         # Load and insert overrides
         overrides_path = os.path.join(os.path.dirname(__file__), "overrides", "overrides.json")
@@ -115,17 +133,8 @@ def migrate_to_mongodb(mongodb_uri=None):
             else:
                 processed_overrides = overrides
                 
-            # Insert with ordered=False to continue on errors
             logger.info(f"Migrating {len(processed_overrides)} overrides to MongoDB")
-            try:
-                if processed_overrides:
-                    result = overrides_collection.insert_many(processed_overrides, ordered=False)
-                    logger.info(f"Inserted {len(result.inserted_ids)} overrides")
-            except BulkWriteError as bwe:
-                logger.error(f"Error inserting overrides: {bwe.details}")
-                
-        # Create index for overrides too
-        overrides_collection.create_index("title_with_year")
+            upsert_documents(overrides_collection, processed_overrides, "overrides")
         
         logger.info("Migration complete!")
         return True
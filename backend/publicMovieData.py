@@ -1,72 +1,157 @@
-from typing import Tuple, Dict, Any, Optional
-import requests
+from typing import Tuple, Dict, Any, Callable, Iterable, List, Optional
+import pandas as pd
 import os
+import hashlib
 import logging
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
 from database import MovieDatabase
+from catalog import CatalogEntry, MovieCatalog, CATALOG_CHANGE_STREAM
+from snapshot import load_snapshot
+import tmdbClient
+from singleflight import SingleFlight
+from writeBehind import WriteBehindBuffer, WRITE_BEHIND_ENABLED
+from titleIndex import TitleIndex, TITLE_INDEX_ENABLED, split_key
+from refresher import MovieRefresher, REFRESH_ENABLED, next_refresh_at
+import metrics
+from timeutil import as_utc, utc_now
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("meterboxd-movie-data")
 
-# Track API and database usage stats
-stats = {
-    "local_cache_hits": 0,
-    "override_hits": 0,
-    "db_hits": 0, 
-    "api_hits": 0,
-    "total_requests": 0
-}
-
 # Load environment variables from .env file
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
 
 # Define constants
-TMDB_API_KEY = os.getenv("TMDB_API_KEY")
+TMDB_API_KEY = tmdbClient.TMDB_API_KEY
 
 # Initialize database connection
 db = MovieDatabase()
 
-# Cache for movie data to reduce database queries during a single session
-_local_cache: Dict[str, Dict[str, Any]] = {}
+# Long-lived catalog of movie data, synced incrementally with MongoDB.
+# A local snapshot, when present, replaces the initial full load.
+catalog = MovieCatalog(db)
+_snapshot = load_snapshot()
+if _snapshot is not None:
+    catalog.attach_snapshot(_snapshot)
+if CATALOG_CHANGE_STREAM:
+    catalog.start_change_stream()
+
+# New and refreshed movies are written to MongoDB in batches
+write_buffer = WriteBehindBuffer(db)
+
+# Stored movies by normalized title and Letterboxd URI, consulted before searching TMDb
+title_index = TitleIndex(db)
+
+# Identical lookups from concurrent requests share one resolution
+flights = SingleFlight()
+
+# Seconds to wait for another thread's lookup before giving up on a movie
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", "60"))
+
+# Seconds a title TMDb could not resolve (not found or no votes) is remembered before searching again
+NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Titles remembered in each process's view of the negative cache; the least recently used go first
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv("NEGATIVE_CACHE_MAX_ENTRIES", "50000"))
+
+# In-process view of the negative cache: key -> expiry timestamp, least recently used first
+_negatives: "OrderedDict[str, float]" = OrderedDict()
+_negatives_lock = threading.Lock()
+
+_catalog_frame: Optional[pd.DataFrame] = None
+_catalog_frame_version = -1
+
+# Fields of a cached movie exposed by the columnar catalog view
+CATALOG_COLUMNS = ["public_rating", "vote_count", "popularity", "poster_path"]
+
+def build_poster_url(poster_path: Optional[str]) -> str:
+    """Build the full TMDB poster URL for a stored poster path"""
+    return f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else ""
+
+def has_snapshot() -> bool:
+    """Whether the catalog was started from a local snapshot"""
+    return _snapshot is not None
 
-def load_cache() -> Dict[str, Any]:
+def load_cache() -> MovieCatalog:
     """
-    Load movie cache from MongoDB.
+    Bring the movie catalog up to date with MongoDB.
+    The first call loads the full collection; later calls only read documents
+    changed since the previous sync.
     This function is maintained for backward compatibility with existing code.
     
     Returns:
-        Dictionary with movie data keyed by title_with_year
+        The movie catalog, a dict-like mapping keyed by title_with_year
     """
-    cache = {}
     try:
-        start_time = time.time()
-        # Get all movies from MongoDB
-        movies = db.get_all_movies()
-        
-        # Convert to dictionary format
-        for movie in movies:
-            key = movie.get("title_with_year")
-            if key:
-                cache[key] = movie
-        
-        elapsed = time.time() - start_time
-        logger.info(f"Loaded {len(cache)} movies from MongoDB in {elapsed:.2f} seconds")
-        
-        # Store in local cache for faster subsequent access
-        global _local_cache
-        _local_cache = cache
-        
-        return cache
+        catalog.sync()
     except Exception as e:
-        logger.error(f"Error loading movie cache from MongoDB: {e}")
-        return {}
+        logger.error(f"Error syncing movie catalog with MongoDB: {e}")
+    return catalog
+
+def movie_data_version(movies: Iterable[Tuple[str, Any]]) -> Optional[str]:
+    """
+    Identify the public data this process holds for some movies: a hash of each one's
+    catalog entry, or of TMDb having no data for it. It changes only when the data of
+    one of these movies does, and processes holding the same data agree on it.
+
+    Args:
+        movies: Iterable of (title, year) pairs
+
+    Returns:
+        The version, or None if any of the movies is neither in the catalog nor a known miss
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for key in sorted({f"{title} ({year})" for title, year in movies}):
+        entry = catalog.peek(key)
+        if entry is not None:
+            digest.update(f"{key}\t{entry.public_rating}\t{entry.vote_count}\t{entry.popularity}\t"
+                          f"{entry.poster_path}\n".encode())
+        elif _is_negative(key):
+            digest.update(f"{key}\t-\n".encode())
+        else:
+            return None
+    return digest.hexdigest()
+
+def get_catalog_frame(keys: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Columnar view of the movie catalog, indexed by title_with_year.
+    
+    Args:
+        keys: Only include these keys (cached ones); the full view is rebuilt
+            only when the catalog has changed since the last call
+    
+    Returns:
+        DataFrame with the CATALOG_COLUMNS fields of the cached movies
+    """
+    global _catalog_frame, _catalog_frame_version
+    if keys is not None:
+        return _entries_frame(list(catalog.get_many(keys).items()))
+    if _catalog_frame is None or _catalog_frame_version != catalog.version:
+        version = catalog.version
+        _catalog_frame = _entries_frame(catalog.items())
+        _catalog_frame_version = version
+    return _catalog_frame
+
+def _entries_frame(items: List[Tuple[str, CatalogEntry]]) -> pd.DataFrame:
+    """Build the columnar view for (key, entry) pairs"""
+    entries = [entry for _, entry in items]
+    return pd.DataFrame({
+        "public_rating": [entry.public_rating for entry in entries],
+        "vote_count": [entry.vote_count for entry in entries],
+        "popularity": [entry.popularity for entry in entries],
+        "poster_path": [entry.poster_path for entry in entries],
+    }, index=pd.Index([key for key, _ in items], name="title_with_year"), columns=CATALOG_COLUMNS)
 
 def get_public_movie_data(title: str, year: int, cache: Optional[Dict[str, Any]] = None) -> Tuple[float, float, float, str]:
     """
     Get public movie data from database, local cache, or TMDb API.
+    Single-movie convenience wrapper around `resolve_movies`.
     
     Args:
         title: Movie title
@@ -76,134 +161,320 @@ def get_public_movie_data(title: str, year: int, cache: Optional[Dict[str, Any]]
     Returns:
         Tuple of (public_rating, vote_count, popularity, poster_url)
     """
-    global stats
-    stats["total_requests"] += 1
     key = f"{title} ({year})"
+    result = resolve_movies([(title, year)])[key]
     
-    start_time = time.time()
+    # For backward compatibility, also update the provided cache if it is not the catalog itself
+    if cache is not None and cache is not catalog and key in catalog:
+        cache[key] = catalog[key]
     
-    # First check local memory cache to reduce DB queries
-    if key in _local_cache:
-        stats["local_cache_hits"] += 1
-        elapsed = time.time() - start_time
-        logger.info(f"✅ LOCAL CACHE HIT for {key} in {elapsed*1000:.1f}ms (Hit rate: {stats['local_cache_hits']/stats['total_requests']*100:.1f}%)")
-        data = _local_cache[key]
-        poster_path = data.get("poster_path", "")
-        poster_url = f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else ""
-        return data["public_rating"], data["vote_count"], data["popularity"], poster_url
-
-    # Then check if this movie has an override in the database
-    override_data = db.get_override(key)
-    if override_data:
-        stats["override_hits"] += 1
-        elapsed = time.time() - start_time
-        logger.info(f"✅ OVERRIDE HIT for {key} in {elapsed*1000:.1f}ms")
-        public_rating = override_data.get("public_rating", 0.0)
-        vote_count = override_data.get("vote_count", 0)
-        popularity = override_data.get("popularity", 0)
-        poster_path = override_data.get("poster_path", "")
-        poster_url = f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else ""
-        
-        # Cache in local memory
-        _local_cache[key] = override_data
-        
-        return public_rating, vote_count, popularity, poster_url
-    
-    # Then check if the movie is in the database
-    movie_data = db.get_movie(key)
-    if movie_data:
-        stats["db_hits"] += 1
-        elapsed = time.time() - start_time
-        logger.info(f"✅ DATABASE HIT for {key} in {elapsed*1000:.1f}ms")
-        poster_path = movie_data.get("poster_path", "")
-        poster_url = f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else ""
-        
-        # Cache in local memory
-        _local_cache[key] = movie_data
-        
-        return movie_data["public_rating"], movie_data["vote_count"], movie_data["popularity"], poster_url
+    return result
+
+def resolve_movies(movies: Iterable[Tuple[str, Any]],
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   uris: Optional[Dict[str, str]] = None) -> Dict[str, Tuple[float, float, float, str]]:
+    """
+    Resolve public data for many movies at once.
+    Catalog hits are answered in memory; all misses are looked up with one bulk
+    overrides query and one bulk movies query, and only what is still missing
+    goes to TMDb. Precedence is override, then stored movie (under the exact key, then
+    through the title index), then TMDb.
+    Misses already being resolved by another thread are not looked up again;
+    this call waits for that thread's result instead.
     
-    # Otherwise, fetch from TMDb API
-    stats["api_hits"] += 1
-    elapsed = time.time() - start_time
-    logger.warning(f"⚠️ API LOOKUP for {key} in {elapsed*1000:.1f}ms (API hits: {stats['api_hits']}/{stats['total_requests']})")
-    full_api_data = fetch_from_tmdb(title, year)
-    
-    # Handle case where no movie was found
-    if not full_api_data:
-        logger.warning(f"No data found for {key}")
-        return 0.0, 0.0, 0.0, ""
-    
-    # Extract the values we need
-    public_rating = full_api_data.get("vote_average", 0.0) / 2.0  # Convert TMDB 10-point to 5-point scale
-    vote_count = full_api_data.get("vote_count", 0.0)
-    popularity = full_api_data.get("popularity", 0.0)
-
-    # Create movie data record
-    movie_data = {
-        # Our processed values (what we actually use)
-        "public_rating": public_rating,
-        "vote_count": vote_count,
-        "popularity": popularity,
-        
-        # Additional TMDB fields that might be useful later
-        "tmdb_id": full_api_data.get("id"),
-        "original_title": full_api_data.get("original_title"),
-        "overview": full_api_data.get("overview"),
-        "poster_path": full_api_data.get("poster_path", ""),
-        "backdrop_path": full_api_data.get("backdrop_path", ""),
-        "genre_ids": full_api_data.get("genre_ids", []),
-        "release_date": full_api_data.get("release_date", ""),
-        "original_language": full_api_data.get("original_language", ""),
-        "adult": full_api_data.get("adult", False),
-        "video": full_api_data.get("video", False),
+    Args:
+        movies: Iterable of (title, year) pairs; duplicates are resolved once
+        progress: Called with (movies resolved so far, distinct movies) as resolution advances
+        uris: Letterboxd film URI by "Title (Year)" key, where known; identifies films
+            whose title or year differs from the stored one, and is learned for later uploads
         
-        # Store original unprocessed rating for reference
-        "tmdb_vote_average": full_api_data.get("vote_average", 0.0)
-    }
+    Returns:
+        Dictionary keyed by "Title (Year)" with (public_rating, vote_count, popularity, poster_url)
+    """
+    start_time = time.time()
+    titles: Dict[str, Tuple[str, Any]] = {}
+    for title, year in movies:
+        titles.setdefault(f"{title} ({year})", (title, year))
     
-    # Save to database
-    db.add_or_update_movie(key, movie_data)
+    results: Dict[str, Tuple[float, float, float, str]] = {}
+    misses = []
+    negative_hits = 0
+    for key in titles:
+        entry = catalog.get(key)
+        if entry is not None:
+            results[key] = entry.as_tuple()
+        elif _is_negative(key):
+            results[key] = (0.0, 0.0, 0.0, "")
+            negative_hits += 1
+        else:
+            misses.append(key)
+    metrics.movie_lookup_requests.inc(len(titles))
+    metrics.count_lookups("local", len(results) - negative_hits)
+    if REFRESH_ENABLED:
+        # Stored data is served as is; expired movies are refreshed in the background, these first
+        refresher.record_demand(results.keys())
+    metrics.count_lookups("negative", negative_hits)
+    metrics.observe_catalog(catalog)
+    if progress is not None:
+        progress(len(results), len(titles))
     
-    # For backward compatibility, also update the provided cache if present
-    if cache is not None:
-        cache[key] = movie_data
+    # Coalesce with concurrent uploads: lead the misses nobody is resolving yet,
+    # wait on the others
+    leading, waiting = flights.claim(misses)
+    pending = set(leading)
     
-    # Also cache in local memory
-    _local_cache[key] = movie_data
-
-    # Create the poster URL
-    poster_path = full_api_data.get("poster_path", "")
-    poster_url = f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else ""
+    def publish(key: str, value: Tuple[float, float, float, str]) -> None:
+        results[key] = value
+        pending.discard(key)
+        flights.complete(key, value)
+        if progress is not None:
+            progress(len(results), len(titles))
+    
+    def searched(count: int) -> None:
+        # TMDb searches finish before their results are published; count them as they land
+        if progress is not None:
+            progress(min(len(results) + count, len(titles)), len(titles))
+    
+    fetched_count = 0
+    try:
+        fetched_count = _resolve_misses(leading, titles, publish, searched, uris or {})
+    except BaseException as e:
+        flights.fail(pending, e)
+        raise
+    
+    if waiting:
+        metrics.coalesced_lookups.inc(len(waiting))
+        for key, future in waiting.items():
+            try:
+                results[key] = future.result(timeout=SINGLEFLIGHT_TIMEOUT)
+            except FutureTimeoutError:
+                logger.warning(f"Timed out waiting for concurrent lookup of {key}")
+                results[key] = (0.0, 0.0, 0.0, "")
+    if progress is not None:
+        progress(len(results), len(titles))
+    
+    # Write this request's new movies in the background rather than before responding
+    write_buffer.request_flush()
+    if uris and TITLE_INDEX_ENABLED:
+        title_index.learn_later(uris)
+    
+    elapsed = time.time() - start_time
+    logger.info(f"Resolved {len(titles)} movies in {elapsed:.2f} seconds ({fetched_count} from TMDb, {len(waiting)} coalesced)")
+    return results
 
-    return public_rating, vote_count, popularity, poster_url
+def _resolve_misses(keys: List[str], titles: Dict[str, Tuple[str, Any]],
+                    publish: Callable[[str, Tuple[float, float, float, str]], None],
+                    searched: Optional[Callable[[int], None]] = None,
+                    uris: Optional[Dict[str, str]] = None) -> int:
+    """
+    Resolve catalog misses led by this thread, publishing each result as soon as it is known.
+    
+    Returns:
+        Number of movies requested from TMDb
+    """
+    # Another thread may have finished these between our catalog check and the claim
+    misses = []
+    for key in keys:
+        entry = catalog.get(key)
+        if entry is not None:
+            publish(key, entry.as_tuple())
+        else:
+            misses.append(key)
+    metrics.count_lookups("local", len(keys) - len(misses))
+    if not misses:
+        return 0
+    
+    overrides = db.get_overrides_bulk(misses)
+    for key, override_data in overrides.items():
+        catalog.put(key, override_data, is_override=True)
+        publish(key, _movie_tuple(override_data))
+    metrics.count_lookups("override", len(overrides))
+    
+    misses = [key for key in misses if key not in overrides]
+    stored = db.get_movies_bulk(misses) if misses else {}
+    for key, movie_data in stored.items():
+        catalog.put(key, movie_data)
+        publish(key, _movie_tuple(movie_data))
+    metrics.count_lookups("db", len(stored))
+    misses = [key for key in misses if key not in stored]
+    
+    # Movies stored under another spelling or year, or whose TMDb id is known from their URI
+    known_ids: Dict[str, Any] = {}
+    if misses and TITLE_INDEX_ENABLED:
+        misses, known_ids = _resolve_from_index(misses, titles, uris or {}, publish)
+    
+    # Titles TMDb recently failed to resolve are not searched again until they expire
+    # (a known id is fetched directly, so its search failing does not matter)
+    negatives = db.get_negatives_bulk([key for key in misses if key not in known_ids]) if misses else {}
+    for key, negative in negatives.items():
+        _remember_negative(key, as_utc(negative["expires_at"]).timestamp())
+        publish(key, (0.0, 0.0, 0.0, ""))
+    metrics.count_lookups("negative", len(negatives))
+    misses = [key for key in misses if key not in negatives]
+    if not misses:
+        return 0
+    
+    # Fetch everything still missing from TMDb concurrently: by id where it is known, else by search
+    metrics.count_lookups("tmdb", len(misses))
+    logger.warning(f"⚠️ API LOOKUP for {len(misses)} movies")
+    by_id = [(key, known_ids[key]) for key in misses if key in known_ids]
+    fetched = tmdbClient.get_movies(by_id, searched)
+    fetched.update(tmdbClient.search_movies(
+        [(key, *titles[key]) for key in misses if key not in known_ids],
+        (lambda count: searched(len(by_id) + count)) if searched is not None else None
+    ))
+    unresolved: Dict[str, str] = {}
+    for key in misses:
+        if key not in fetched:
+            # TMDb was unavailable; degrade to no data without remembering it as a miss
+            publish(key, (0.0, 0.0, 0.0, ""))
+            continue
+        full_api_data = fetched[key]
+        if not full_api_data:
+            logger.warning(f"No data found for {key}")
+            unresolved[key] = "not_found"
+            publish(key, (0.0, 0.0, 0.0, ""))
+            continue
+        if not full_api_data.get("vote_count"):
+            unresolved[key] = "no_votes"
+            publish(key, (0.0, 0.0, 0.0, ""))
+            continue
+        publish(key, _movie_tuple(_store_tmdb_result(key, full_api_data)))
+    
+    if unresolved:
+        db.add_negatives(unresolved, NEGATIVE_CACHE_TTL)
+        expires_at = time.time() + NEGATIVE_CACHE_TTL
+        for key in unresolved:
+            _remember_negative(key, expires_at)
+    return len(misses)
 
-def fetch_from_tmdb(title: str, year: int) -> Dict[str, Any]:
+def _resolve_from_index(misses: List[str], titles: Dict[str, Tuple[str, Any]], uris: Dict[str, str],
+                        publish: Callable[[str, Tuple[float, float, float, str]], None]) -> Tuple[List[str], Dict[str, Any]]:
     """
-    Fetch movie data from TMDb based on movie title and year.
-    Returns the full API response for the first matching movie, or empty dict if not found.
+    Answer misses from stored movies found through the title index: by Letterboxd URI
+    first, then by normalized title, original title and nearby years. Each match is
+    cached under the requested key as well, so the next lookup is a catalog hit.
+    
+    Returns:
+        (keys still unresolved, {key: tmdb_id} for unresolved keys whose TMDb id is known)
     """
-    if not TMDB_API_KEY:
-        raise ValueError("TMDB_API_KEY is not set!")
+    try:
+        title_index.sync()
+    except Exception as e:
+        logger.error(f"Error syncing title index with MongoDB: {e}")
+    
+    aliases: Dict[str, str] = {}
+    known_ids: Dict[str, Any] = {}
+    for key in misses:
+        tmdb_id = title_index.tmdb_id_for_uri(uris.get(key))
+        if tmdb_id is not None:
+            stored_key = title_index.key_for_tmdb_id(tmdb_id)
+        else:
+            stored_key = title_index.match(*titles[key])
+        if stored_key is not None and stored_key != key:
+            aliases[key] = stored_key
+        elif tmdb_id is not None:
+            known_ids[key] = tmdb_id
+    if not aliases:
+        return misses, known_ids
+    
+    stored_keys = set(aliases.values())
+    documents: Dict[str, Any] = catalog.get_many(stored_keys)
+    documents.update(db.get_movies_bulk([key for key in stored_keys if key not in documents]))
+    matched = 0
+    for key, stored_key in aliases.items():
+        document = documents.get(stored_key)
+        if document is None:
+            # Removed since it was indexed
+            continue
+        catalog.put(key, document)
+        publish(key, _movie_tuple(document))
+        matched += 1
+    metrics.count_lookups("index", matched)
+    if matched:
+        logger.info(f"Matched {matched} movies to stored titles through the title index")
+    return [key for key in misses if key not in aliases or aliases[key] not in documents], known_ids
 
-    url = "https://api.themoviedb.org/3/search/movie"
-    params = {
-        "api_key": TMDB_API_KEY,
-        "query": title,
-        "year": str(year),
-    }
+def _is_negative(key: str) -> bool:
+    """Whether TMDb recently failed to resolve this key"""
+    with _negatives_lock:
+        expires_at = _negatives.get(key)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            del _negatives[key]
+            return False
+        _negatives.move_to_end(key)
+        return True
 
-    response = requests.get(url, params=params)
-    response.raise_for_status()
+def _remember_negative(key: str, expires_at: float) -> None:
+    with _negatives_lock:
+        _negatives[key] = expires_at
+        _negatives.move_to_end(key)
+        while len(_negatives) > NEGATIVE_CACHE_MAX_ENTRIES:
+            _negatives.popitem(last=False)
+
+def _movie_tuple(data: Dict[str, Any]) -> Tuple[float, float, float, str]:
+    """Extract (public_rating, vote_count, popularity, poster_url) from a stored movie, override or catalog entry"""
+    return (
+        data.get("public_rating") or 0.0,
+        data.get("vote_count") or 0,
+        data.get("popularity") or 0,
+        build_poster_url(data.get("poster_path"))
+    )
+
+def _store_tmdb_result(key: str, full_api_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the stored movie record from a TMDb search result or movie details, save it and cache it.
+    
+    Returns:
+        The stored movie record
+    """
+    # Create movie data record, noting when it was fetched and when it should be fetched again (see refresher.py)
+    now = utc_now()
+    movie_data = tmdbClient.movie_record(full_api_data)
+    movie_data["fetched_at"] = now
+    movie_data["refresh_at"] = next_refresh_at(movie_data, key, now)
+    movie_data["refresh_failures"] = 0
+    
+    # Save to database (batched by the write-behind buffer unless disabled)
+    if WRITE_BEHIND_ENABLED:
+        write_buffer.add(key, movie_data)
+    else:
+        db.add_or_update_movie(key, movie_data)
+    
+    # Also cache in local memory so reads do not wait for the flush
+    catalog.put(key, movie_data)
+    title_index.add(key, movie_data)
+    
+    return movie_data
 
-    data = response.json()
+def _refresh_movie(movie: Dict[str, Any]) -> bool:
+    """
+    Re-fetch a stored movie, by TMDb id where known, and store the new data.
+    
+    Returns:
+        True if the movie was refreshed, False if TMDb had nothing usable for it
+    """
+    key = movie["title_with_year"]
+    if movie.get("tmdb_id") is not None:
+        full_api_data = tmdbClient.get_movie(movie["tmdb_id"])
+    else:
+        full_api_data = tmdbClient.search_movie(*split_key(key))
+    if not full_api_data or not full_api_data.get("vote_count"):
+        return False
+    _store_tmdb_result(key, full_api_data)
+    return True
 
-    if not data["results"]:
-        # No matching movie found
-        return {}
+# Re-fetches expired movies in the background, at its own rate (REFRESH_RATE)
+refresher = MovieRefresher(db, _refresh_movie)
 
-    # Return the first matching movie's full data
-    return data["results"][0]
+def fetch_from_tmdb(title: str, year: int) -> Dict[str, Any]:
+    """
+    Fetch movie data from TMDb based on movie title and year.
+    Returns the full API response for the first matching movie, or empty dict if not found.
+    """
+    return tmdbClient.search_movie(title, year)
 
 def add_or_update_override(title: str, year: int, override_data: Dict[str, Any]) -> bool:
     """
@@ -224,32 +495,13 @@ def add_or_update_override(title: str, year: int, override_data: Dict[str, Any])
     
     # Update local cache too
     if success:
-        _local_cache[key] = override_data
+        catalog.put(key, override_data, is_override=True)
         
     return success
 
 def clear_local_cache() -> None:
-    """Clear the local movie data cache"""
-    _local_cache.clear()
+    """Clear the local movie data cache; the next sync reloads it from MongoDB"""
+    catalog.clear()
+    with _negatives_lock:
+        _negatives.clear()
     logger.info("Local movie cache cleared")
-
-def log_stats() -> None:
-    """Log statistics about movie data sources"""
-    if stats["total_requests"] == 0:
-        logger.info("No movie data requests made yet")
-        return
-    
-    logger.info("=== MOVIE DATA SOURCE STATISTICS ===")
-    logger.info(f"Total requests: {stats['total_requests']}")
-    logger.info(f"Local cache hits: {stats['local_cache_hits']} ({stats['local_cache_hits']/stats['total_requests']*100:.1f}%)")
-    logger.info(f"Override hits: {stats['override_hits']} ({stats['override_hits']/stats['total_requests']*100:.1f}%)")
-    logger.info(f"Database hits: {stats['db_hits']} ({stats['db_hits']/stats['total_requests']*100:.1f}%)")
-    logger.info(f"API hits: {stats['api_hits']} ({stats['api_hits']/stats['total_requests']*100:.1f}%)")
-    logger.info("====================================")
-    
-    # Reset stats after logging
-    stats["local_cache_hits"] = 0
-    stats["override_hits"] = 0
-    stats["db_hits"] = 0
-    stats["api_hits"] = 0
-    stats["total_requests"] = 0
\ No newline at end of file
@@ -0,0 +1,239 @@
+"""
+Background refresh of stored TMDb data for MeterBoxd
+"""
+import os
+import random
+import threading
+import time
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional
+from timeutil import utc_now
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-refresher")
+
+# Re-fetch stored movies from TMDb once their data expires; set to false to keep data forever
+REFRESH_ENABLED = os.getenv("REFRESH_ENABLED", "true").lower() == "true"
+
+# TMDb requests per second spent on refreshes by each replica, on top of (and counted
+# against) TMDB_RATE_LIMIT; split evenly between its WEB_CONCURRENCY gunicorn workers,
+# so the total across replicas is REFRESH_RATE times the number of replicas
+REFRESH_RATE = float(os.getenv("REFRESH_RATE", "1"))
+_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+# Movies claimed per refresh round
+REFRESH_BATCH_SIZE = int(os.getenv("REFRESH_BATCH_SIZE", "20"))
+
+# Seconds to wait before looking again when nothing is due
+REFRESH_IDLE_INTERVAL = float(os.getenv("REFRESH_IDLE_INTERVAL", "60"))
+
+# Seconds a claimed movie is left alone if its refresh fails (TMDb down, movie gone),
+# doubled after each further failure up to REFRESH_RETRY_MAX
+REFRESH_RETRY_AFTER = float(os.getenv("REFRESH_RETRY_AFTER", "3600"))
+REFRESH_RETRY_MAX = float(os.getenv("REFRESH_RETRY_MAX", str(30 * 24 * 3600)))
+
+# Movies given a refresh time per write when scheduling those stored before refresh times existed
+REFRESH_BACKFILL_BATCH_SIZE = int(os.getenv("REFRESH_BACKFILL_BATCH_SIZE", "1000"))
+
+# How long data is served before it is refreshed, by age of the release: votes and
+# popularity of recent releases move daily, those of older films barely at all
+REFRESH_TTL_RECENT = float(os.getenv("REFRESH_TTL_RECENT", str(24 * 3600)))
+REFRESH_TTL_CURRENT = float(os.getenv("REFRESH_TTL_CURRENT", str(7 * 24 * 3600)))
+REFRESH_TTL_CLASSIC = float(os.getenv("REFRESH_TTL_CLASSIC", str(60 * 24 * 3600)))
+
+# Releases younger than this many days use REFRESH_TTL_RECENT, younger than
+# REFRESH_CURRENT_DAYS use REFRESH_TTL_CURRENT, and older ones REFRESH_TTL_CLASSIC
+REFRESH_RECENT_DAYS = int(os.getenv("REFRESH_RECENT_DAYS", "90"))
+REFRESH_CURRENT_DAYS = int(os.getenv("REFRESH_CURRENT_DAYS", str(2 * 365)))
+
+# Spread of expiry times, so movies stored together do not all come due together
+_TTL_JITTER = 0.1
+
+def _release_date(movie_data: Dict[str, Any], key: Optional[str] = None) -> Optional[date]:
+    """Release date of a stored movie, falling back to January 1st of the key's year"""
+    release_date = movie_data.get("release_date")
+    if release_date:
+        try:
+            return datetime.strptime(str(release_date)[:10], "%Y-%m-%d").date()
+        except ValueError:
+            pass
+    if key is not None:
+        from titleIndex import split_key
+        year = split_key(key)[1]
+        if year is not None and 1 <= year <= 9999:
+            return date(year, 1, 1)
+    return None
+
+def refresh_ttl(movie_data: Dict[str, Any], key: Optional[str] = None, today: Optional[date] = None) -> float:
+    """Seconds a movie's data is served before it is refreshed"""
+    released = _release_date(movie_data, key)
+    if released is None:
+        return REFRESH_TTL_CURRENT
+    age = ((today or date.today()) - released).days
+    if age < REFRESH_RECENT_DAYS:
+        return REFRESH_TTL_RECENT
+    if age < REFRESH_CURRENT_DAYS:
+        return REFRESH_TTL_CURRENT
+    return REFRESH_TTL_CLASSIC
+
+def next_refresh_at(movie_data: Dict[str, Any], key: Optional[str] = None,
+                    now: Optional[datetime] = None) -> datetime:
+    """When a movie fetched at `now` is due for a refresh"""
+    now = now or utc_now()
+    ttl = refresh_ttl(movie_data, key, now.date())
+    return now + timedelta(seconds=ttl * random.uniform(1 - _TTL_JITTER, 1 + _TTL_JITTER))
+
+def retry_delay(failures: int) -> float:
+    """Seconds before retrying a movie whose refresh has now failed `failures` times in a row"""
+    return min(REFRESH_RETRY_AFTER * 2 ** max(0, failures - 1), REFRESH_RETRY_MAX)
+
+class MovieRefresher:
+    """
+    Keeps stored TMDb data fresh without making uploads wait for it (stale-while-revalidate).
+
+    Lookups keep serving whatever is stored; every stored movie carries a `refresh_at`
+    time (see `next_refresh_at`), and a background thread re-fetches movies past it.
+    Each round claims a batch of due movies in MongoDB, so replicas do not refresh the
+    same ones, taking the titles this process's uploads asked for most since the last
+    round first and the longest overdue after that. Refreshes are spaced to this worker's
+    share of REFRESH_RATE and paused while the TMDb circuit is open; a movie whose refresh
+    fails is retried after a delay that doubles with each failure. Refreshed movies are
+    written like new ones, so every worker's catalog picks them up on its next sync.
+
+    Movies stored before refresh times were recorded are first given one spread over
+    their own TTL, rather than all coming due at once.
+    """
+
+    def __init__(self, database, refresh_movie: Callable[[Dict[str, Any]], bool],
+                 rate: float = REFRESH_RATE / _WORKERS, batch_size: int = REFRESH_BATCH_SIZE,
+                 idle_interval: float = REFRESH_IDLE_INTERVAL):
+        self._db = database
+        self._refresh_movie = refresh_movie
+        self._interval = 1.0 / rate if rate > 0 else 0.0
+        self._batch_size = batch_size
+        self._idle_interval = idle_interval
+        self._demand: Counter = Counter()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._backfilled = False
+        self.refreshed = 0
+        self.failed = 0
+
+    def record_demand(self, keys: Iterable[str]) -> None:
+        """Count lookups of these keys, so the titles users ask for are refreshed first"""
+        with self._lock:
+            # One count per key: a mapping passed to Counter.update would be read as counts
+            for key in keys:
+                self._demand[key] += 1
+        self.start()
+
+    def start(self) -> None:
+        """Start the refresh thread lazily, and again in a forked child where it no longer exists"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="movie-refresher", daemon=True)
+            self._thread.start()
+
+    def backfill(self, now: Optional[datetime] = None) -> int:
+        """
+        Give every movie stored without a refresh time one, uniformly spread over its TTL
+
+        Returns:
+            Number of movies scheduled
+        """
+        now = now or utc_now()
+        scheduled = 0
+        while True:
+            movies = self._db.get_movies_without_refresh_time(REFRESH_BACKFILL_BATCH_SIZE)
+            if not movies:
+                break
+            times = {}
+            for movie in movies:
+                key = movie["title_with_year"]
+                ttl = refresh_ttl(movie, key, now.date())
+                times[key] = now + timedelta(seconds=ttl * random.random())
+            updated = self._db.set_refresh_times(times)
+            scheduled += updated
+            if not updated:
+                # Nothing could be written; try again next time rather than loop
+                break
+        if scheduled:
+            logger.info(f"Scheduled refreshes of {scheduled} movies stored without a refresh time")
+        return scheduled
+
+    def _run(self) -> None:
+        while True:
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                logger.error(f"Movie refresh round failed: {e}")
+                processed = 0
+            if not processed:
+                time.sleep(self._idle_interval)
+
+    def run_once(self) -> int:
+        """
+        Claim and refresh one batch of due movies.
+
+        Returns:
+            Number of movies claimed (0 if nothing is due or TMDb is unavailable)
+        """
+        import tmdbClient
+
+        if not tmdbClient.TMDB_API_KEY or tmdbClient.breaker.is_open():
+            return 0
+        if not self._backfilled:
+            self.backfill()
+            self._backfilled = True
+        with self._lock:
+            hot = [key for key, _ in self._demand.most_common(self._batch_size * 10)]
+            self._demand.clear()
+
+        now = utc_now()
+        due = self._db.get_movies_due_for_refresh(now, self._batch_size, keys=hot) if hot else []
+        if len(due) < self._batch_size:
+            seen = {movie["title_with_year"] for movie in due}
+            due += [movie for movie in self._db.get_movies_due_for_refresh(now, self._batch_size)
+                    if movie["title_with_year"] not in seen][:self._batch_size - len(due)]
+        claimed = self._db.claim_refresh([movie["title_with_year"] for movie in due], now,
+                                         now + timedelta(seconds=REFRESH_RETRY_AFTER))
+        batch = [movie for movie in due if movie["title_with_year"] in claimed]
+        if not batch:
+            return 0
+
+        start_time = time.time()
+        refreshed = 0
+        for movie in batch:
+            next_call = time.monotonic() + self._interval
+            try:
+                success = self._refresh_movie(movie)
+            except Exception as e:
+                logger.warning(f"Could not refresh {movie['title_with_year']}: {e}")
+                success = False
+            if success:
+                refreshed += 1
+            else:
+                failures = movie.get("refresh_failures", 0) + 1
+                self._db.record_refresh_failure(movie["title_with_year"],
+                                                utc_now() + timedelta(seconds=retry_delay(failures)))
+            if tmdbClient.breaker.is_open():
+                break
+            time.sleep(max(0.0, next_call - time.monotonic()))
+        self.refreshed += refreshed
+        self.failed += len(batch) - refreshed
+
+        elapsed = time.time() - start_time
+        logger.info(f"Refreshed {refreshed} of {len(batch)} expired movies in {elapsed:.2f} seconds")
+        return len(batch)
+
+    def counters(self) -> Dict[str, int]:
+        return {"refreshed": self.refreshed, "failed": self.failed, "demanded": len(self._demand)}
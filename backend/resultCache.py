@@ -0,0 +1,123 @@
+"""
+Content-addressed cache of upload results
+"""
+import os
+import threading
+import logging
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Optional
+from timeutil import utc_now
+from dotenv import load_dotenv
+
+# Load environment variables from .env file (the settings below are read at import)
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-result-cache")
+
+# Cache upload results; set to false to analyze every upload from scratch
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+
+# Results kept in each process's memory tier
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))
+
+# Also keep results in MongoDB, shared by every worker and replica
+RESULT_CACHE_MONGO = os.getenv("RESULT_CACHE_MONGO", "true").lower() == "true"
+
+# Seconds a result is kept in MongoDB (results also stop matching once movie data changes)
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", str(24 * 60 * 60)))
+
+class ResultCache:
+    """
+    Upload responses keyed by a hash of the export's content and of the data held for its films.
+
+    Lookups try an in-process LRU first, then the MongoDB "result-cache" collection;
+    a MongoDB hit is copied into the LRU. Keys embed the films' data, so results
+    computed from older movie data are simply never looked up again and age out.
+    """
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES, use_mongo: bool = RESULT_CACHE_MONGO,
+                 ttl: int = RESULT_CACHE_TTL):
+        self._max_entries = max_entries
+        self._use_mongo = use_mongo
+        self._ttl = ttl
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._collection = None
+        self.memory_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.Lock()
+        # The collection handle belongs to the parent's MongoClient
+        self._collection = None
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            from database import MovieDatabase
+            collection = MovieDatabase().db["result-cache"]
+            # MongoDB removes results once they expire
+            collection.create_index("expires_at", expireAfterSeconds=0)
+            self._collection = collection
+        return self._collection
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The cached response for `key`, or None"""
+        with self._lock:
+            response = self._entries.get(key)
+            if response is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return response
+
+        if self._use_mongo:
+            try:
+                document = self.collection.find_one({"_id": key}, {"response": 1})
+            except Exception as e:
+                logger.error(f"Error reading cached result: {e}")
+                document = None
+            if document is not None:
+                self._remember(key, document["response"])
+                self.mongo_hits += 1
+                return document["response"]
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, response: Dict[str, Any]) -> None:
+        """Cache a response in both tiers"""
+        self._remember(key, response)
+        if not self._use_mongo:
+            return
+        try:
+            expires_at = utc_now() + timedelta(seconds=self._ttl)
+            self.collection.replace_one({"_id": key}, {"_id": key, "response": response, "expires_at": expires_at},
+                                        upsert=True)
+        except Exception as e:
+            logger.error(f"Error caching result: {e}")
+
+    def _remember(self, key: str, response: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop the in-process tier (MongoDB entries expire on their own)"""
+        with self._lock:
+            self._entries.clear()
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "mongo_hits": self.mongo_hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,240 @@
+"""
+Seed the movie-data collection from local TMDb files, without calling TMDb
+
+Every movie missing from MongoDB costs a live TMDb search during some user's
+upload. This tool pre-loads a new environment (or a fresh cluster) from files
+on disk instead. Each input is read line by line, plain or gzipped, and every
+line is recognized by its fields:
+
+    - TMDb movie details, one JSON object per line (`id`, `title`, `release_date`,
+      `vote_average`, `vote_count`, ...): stored under "Title (Year)" exactly as a
+      live lookup would store them
+    - Stored movie documents (with a `title_with_year`), e.g. a mongoexport of another
+      environment's movie-data collection: stored as they are
+    - Rows of TMDb's daily ID export (`id`, `original_title`, `popularity`): they carry
+      no release year, so they cannot create movies, but they update the popularity of
+      movies already stored under that `tmdb_id`
+
+Documents are upserted by key in unordered batches, and a movie fetched live after
+the file was written is left alone. Seeded movies are dated by the file (or
+--fetched-at), so the background refresher (see refresher.py) updates the stale ones.
+The line reached is saved after every batch in "<input>.progress", so an
+interrupted run continues where it stopped; --restart starts over.
+
+Usage:
+    python seed.py FILE [FILE ...] [--batch-size N] [--min-votes N] [--fetched-at DATE] [--restart]
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, IO, Iterator, Optional, Tuple
+from bson import json_util
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from dotenv import load_dotenv
+from timeutil import as_utc, utc_now
+
+# Load environment variables from .env file
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-seed")
+
+# Documents upserted per bulk write (and lines between progress checkpoints)
+SEED_BATCH_SIZE = 1000
+
+# Movies with fewer TMDb votes are skipped, as a live lookup skips movies without votes
+SEED_MIN_VOTES = 1
+
+# Seconds between throughput reports
+REPORT_INTERVAL = 10.0
+
+# Duplicate key error code, raised when a newer document holds the key (or the tmdb_id)
+DUPLICATE_KEY_ERROR = 11000
+
+def open_input(path: str) -> IO[str]:
+    """Open an input file as text, decompressing it if it is gzipped"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+def read_lines(path: str, skip: int = 0) -> Iterator[Tuple[int, Optional[Dict[str, Any]]]]:
+    """
+    Yield (line number, parsed object) for every line after the first `skip`;
+    the object is None for blank or malformed lines
+    """
+    with open_input(path) as lines:
+        for number, line in enumerate(lines, 1):
+            if number <= skip:
+                continue
+            line = line.strip()
+            if not line:
+                yield number, None
+                continue
+            try:
+                # Extended JSON, so mongoexport dates and ids read back as they were stored
+                document = json_util.loads(line)
+            except ValueError:
+                document = None
+            yield number, document if isinstance(document, dict) else None
+
+def seed_operation(document: Dict[str, Any], fetched_at: datetime, now: datetime,
+                   min_votes: int = SEED_MIN_VOTES) -> Optional[UpdateOne]:
+    """
+    The write for one input line.
+
+    Returns:
+        An upsert for a movie, a popularity update for an ID export row, or None
+        if the line is not usable
+    """
+    from tmdbClient import movie_record
+    from refresher import next_refresh_at
+
+    if document.get("title_with_year"):
+        key = document["title_with_year"]
+        movie_data = {field: value for field, value in document.items() if field != "_id"}
+    elif document.get("title") and document.get("release_date") and document.get("id") is not None:
+        if (document.get("vote_count") or 0) < min_votes:
+            return None
+        key = f"{document['title']} ({str(document['release_date'])[:4]})"
+        movie_data = movie_record(document)
+        movie_data["title_with_year"] = key
+    elif document.get("id") is not None and "popularity" in document:
+        return UpdateOne({"tmdb_id": document["id"]},
+                         {"$set": {"popularity": document["popularity"], "updated_at": now}})
+    else:
+        return None
+
+    movie_data.setdefault("fetched_at", fetched_at)
+    if not movie_data.get("refresh_at"):
+        movie_data["refresh_at"] = next_refresh_at(movie_data, key, movie_data["fetched_at"])
+    # The watermark lets running catalogs pick up seeded movies on their next sync
+    movie_data["updated_at"] = now
+    # Matches nothing if a newer copy is stored, so the upsert collides on the unique key and is skipped
+    return UpdateOne({"title_with_year": key, "fetched_at": {"$not": {"$gt": movie_data["fetched_at"]}}},
+                     {"$set": movie_data}, upsert=True)
+
+def write_batch(collection, operations) -> Tuple[int, int]:
+    """
+    Run one unordered bulk write.
+
+    Returns:
+        (documents inserted or updated, documents skipped because a newer or
+        conflicting movie is stored)
+    """
+    if not operations:
+        return 0, 0
+    try:
+        result = collection.bulk_write(operations, ordered=False)
+        return result.upserted_count + result.modified_count, 0
+    except BulkWriteError as bwe:
+        errors = bwe.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        return bwe.details.get("nUpserted", 0) + bwe.details.get("nModified", 0), len(errors)
+
+def load_progress(path: str) -> int:
+    """Lines of `path` already seeded by an earlier run (0 if it changed since)"""
+    try:
+        with open(f"{path}.progress", "r") as f:
+            progress = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    stat = os.stat(path)
+    if progress.get("size") != stat.st_size or progress.get("mtime") != stat.st_mtime:
+        logger.warning(f"{path} changed since the last run, starting over")
+        return 0
+    return int(progress.get("lines", 0))
+
+def save_progress(path: str, lines: int) -> None:
+    stat = os.stat(path)
+    temporary = f"{path}.progress.tmp"
+    with open(temporary, "w") as f:
+        json.dump({"lines": lines, "size": stat.st_size, "mtime": stat.st_mtime}, f)
+    os.replace(temporary, f"{path}.progress")
+
+def seed_file(collection, path: str, batch_size: int = SEED_BATCH_SIZE, min_votes: int = SEED_MIN_VOTES,
+              fetched_at: Optional[datetime] = None, resume: bool = True) -> Dict[str, int]:
+    """
+    Seed movies from one file, saving progress after every batch
+
+    Returns:
+        Counts of lines read, documents written, lines skipped and documents left as they were
+    """
+    fetched_at = fetched_at or datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+    start_line = load_progress(path) if resume else 0
+    if start_line:
+        logger.info(f"Resuming {path} after line {start_line}")
+
+    counts = {"lines": 0, "written": 0, "skipped": 0, "kept": 0}
+    operations = []
+    line = start_line
+    start_time = time.time()
+    last_report = start_time
+    for line, document in read_lines(path, start_line):
+        counts["lines"] += 1
+        operation = seed_operation(document, fetched_at, utc_now(), min_votes) if document else None
+        if operation is None:
+            counts["skipped"] += 1
+        else:
+            operations.append(operation)
+        if len(operations) >= batch_size:
+            written, kept = write_batch(collection, operations)
+            counts["written"] += written
+            counts["kept"] += kept
+            operations = []
+            save_progress(path, line)
+            if time.time() - last_report >= REPORT_INTERVAL:
+                last_report = time.time()
+                _report(path, counts, last_report - start_time)
+    written, kept = write_batch(collection, operations)
+    counts["written"] += written
+    counts["kept"] += kept
+    save_progress(path, line)
+
+    _report(path, counts, time.time() - start_time)
+    return counts
+
+def _report(path: str, counts: Dict[str, int], elapsed: float) -> None:
+    rate = counts["written"] / elapsed if elapsed > 0 else 0.0
+    logger.info(f"{path}: {counts['lines']} lines, {counts['written']} documents written "
+                f"({rate:.0f} docs/sec), {counts['skipped']} skipped, {counts['kept']} left as stored")
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed movie data from local TMDb export files")
+    parser.add_argument("paths", nargs="+", help="JSON lines files, optionally gzipped")
+    parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE, help="Documents per bulk write")
+    parser.add_argument("--min-votes", type=int, default=SEED_MIN_VOTES, help="Skip movies with fewer TMDb votes")
+    parser.add_argument("--fetched-at", type=lambda value: as_utc(datetime.fromisoformat(value)),
+                        help="When the data was fetched from TMDb (default: each file's modification time)")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress and read every file from the start")
+    args = parser.parse_args()
+
+    from database import MovieDatabase, ensure_canonical_indexes
+    db = MovieDatabase()
+    if db.movies_collection is None:
+        logger.error("MongoDB connection failed")
+        sys.exit(1)
+    # Create the unique indexes first so upserts by key cannot create duplicates
+    ensure_canonical_indexes(db.movies_collection, db.overrides_collection)
+
+    start_time = time.time()
+    written = 0
+    for path in args.paths:
+        counts = seed_file(db.movies_collection, path, args.batch_size, args.min_votes,
+                           args.fetched_at, resume=not args.restart)
+        written += counts["written"]
+
+    elapsed = time.time() - start_time
+    rate = written / elapsed if elapsed > 0 else 0.0
+    logger.info(f"Seeded {written} documents in {elapsed:.2f} seconds ({rate:.0f} docs/sec)")
+
+if __name__ == "__main__":
+    main()
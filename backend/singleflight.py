@@ -0,0 +1,58 @@
+"""
+Request coalescing for concurrent lookups of the same key
+"""
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Iterable, List, Tuple
+
+class SingleFlight:
+    """
+    Coalesces concurrent work on the same key.
+
+    The first caller to `claim` a key becomes its leader and must eventually
+    `complete` or `fail` it exactly once; callers that claim the key while it
+    is in flight get the leader's future to wait on instead of repeating the
+    work.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def claim(self, keys: Iterable[str]) -> Tuple[List[str], Dict[str, Future]]:
+        """
+        Claim keys for the current caller.
+
+        Returns:
+            (keys this caller now leads, futures for keys already in flight elsewhere)
+        """
+        leading: List[str] = []
+        waiting: Dict[str, Future] = {}
+        with self._lock:
+            for key in keys:
+                future = self._calls.get(key)
+                if future is None:
+                    self._calls[key] = Future()
+                    leading.append(key)
+                else:
+                    waiting[key] = future
+        return leading, waiting
+
+    def complete(self, key: str, value: Any) -> None:
+        """Publish the result for a led key and release it"""
+        with self._lock:
+            future = self._calls.pop(key, None)
+        if future is not None:
+            future.set_result(value)
+
+    def fail(self, keys: Iterable[str], error: BaseException) -> None:
+        """Release led keys that were not completed, propagating `error` to their waiters"""
+        with self._lock:
+            futures = [self._calls.pop(key, None) for key in keys]
+        for future in futures:
+            if future is not None:
+                future.set_exception(error)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
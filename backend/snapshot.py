@@ -0,0 +1,316 @@
+"""
+Local binary snapshot of the movie catalog
+
+A snapshot is a directory of flat NumPy arrays that a worker can memory-map in
+milliseconds instead of scanning the movie-data collection at startup:
+
+    key_hash.npy        uint64, sorted 64-bit hashes of title_with_year
+    key_offsets.npy     int64, start offsets of each key in key_blob (n + 1 entries)
+    key_blob.npy        uint8, UTF-8 encoded keys back to back
+    public_rating.npy   float64
+    vote_count.npy      float64
+    popularity.npy      float64
+    poster_offsets.npy  int64, start offsets of each poster path in poster_blob (n + 1 entries)
+    poster_blob.npy     uint8, UTF-8 encoded poster paths back to back
+    is_override.npy     bool, whether the row came from the overrides collection
+    meta.json           creation time, row count and the sync watermarks
+
+Usage:
+    python snapshot.py build [--path PATH]     Build a snapshot from MongoDB
+    python snapshot.py refresh [--path PATH]   Apply changes since the snapshot's watermark
+    python snapshot.py info [--path PATH]      Print snapshot metadata
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from timeutil import as_utc, utc_now
+
+# Load environment variables from .env file
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-snapshot")
+
+# Where workers look for a snapshot at startup
+CATALOG_SNAPSHOT_PATH = os.getenv(
+    "CATALOG_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(__file__), "cache", "catalog-snapshot")
+)
+
+_NUMERIC_COLUMNS = ("public_rating", "vote_count", "popularity")
+
+def key_hash(key: str) -> int:
+    """Stable 64-bit hash of a catalog key (Python's hash() is randomized per process)"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode strings into one uint8 blob plus an offsets array"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(value) for value in encoded])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+_ARRAY_NAMES = ("key_hash", "key_offsets", "key_blob", "public_rating", "vote_count", "popularity",
+                "poster_offsets", "poster_blob", "is_override")
+
+class CatalogSnapshot:
+    """
+    Read-only columnar view of the catalog, either memory-mapped from disk
+    (`open`) or built in memory (`from_documents`).
+
+    Every row lives in a handful of flat arrays rather than per-movie Python
+    objects, so a snapshot loaded before gunicorn forks stays shared
+    copy-on-write between workers.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any], path: Optional[str] = None):
+        self.path = path
+        self.meta = meta
+        self.key_hash = arrays["key_hash"]
+        self.key_offsets = arrays["key_offsets"]
+        self.key_blob = arrays["key_blob"]
+        self.public_rating = arrays["public_rating"]
+        self.vote_count = arrays["vote_count"]
+        self.popularity = arrays["popularity"]
+        self.poster_offsets = arrays["poster_offsets"]
+        self.poster_blob = arrays["poster_blob"]
+        self.is_override = arrays["is_override"]
+
+    @classmethod
+    def open(cls, path: str, mmap: bool = True) -> "CatalogSnapshot":
+        """Open a snapshot directory, memory-mapping the arrays by default"""
+        mode: Optional[Literal["r+", "r", "w+", "c"]] = "r" if mmap else None
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode) for name in _ARRAY_NAMES}
+        return cls(arrays, meta, path)
+
+    @classmethod
+    def from_documents(cls, documents: Dict[str, Dict[str, Any]], movie_watermark: Optional[datetime],
+                       override_watermark: Optional[datetime]) -> "CatalogSnapshot":
+        """Build an in-memory snapshot from documents keyed by title_with_year"""
+        return cls(_build_arrays(documents), _build_meta(len(documents), movie_watermark, override_watermark))
+
+    def __len__(self) -> int:
+        return len(self.key_hash)
+
+    def key_at(self, index: int) -> str:
+        return bytes(self.key_blob[self.key_offsets[index]:self.key_offsets[index + 1]]).decode("utf-8")
+
+    def poster_path_at(self, index: int) -> str:
+        return bytes(self.poster_blob[self.poster_offsets[index]:self.poster_offsets[index + 1]]).decode("utf-8")
+
+    def find(self, key: str) -> int:
+        """
+        Locate a key with a binary search over the sorted hashes.
+
+        Returns:
+            Row index, or -1 if the key is not in the snapshot
+        """
+        target = np.uint64(key_hash(key))
+        index = int(np.searchsorted(self.key_hash, target))
+        while index < len(self.key_hash) and self.key_hash[index] == target:
+            if self.key_at(index) == key:
+                return index
+            index += 1
+        return -1
+
+    def row(self, index: int) -> Tuple[float, float, float, str]:
+        """(public_rating, vote_count, popularity, poster_path) of a row"""
+        return (
+            float(self.public_rating[index]),
+            float(self.vote_count[index]),
+            float(self.popularity[index]),
+            self.poster_path_at(index),
+        )
+
+    def override_keys(self) -> List[str]:
+        return [self.key_at(int(index)) for index in np.flatnonzero(self.is_override)]
+
+    def watermarks(self) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """(movie watermark, override watermark) the snapshot was taken at"""
+        return (_parse_time(self.meta.get("movie_watermark")),
+                _parse_time(self.meta.get("override_watermark")))
+
+    def documents(self) -> Dict[str, Dict[str, Any]]:
+        """Expand every row back into a document keyed by title_with_year (used by refresh)"""
+        documents = {}
+        for index in range(len(self)):
+            public_rating, vote_count, popularity, poster_path = self.row(index)
+            documents[self.key_at(index)] = {
+                "public_rating": public_rating,
+                "vote_count": vote_count,
+                "popularity": popularity,
+                "poster_path": poster_path,
+                "is_override": bool(self.is_override[index]),
+            }
+        return documents
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    return as_utc(datetime.fromisoformat(value)) if value else None
+
+def max_updated_at(documents: List[Dict[str, Any]], current: Optional[datetime] = None) -> Optional[datetime]:
+    for document in documents:
+        updated_at = document.get("updated_at")
+        if isinstance(updated_at, datetime) and (current is None or updated_at > current):
+            current = updated_at
+    return current
+
+def _build_arrays(documents: Dict[str, Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Lay out documents keyed by title_with_year as snapshot arrays, sorted by key hash"""
+    keys = sorted(documents, key=key_hash)
+    rows = [documents[key] for key in keys]
+
+    key_blob, key_offsets = _pack_strings(keys)
+    poster_blob, poster_offsets = _pack_strings([row.get("poster_path") or "" for row in rows])
+    arrays = {
+        "key_hash": np.array([key_hash(key) for key in keys], dtype=np.uint64),
+        "key_offsets": key_offsets,
+        "key_blob": key_blob,
+        "poster_offsets": poster_offsets,
+        "poster_blob": poster_blob,
+        "is_override": np.array([bool(row.get("is_override")) for row in rows], dtype=bool),
+    }
+    for column in _NUMERIC_COLUMNS:
+        arrays[column] = np.array([row.get(column) or 0 for row in rows], dtype=np.float64)
+    return arrays
+
+def _build_meta(count: int, movie_watermark: Optional[datetime],
+                override_watermark: Optional[datetime]) -> Dict[str, Any]:
+    return {
+        "created_at": utc_now().isoformat(),
+        "count": count,
+        "movie_watermark": movie_watermark.isoformat() if movie_watermark else None,
+        "override_watermark": override_watermark.isoformat() if override_watermark else None,
+    }
+
+def write_snapshot(path: str, documents: Dict[str, Dict[str, Any]],
+                   movie_watermark: Optional[datetime], override_watermark: Optional[datetime]) -> int:
+    """
+    Write documents keyed by title_with_year as a snapshot, replacing any existing one atomically.
+
+    Returns:
+        Number of rows written
+    """
+    temp_path = f"{path}.tmp-{os.getpid()}"
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+
+    for name, array in _build_arrays(documents).items():
+        np.save(os.path.join(temp_path, f"{name}.npy"), array)
+    with open(os.path.join(temp_path, "meta.json"), "w") as f:
+        json.dump(_build_meta(len(documents), movie_watermark, override_watermark), f, indent=2)
+
+    # Swap directories so readers never see a half-written snapshot
+    old_path = f"{path}.old-{os.getpid()}"
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(temp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return len(documents)
+
+def load_snapshot(path: str = CATALOG_SNAPSHOT_PATH) -> Optional[CatalogSnapshot]:
+    """
+    Open a snapshot if one exists.
+
+    Returns:
+        The snapshot, or None if there is none or it cannot be read
+    """
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        return None
+    try:
+        start_time = time.time()
+        snapshot = CatalogSnapshot.open(path)
+        elapsed = time.time() - start_time
+        logger.info(f"Opened catalog snapshot with {len(snapshot)} movies in {elapsed*1000:.1f}ms")
+        return snapshot
+    except Exception as e:
+        logger.error(f"Failed to open catalog snapshot at {path}: {e}")
+        return None
+
+def merge_documents(documents: Dict[str, Dict[str, Any]], movies: List[Dict[str, Any]],
+                     overrides: List[Dict[str, Any]]) -> None:
+    """Merge movie and override documents, overrides taking precedence"""
+    for movie in movies:
+        key = movie.get("title_with_year")
+        if key and not documents.get(key, {}).get("is_override"):
+            documents[key] = dict(movie, is_override=False)
+    for override in overrides:
+        key = override.get("title_with_year")
+        if key:
+            documents[key] = dict(override, is_override=True)
+
+def build_snapshot(database, path: str = CATALOG_SNAPSHOT_PATH) -> int:
+    """Build a snapshot from the full movie-data and overrides collections"""
+    start_time = time.time()
+    movies = database.get_movies_updated_since(None)
+    overrides = database.get_overrides_updated_since(None)
+    documents: Dict[str, Dict[str, Any]] = {}
+    merge_documents(documents, movies, overrides)
+    count = write_snapshot(path, documents, max_updated_at(movies), max_updated_at(overrides))
+    elapsed = time.time() - start_time
+    logger.info(f"Built snapshot with {count} movies at {path} in {elapsed:.2f} seconds")
+    return count
+
+def refresh_snapshot(database, path: str = CATALOG_SNAPSHOT_PATH) -> int:
+    """Apply documents changed since the snapshot's watermark, or build one if none exists"""
+    from catalog import overlapped
+
+    snapshot = load_snapshot(path)
+    if snapshot is None:
+        return build_snapshot(database, path)
+
+    start_time = time.time()
+    movie_watermark, override_watermark = snapshot.watermarks()
+    # Re-read the overlap before the watermarks, as a catalog sync does
+    movies = database.get_movies_updated_since(overlapped(movie_watermark))
+    overrides = database.get_overrides_updated_since(overlapped(override_watermark))
+    documents = snapshot.documents()
+    del snapshot
+    merge_documents(documents, movies, overrides)
+    count = write_snapshot(path, documents, max_updated_at(movies, movie_watermark),
+                           max_updated_at(overrides, override_watermark))
+    elapsed = time.time() - start_time
+    logger.info(f"Refreshed snapshot with {len(movies) + len(overrides)} changed documents "
+                f"({count} movies) in {elapsed:.2f} seconds")
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and refresh the local movie catalog snapshot")
+    parser.add_argument("command", choices=["build", "refresh", "info"])
+    parser.add_argument("--path", default=CATALOG_SNAPSHOT_PATH, help="Snapshot directory")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        snapshot = load_snapshot(args.path)
+        if snapshot is None:
+            print(f"No snapshot at {args.path}")
+            sys.exit(1)
+        print(json.dumps(snapshot.meta, indent=2))
+        return
+
+    from database import MovieDatabase
+    db = MovieDatabase()
+    if not db.client:
+        logger.error("MongoDB connection failed")
+        sys.exit(1)
+    if args.command == "build":
+        build_snapshot(db, args.path)
+    else:
+        refresh_snapshot(db, args.path)
+
+if __name__ == "__main__":
+    main()
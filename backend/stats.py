@@ -1,47 +1,122 @@
-from typing import Tuple, Optional, List
+import os
+import heapq
+import logging
+from collections import Counter
+from dataclasses import asdict
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, Iterator, Sequence, Set, Tuple, Optional, List
+import numpy as np
+import pandas as pd
 from models import MovieData
-from publicMovieData import get_public_movie_data, load_cache
+from csvReader import DiaryRecord, RatingRecord
+from summaries import MetricSummary, ProfileSummary, SUMMARY_BUFFER_SIZE
+from titleIndex import collect_uris
+from publicMovieData import resolve_movies, load_cache, get_catalog_frame, build_poster_url
 
-"""
-Analyzes a dataset of movies and computes metrics based on a given metric function.
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-stats")
 
-Args:
-    csv_data: A pandas DataFrame containing movie data with columns 'Name', 'Year', and 'Rating'.
-    metric_function: A callable that takes a `MovieData` object and returns a numeric metric.
+# Public data by "Title (Year)" key, as returned by `resolve_movies`
+Resolved = Dict[str, Tuple[float, float, float, str]]
 
-Returns:
-    A tuple containing:
-    - avg_metric (float | None): The average value of the computed metric across all movies.
-    - highest_metric_list (list[MovieData] | None): A list of the top 5 movies with the highest metric values.
-    - lowest_metric_list (list[MovieData] | None): A list of the bottom 5 movies with the lowest metric values.
+MetricResult = Tuple[Optional[float], Optional[List[MovieData]], Optional[List[MovieData]]]
 
-Notes:
-    - Movies with missing or invalid public data (e.g., public rating, vote count, or popularity) are skipped.
-    - The metric is computed for each movie using the provided `metric_function`.
-    - The movies are sorted by their metric values in descending order to determine the top and bottom lists.
-    - Normalized vote count is calculated as `vote_count / (2025 - year + 1)`.
-    - Vote count popularity is calculated as a weighted combination of normalized vote count (70%) and popularity (30%).
-"""
-def analyze_movies(csv_data, metric_function) -> Tuple[Optional[float], Optional[List[MovieData]], Optional[List[MovieData]]]:
-    movie_list = []
-    collected_metrics = []
-    cache = load_cache()
+# Number of movies returned at each end of a metric's ranking, unless a request asks for another
+LIST_SIZE = 8
+
+# Registered metrics, each computed from the same enriched movie list.
+# Adding a metric here costs only its own arithmetic, not another pass over the export.
+METRICS: Dict[str, Callable[[MovieData], float]] = {
+    "rating": lambda movie: movie.rating_difference,
+    "obscurity": lambda movie: -movie.vote_count_popularity,
+}
+
+# Column-wise equivalents of METRICS used by the vectorized path.
+# Metrics without an entry here fall back to the per-movie function.
+VECTOR_METRICS: Dict[str, Callable[[pd.DataFrame], pd.Series]] = {
+    "rating": lambda frame: frame["rating_difference"],
+    "obscurity": lambda frame: -frame["vote_count_popularity"],
+}
+
+# Use the NumPy/pandas path by default; set STATS_VECTORIZED=false to use the row loop
+VECTORIZED = os.getenv("STATS_VECTORIZED", "true").lower() == "true"
+
+def register_metric(name: str, metric_function: Callable[[MovieData], float],
+                    vector_function: Optional[Callable[[pd.DataFrame], pd.Series]] = None) -> None:
+    """Register a metric so it is computed by `analyze_all`"""
+    METRICS[name] = metric_function
+    if vector_function is not None:
+        VECTOR_METRICS[name] = vector_function
+    else:
+        VECTOR_METRICS.pop(name, None)
+
+def enrich_movies(csv_data, resolved: Optional[Resolved] = None) -> List[MovieData]:
+    """
+    Resolve public data for every ratings row exactly once.
+
+    Args:
+        csv_data: A pandas DataFrame containing movie data with columns 'Name', 'Year', and 'Rating'.
+        resolved: Public data already resolved for some or all rows (see `analyze_export`).
+
+    Returns:
+        A list of `MovieData` objects, one per row with valid public data.
+
+    Notes:
+        - Movies with missing or invalid public data (e.g., public rating, vote count, or popularity) are skipped.
+        - Normalized vote count is calculated as `vote_count / (2025 - year + 1)`.
+        - Vote count popularity is calculated as a weighted combination of normalized vote count (70%) and popularity (30%).
+    """
+    return _enrich_rows(list(zip(csv_data['Name'], csv_data['Year'], csv_data['Rating'])), resolved)
+
+def enrich_records(records: Iterable[RatingRecord], resolved: Optional[Resolved] = None) -> List[MovieData]:
+    """
+    Same as `enrich_movies` for records streamed by `csvReader.iter_ratings`, without a DataFrame.
+    Records missing a year or rating are skipped.
+    """
+    return _enrich_rows([(record.name, record.year, record.rating) for record in records
+                         if record.year is not None and record.rating is not None], resolved)
+
+def _resolve_missing(titles: Iterable[Tuple[str, int]], resolved: Optional[Resolved]) -> Resolved:
+    """Public data for `titles`, reusing an earlier `resolve_movies` result where it has them"""
+    if resolved is None:
+        load_cache()
+        return resolve_movies(titles)
+    missing = [(title, year) for title, year in titles if f"{title} ({year})" not in resolved]
+    if not missing:
+        return resolved
+    load_cache()
+    return {**resolved, **resolve_movies(missing)}
+
+def _vote_count_popularity(year, vote_count, popularity):
+    """Normalized vote count and its blend with popularity; works on scalars and arrays"""
+    normalized_vote_count = (vote_count/(2025 - year + 1))
+    return normalized_vote_count, (normalized_vote_count * .7) + (popularity * .3)
+
+def _enrich_rows(rows: List[Tuple[str, int, float]], resolved: Optional[Resolved] = None) -> List[MovieData]:
+    """Enrich (title, year, user rating) rows; see `enrich_movies`"""
+    return list(_iter_enriched(rows, resolved))
+
+def _iter_enriched(rows: List[Tuple[str, int, float]], resolved: Optional[Resolved] = None) -> Iterator[MovieData]:
+    """
+    Yield `MovieData` for (title, year, user rating) rows one at a time.
 
-    for index, row in csv_data.iterrows():
-        title = row['Name']
-        year = row['Year']
-        user_rating = row['Rating']
+    Titles are still resolved in one bulk pass up front; only the enriched movies are
+    produced lazily, so a streaming consumer never holds more than it keeps.
+    """
+    resolved = _resolve_missing([(title, year) for title, year, _ in rows], resolved)
 
-        public_rating, vote_count, popularity, poster_url = get_public_movie_data(title, year, cache)
+    for title, year, user_rating in rows:
+        public_rating, vote_count, popularity, poster_url = resolved[f"{title} ({year})"]
 
         if public_rating == 0 or vote_count == 0 or popularity == 0:
             continue
 
         difference = user_rating - public_rating
-        normalized_vote_count = (vote_count/(2025 - year + 1))
-        vote_count_popularity = (normalized_vote_count * .7) + (popularity * .3)
+        normalized_vote_count, vote_count_popularity = _vote_count_popularity(year, vote_count, popularity)
 
-        movie = MovieData(
+        yield MovieData(
             title=title,
             year=int(year),
             public_rating=public_rating,
@@ -54,19 +129,422 @@ def analyze_movies(csv_data, metric_function) -> Tuple[Optional[float], Optional
             poster_url=poster_url
         )
 
-        metric = metric_function(movie)
-        collected_metrics.append(metric)
-        movie_list.append((metric, movie))
+def iter_enriched(csv_data, resolved: Optional[Resolved] = None) -> Iterator[MovieData]:
+    """Lazy counterpart of `enrich_movies`/`enrich_records` for a DataFrame or `RatingRecord`s"""
+    return _iter_enriched(_rated_rows(csv_data), resolved)
+
+def summarize_metric(movies: Iterable[MovieData], metric_function: Callable[[MovieData], float],
+                     list_size: int = LIST_SIZE) -> MetricResult:
+    """
+    Compute a metric over already enriched movies.
+
+    Returns:
+        A tuple of (average metric, highest `list_size` movies, lowest `list_size` movies).
+    """
+    return summarize_metrics(movies, {"metric": metric_function}, list_size)["metric"]
+
+def summarize_metrics(movies: Iterable[MovieData], metric_functions: Dict[str, Callable[[MovieData], float]],
+                      list_size: int = LIST_SIZE) -> Dict[str, MetricResult]:
+    """
+    Compute several metrics in a single pass over enriched movies, which may be a generator.
+
+    Each metric keeps a running sum and two heaps bounded to `list_size`, so memory is
+    O(list_size) per metric however many movies stream through, and selection costs
+    O(n log list_size) instead of a full sort. Ties keep the order a stable sort gives.
+
+    Returns:
+        Dictionary of metric name to (average, highest `list_size` movies, lowest `list_size` movies)
+    """
+    totals = dict.fromkeys(metric_functions, 0.0)
+    highest: Dict[str, list] = {name: [] for name in metric_functions}
+    lowest: Dict[str, list] = {name: [] for name in metric_functions}
+    count = 0
+    for position, movie in enumerate(movies):
+        count += 1
+        for name, metric_function in metric_functions.items():
+            metric = metric_function(movie)
+            totals[name] += metric
+            # Min-heap of the highest values; among equal values the later movie goes first
+            _push_bounded(highest[name], (metric, -position, movie), list_size)
+            # Min-heap of the negated lowest values; among equal values the earlier movie goes first
+            _push_bounded(lowest[name], (-metric, position, movie), list_size)
+
+    # Positions are unique, so sorting never compares the movies themselves
+    return {
+        name: (totals[name] / count if count else 0.0,
+               [movie for _, _, movie in sorted(highest[name], reverse=True)],
+               [movie for _, _, movie in sorted(lowest[name], reverse=True)])
+        for name in metric_functions
+    }
+
+def _push_bounded(heap: list, entry: Tuple[float, int, MovieData], size: int) -> None:
+    """Add an entry to a min-heap holding the `size` largest entries seen"""
+    if len(heap) < size:
+        heapq.heappush(heap, entry)
+    elif size > 0 and entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+def enrich_frame(csv_data, resolved: Optional[Resolved] = None) -> pd.DataFrame:
+    """
+    Vectorized enrichment: join the ratings against a columnar view of the cached
+    catalog and compute the derived columns as array operations.
+
+    Args:
+        csv_data: A pandas DataFrame containing movie data with columns 'Name', 'Year', and 'Rating'.
+        resolved: Public data already resolved for some or all rows (see `analyze_export`).
+
+    Returns:
+        DataFrame with one row per movie with valid public data and the same fields as `MovieData`
+        (`poster_url` is only filled for rows resolved outside the catalog; others carry `poster_path`).
+    """
+    load_cache()
+    ratings = pd.DataFrame({
+        "title": csv_data["Name"],
+        "year": csv_data["Year"],
+        "user_rating": csv_data["Rating"],
+    }).dropna(subset=["year", "user_rating"])
+    ratings["year"] = ratings["year"].astype(int)
+    ratings["key"] = ratings["title"].astype(str) + " (" + ratings["year"].astype(str) + ")"
+
+    frame = ratings.join(get_catalog_frame(ratings["key"].unique()), on="key")
+    frame["poster_url"] = None
+
+    # Resolve all catalog misses in one bulk pass (overrides, stored movies, then TMDb)
+    missing = frame["public_rating"].isna()
+    if missing.any():
+        resolved = _resolve_missing(frame.loc[missing, ["title", "year"]].itertuples(index=False, name=None),
+                                    resolved)
+        keys = frame.loc[missing, "key"]
+        frame.loc[missing, "public_rating"] = keys.map(lambda key: resolved[key][0])
+        frame.loc[missing, "vote_count"] = keys.map(lambda key: resolved[key][1])
+        frame.loc[missing, "popularity"] = keys.map(lambda key: resolved[key][2])
+        # Rows resolved outside the catalog come with a full poster URL
+        frame.loc[missing, "poster_url"] = keys.map(lambda key: resolved[key][3])
+
+    public_rating = frame["public_rating"].to_numpy(dtype=float)
+    vote_count = frame["vote_count"].to_numpy(dtype=float)
+    popularity = frame["popularity"].to_numpy(dtype=float)
+    valid = (public_rating != 0) & (vote_count != 0) & (popularity != 0)
+    frame = frame[valid].copy()
+
+    frame["rating_difference"] = frame["user_rating"].to_numpy(dtype=float) - public_rating[valid]
+    frame["normalized_vote_count"], frame["vote_count_popularity"] = _vote_count_popularity(
+        frame["year"].to_numpy(), vote_count[valid], popularity[valid])
+    return frame.reset_index(drop=True)
+
+def _select_extremes(values: np.ndarray, list_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pick the positions of the `list_size` highest and lowest values with partial selection.
+
+    Ties are broken as `summarize_metrics` breaks them: the earlier position first
+    among the highest values, the later one first among the lowest.
+
+    Returns:
+        (highest positions in descending order, lowest positions in ascending order)
+    """
+    count = len(values)
+    if count == 0 or list_size <= 0:
+        empty = np.array([], dtype=int)
+        return empty, empty
+    if count <= list_size:
+        highest = np.arange(count)
+        lowest = np.arange(count)
+    else:
+        # Every value tied with the last one selected is a candidate, so that position decides
+        highest = np.flatnonzero(values >= np.partition(values, count - list_size)[count - list_size])
+        lowest = np.flatnonzero(values <= np.partition(values, list_size - 1)[list_size - 1])
+    # lexsort orders by its last key first
+    highest = highest[np.lexsort((highest, -values[highest]))][:list_size]
+    lowest = lowest[np.lexsort((-lowest, values[lowest]))][:list_size]
+    return highest, lowest
+
+def _frame_to_movies(frame: pd.DataFrame, positions: np.ndarray) -> List[MovieData]:
+    """Build `MovieData` objects for the selected rows only"""
+    return list(_iter_frame_movies(frame.iloc[positions]))
+
+def _iter_frame_movies(rows: pd.DataFrame) -> Iterator[MovieData]:
+    for row in rows.itertuples(index=False):
+        yield MovieData(
+            title=row.title,
+            year=int(row.year),
+            public_rating=row.public_rating,
+            user_rating=row.user_rating,
+            rating_difference=row.rating_difference,
+            vote_count=row.vote_count,
+            normalized_vote_count=row.normalized_vote_count,
+            popularity=row.popularity,
+            vote_count_popularity=row.vote_count_popularity,
+            poster_url=row.poster_url if isinstance(row.poster_url, str) else build_poster_url(row.poster_path)
+        )
+
+def summarize_frame(frame: pd.DataFrame, name: str, list_size: int = LIST_SIZE) -> MetricResult:
+    """Vectorized counterpart of `summarize_metric` for an enriched frame"""
+    if name not in VECTOR_METRICS:
+        return summarize_metric(_iter_frame_movies(frame), METRICS[name], list_size)
+
+    values = np.asarray(VECTOR_METRICS[name](frame), dtype=float)
+    avg_metric = float(values.mean()) if len(values) else 0.0
+    highest, lowest = _select_extremes(values, list_size)
+    return (avg_metric, _frame_to_movies(frame, highest), _frame_to_movies(frame, lowest))
+
+"""
+Analyzes a dataset of movies and computes metrics based on a given metric function.
+
+Args:
+    csv_data: A pandas DataFrame containing movie data with columns 'Name', 'Year', and 'Rating',
+        or `RatingRecord`s from `csvReader.iter_ratings`.
+    metric_function: A callable that takes a `MovieData` object and returns a numeric metric.
+    list_size: Number of movies in each list (defaults to `LIST_SIZE`).
+
+Returns:
+    A tuple containing:
+    - avg_metric (float | None): The average value of the computed metric across all movies.
+    - highest_metric_list (list[MovieData] | None): The `list_size` movies with the highest metric values.
+    - lowest_metric_list (list[MovieData] | None): The `list_size` movies with the lowest metric values.
+
+Notes:
+    - Enrichment is shared with `analyze_all`; prefer that when more than one metric is needed
+      so the export is only resolved once.
+"""
+def analyze_movies(csv_data, metric_function, list_size: int = LIST_SIZE) -> MetricResult:
+    return summarize_metric(iter_enriched(csv_data), metric_function, list_size)
+
+def analyze_all(csv_data, metric_names: Optional[Iterable[str]] = None,
+                vectorized: Optional[bool] = None, resolved: Optional[Resolved] = None,
+                list_size: int = LIST_SIZE) -> Dict[str, MetricResult]:
+    """
+    Enrich the export once and compute every requested metric from the shared result.
+
+    Args:
+        csv_data: Ratings DataFrame, or `RatingRecord`s from `csvReader.iter_ratings`
+        metric_names: Names from `METRICS` to compute (defaults to all registered metrics)
+        vectorized: Use the NumPy/pandas path (defaults to `VECTORIZED`); records always
+            use the row path, since building a frame from them is what they avoid
+        resolved: Public data already resolved for some or all rows (see `analyze_export`)
+        list_size: Number of movies in each metric's highest and lowest lists
+
+    Returns:
+        Dictionary of metric name to (average, highest list, lowest list)
+    """
+    names = list(metric_names) if metric_names is not None else list(METRICS)
+    if isinstance(csv_data, pd.DataFrame) and (VECTORIZED if vectorized is None else vectorized):
+        frame = enrich_frame(csv_data, resolved)
+        return {name: summarize_frame(frame, name, list_size) for name in names}
+
+    # Every metric is selected in the same pass, as the movies are enriched
+    return summarize_metrics(iter_enriched(csv_data, resolved), {name: METRICS[name] for name in names}, list_size)
+
+def _rated_titles(csv_data) -> Iterable[Tuple[str, int]]:
+    """(title, year) of every ratings row with a year, keyed the way the enrichment paths key them"""
+    if isinstance(csv_data, pd.DataFrame):
+        rows = csv_data[["Name", "Year"]].dropna()
+        return zip(rows["Name"], rows["Year"].astype(int))
+    return ((record.name, record.year) for record in csv_data if record.year is not None)
+
+def _rated_uris(csv_data) -> Dict[str, str]:
+    """Letterboxd film URI by "Title (Year)" key for ratings rows that have one"""
+    if isinstance(csv_data, pd.DataFrame):
+        if "Letterboxd URI" not in csv_data.columns:
+            return {}
+        rows = csv_data[["Name", "Year", "Letterboxd URI"]].dropna()
+        return {f"{title} ({year})": uri for title, year, uri
+                in zip(rows["Name"], rows["Year"].astype(int), rows["Letterboxd URI"]) if uri}
+    return collect_uris(csv_data)
+
+def _rated_rows(csv_data) -> List[Tuple[str, int, float]]:
+    """(title, year, user rating) of every ratings row with a year and a rating"""
+    if isinstance(csv_data, pd.DataFrame):
+        rows = csv_data[["Name", "Year", "Rating"]].dropna()
+        return list(zip(rows["Name"], rows["Year"].astype(int), rows["Rating"]))
+    return [(record.name, record.year, record.rating) for record in csv_data
+            if record.year is not None and record.rating is not None]
+
+def analyze_incremental(csv_data, summary: ProfileSummary, metric_names: Optional[Iterable[str]] = None,
+                        resolved: Optional[Resolved] = None, list_size: int = LIST_SIZE) -> Dict[str, MetricResult]:
+    """
+    Update a profile's stored summary with a newer export and compute the metrics from it.
+
+    Only ratings that were added, re-rated or removed since the summary was built are
+    enriched and applied as a delta, so the cost follows the size of the change rather
+    than of the whole history. The summary is rebuilt from every rating when it is
+    stale, was built for other metrics, or removals left too few movies in its buffers.
+
+    Args:
+        csv_data: Ratings DataFrame, or `RatingRecord`s from `csvReader.iter_ratings`
+        summary: The profile's summary (updated in place; pass a new one for a first upload)
+        metric_names: Names from `METRICS` to compute (defaults to all registered metrics)
+        resolved: Public data already resolved for some or all changed rows
+        list_size: Number of movies in each list; at most SUMMARY_BUFFER_SIZE
+
+    Returns:
+        Dictionary of metric name to (average, highest list, lowest list)
+    """
+    names = list(metric_names) if metric_names is not None else list(METRICS)
+    rows = {f"{title} ({year})": (title, year, rating) for title, year, rating in _rated_rows(csv_data)}
+    if not summary.is_current(names):
+        summary.reset(names)
+
+    added, removed = summary.changed_keys({key: row[2] for key, row in rows.items()})
+    for key in removed:
+        _, values = summary.rows.pop(key)
+        if values is not None:
+            for name, value in zip(names, values):
+                summary.metrics[name].remove(key, value)
+
+    # Summarize the changed movies on their own, then fold them into the profile's summary
+    delta = {name: MetricSummary() for name in names}
+    for key in added:
+        summary.rows[key] = [rows[key][2], None]
+    for movie in _enrich_rows([rows[key] for key in added], resolved):
+        key = f"{movie.title} ({movie.year})"
+        values = [METRICS[name](movie) for name in names]
+        summary.rows[key][1] = values
+        for name, value in zip(names, values):
+            delta[name].add(value, key, asdict(movie))
+    for name in names:
+        summary.metrics[name].merge(delta[name])
+
+    if not all(metric.covers(list_size) for metric in summary.metrics.values()):
+        logger.info(f"Rebuilding summary: removals left fewer than {list_size} movies in its buffers")
+        summary.reset(names)
+        return analyze_incremental(csv_data, summary, names, resolved, list_size)
+
+    logger.info(f"Applied {len(added)} added and {len(removed)} removed ratings to the profile summary "
+                f"({len(rows)} ratings in total)")
+    # Ties are broken by position in this export, as the full path breaks them
+    positions = {key: position for position, key in enumerate(rows)}
+    results: Dict[str, MetricResult] = {}
+    for name in names:
+        average, highest, lowest = summary.metrics[name].result(list_size, positions)
+        results[name] = (average, [MovieData(**movie) for movie in highest],
+                         [MovieData(**movie) for movie in lowest])
+    return results
+
+def summarize_activity(diary: Iterable[DiaryRecord], reviews: Iterable[DiaryRecord] = (),
+                       list_size: int = LIST_SIZE) -> Dict[str, Any]:
+    """
+    Viewing habits from diary entries.
+
+    Reviews are diary entries with text attached, so an entry found in both files
+    (same film and watched date) is only counted once.
+
+    Returns:
+        Dictionary with the entry and film counts, the share of entries marked as a
+        rewatch, the `list_size` most watched films and the number of entries per "YYYY-MM" month
+    """
+    entries: Dict[Tuple[str, Optional[int], str], DiaryRecord] = {}
+    for record in chain(diary, reviews):
+        entries.setdefault((record.name, record.year, record.watched_date), record)
+
+    by_month: Counter = Counter()
+    views: Counter = Counter()
+    rewatches = 0
+    for (name, year, watched_date), record in entries.items():
+        if len(watched_date) >= 7:
+            by_month[watched_date[:7]] += 1
+        if record.rewatch:
+            rewatches += 1
+        views[(name, year)] += 1
+
+    return {
+        "diary_entries": len(entries),
+        "unique_films": len(views),
+        "rewatch_rate": rewatches / len(entries) if entries else 0.0,
+        "most_watched_films": [{"title": name, "year": year, "views": count}
+                               for (name, year), count in views.most_common(list_size) if count > 1],
+        "activity_by_month": dict(sorted(by_month.items())),
+    }
+
+def _average_obscurity(records: Iterable[RatingRecord], resolved: Resolved) -> Tuple[int, float]:
+    """Number of distinct films and their average obscurity (as in the "obscurity" metric)"""
+    films = {(record.name, record.year) for record in records if record.year is not None}
+    values = []
+    for title, year in films:
+        public_rating, vote_count, popularity, _ = resolved.get(f"{title} ({year})", (0, 0, 0, None))
+        if public_rating == 0 or vote_count == 0 or popularity == 0:
+            continue
+        values.append(-_vote_count_popularity(year, vote_count, popularity)[1])
+    return len(films), (sum(values) / len(values) if values else 0.0)
+
+def summarize_library(watched: Iterable[RatingRecord], watchlist: Iterable[RatingRecord],
+                      resolved: Resolved) -> Dict[str, Any]:
+    """Size and average obscurity of everything watched (rated or not) and of the watchlist"""
+    watched_count, watched_obscurity = _average_obscurity(watched, resolved)
+    watchlist_count, watchlist_obscurity = _average_obscurity(watchlist, resolved)
+    return {
+        "watched_films": watched_count,
+        "watched_obscurity_score": watched_obscurity,
+        "watchlist_films": watchlist_count,
+        "watchlist_obscurity_score": watchlist_obscurity,
+    }
+
+def export_titles(ratings, diary: Iterable[DiaryRecord] = (), watched: Iterable[RatingRecord] = (),
+                  reviews: Iterable[DiaryRecord] = (), watchlist: Iterable[RatingRecord] = ()) -> Set[Tuple[str, Any]]:
+    """Every distinct (title, year) an export refers to, i.e. the films `analyze_export` resolves"""
+    titles = set(_rated_titles(ratings))
+    for records in (diary, watched, reviews, watchlist):
+        titles.update((record.name, record.year) for record in records if record.year is not None)
+    return titles
+
+def analyze_export(ratings, diary: Sequence[DiaryRecord] = (), watched: Sequence[RatingRecord] = (),
+                   reviews: Sequence[DiaryRecord] = (), watchlist: Sequence[RatingRecord] = (),
+                   metric_names: Optional[Iterable[str]] = None, vectorized: Optional[bool] = None,
+                   progress: Optional[Callable[[int, int, Dict[str, Any]], None]] = None,
+                   summary: Optional[ProfileSummary] = None, list_size: int = LIST_SIZE) -> Dict[str, Any]:
+    """
+    Analyze a full Letterboxd export.
+
+    Every distinct film across all files is resolved in a single `resolve_movies` pass,
+    then the rating metrics, diary activity and library stats are all computed from
+    that shared result.
+
+    Args:
+        ratings: Ratings DataFrame, or a list of `RatingRecord`s
+        diary, reviews: Records from `csvReader.iter_diary`
+        watched, watchlist: Records from `csvReader.iter_ratings`
+        metric_names: Names from `METRICS` to compute (defaults to all registered metrics)
+        vectorized: Use the NumPy/pandas path for the rating metrics (defaults to `VECTORIZED`)
+        progress: Called with (films resolved, distinct films, results so far) while resolving;
+            "activity" needs no public data, so it is available from the first call
+        summary: The profile's stored summary; if given, the rating metrics are updated
+            incrementally with `analyze_incremental` and the summary is updated in place
+        list_size: Number of movies in each list, e.g. more than `LIST_SIZE` for a "see more" view
 
-    avg_metric = sum(collected_metrics) / len(collected_metrics) if collected_metrics else 0.0
-    sorted_movies = sorted(movie_list, key=lambda x: x[0], reverse=True)
-    highest_metric_list = [movie for _, movie in sorted_movies[:8]]
-    lowest_metric_list = [movie for _, movie in sorted_movies[-8:]][::-1]
+    Returns:
+        `analyze_all`'s metrics plus "activity" (see `summarize_activity`) and
+        "library" (see `summarize_library`)
+    """
+    if summary is not None and list_size > SUMMARY_BUFFER_SIZE:
+        # Longer lists than the summary keeps can only come from a full computation
+        logger.info(f"Skipping the profile summary: {list_size} movies requested, {SUMMARY_BUFFER_SIZE} kept")
+        summary = None
+    if summary is not None:
+        # Only ratings that changed since the summary was built need public data
+        names = list(metric_names) if metric_names is not None else list(METRICS)
+        rows = {f"{title} ({year})": (title, year, rating) for title, year, rating in _rated_rows(ratings)}
+        added, _ = summary.changed_keys({key: row[2] for key, row in rows.items()}) \
+            if summary.is_current(names) else (list(rows), [])
+        titles = {rows[key][:2] for key in added}
+    else:
+        titles = set(_rated_titles(ratings))
+    titles.update(export_titles((), diary, watched, reviews, watchlist))
+    # Diary and review URIs point at the entry rather than the film, so they are not used
+    uris = {**collect_uris(watchlist), **collect_uris(watched), **_rated_uris(ratings)}
+    partial: Dict[str, Any] = {"activity": summarize_activity(diary, reviews, list_size)}
+    load_cache()
+    resolved = resolve_movies(titles, (lambda done, total: progress(done, total, partial))
+                              if progress is not None else None, uris)
 
-    return (avg_metric, highest_metric_list, lowest_metric_list)
+    if summary is not None:
+        results: Dict[str, Any] = analyze_incremental(ratings, summary, metric_names, resolved, list_size)
+    else:
+        results = analyze_all(ratings, metric_names, vectorized, resolved, list_size)
+    results["activity"] = partial["activity"]
+    results["library"] = summarize_library(watched, watchlist, resolved)
+    return results
 
-def get_rating_data(csv_data) -> Tuple[Optional[float], Optional[List[MovieData]], Optional[List[MovieData]]]:
-    return analyze_movies(csv_data, lambda movie: movie.rating_difference)
+def get_rating_data(csv_data) -> MetricResult:
+    return analyze_movies(csv_data, METRICS["rating"])
 
-def get_obscurity_data(csv_data) -> Tuple[Optional[float], Optional[List[MovieData]], Optional[List[MovieData]]]:
-    return analyze_movies(csv_data, lambda movie: -movie.vote_count_popularity)
+def get_obscurity_data(csv_data) -> MetricResult:
+    return analyze_movies(csv_data, METRICS["obscurity"])
@@ -0,0 +1,256 @@
+"""
+Mergeable per-profile stat summaries for incremental recompute
+"""
+import os
+import bisect
+import hmac
+import hashlib
+import logging
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from timeutil import as_utc, utc_now
+from dotenv import load_dotenv
+
+# Load environment variables from .env file (the secret below is read at import)
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-summaries")
+
+# Key of the HMAC that turns Letterboxd usernames into stored profile ids; a plain hash
+# of a username could be reversed by hashing candidate usernames
+PROFILE_ID_SECRET = os.getenv("PROFILE_ID_SECRET", "")
+
+# Keep per-profile summaries so a re-upload only processes the ratings that changed
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "true").lower() == "true"
+if SUMMARY_ENABLED and not PROFILE_ID_SECRET:
+    logger.warning("PROFILE_ID_SECRET is not set; profile summaries are disabled")
+    SUMMARY_ENABLED = False
+
+# Movies kept at each end of every metric; removals are absorbed until fewer than the
+# requested list size remain, after which the summary is rebuilt from all ratings
+SUMMARY_BUFFER_SIZE = int(os.getenv("SUMMARY_BUFFER_SIZE", "64"))
+
+# Rebuild summaries older than this many seconds so unchanged ratings pick up fresh public
+# data; MongoDB removes summaries not updated for as long
+SUMMARY_MAX_AGE = int(os.getenv("SUMMARY_MAX_AGE", str(7 * 24 * 60 * 60)))
+
+# Bump when the stored layout or the metric definitions change
+SUMMARY_SCHEMA_VERSION = 2
+
+class Extremes:
+    """
+    The highest values of a multiset, bounded to `capacity`, with their movies.
+
+    Unless the buffer holds the whole set, it holds every entry whose value is at
+    least the buffer's minimum: entries tied with the last one kept are kept too,
+    even beyond `capacity`, so ties can be ordered by export position afterwards.
+    A value below the minimum is only kept while the buffer still holds the whole
+    set, since otherwise an unseen entry might outrank it.
+    """
+
+    __slots__ = ("capacity", "items")
+
+    def __init__(self, capacity: int, items: Optional[List[List[Any]]] = None):
+        self.capacity = capacity
+        # [value, key, movie] sorted by descending value
+        self.items: List[List[Any]] = items or []
+
+    def add(self, value: float, key: str, movie: Dict[str, Any], population: int) -> None:
+        """Offer an entry to a buffer summarizing `population` entries before this one"""
+        if len(self.items) == population or (self.items and value >= self.items[-1][0]):
+            position = bisect.bisect_right([-item[0] for item in self.items], -value)
+            self.items.insert(position, [value, key, movie])
+            self._truncate()
+
+    def remove(self, key: str) -> None:
+        self.items = [item for item in self.items if item[1] != key]
+
+    def merge(self, other: "Extremes", population: int, other_population: int) -> None:
+        """Combine with the buffer of a disjoint set, keeping only what is still exact"""
+        # Entries of a partial buffer's set below its minimum are unknown, so only values
+        # at or above the highest such minimum are known for the combined set
+        floors = [buffer.items[-1][0] if buffer.items else float("inf")
+                  for buffer, size in ((self, population), (other, other_population)) if len(buffer.items) < size]
+        items = self.items + other.items
+        if floors:
+            items = [item for item in items if item[0] >= max(floors)]
+        self.items = sorted(items, key=lambda item: -item[0])
+        self._truncate()
+
+    def _truncate(self) -> None:
+        """Drop entries beyond `capacity`, except those tied with the last one kept"""
+        if len(self.items) <= self.capacity:
+            return
+        end = self.capacity
+        if end > 0:
+            floor = self.items[end - 1][0]
+            while end < len(self.items) and self.items[end][0] == floor:
+                end += 1
+        del self.items[end:]
+
+class MetricSummary:
+    """
+    Mergeable summary of one metric: sum and count for the average, and bounded
+    buffers of the highest and lowest movies for the lists.
+    """
+
+    __slots__ = ("total", "count", "high", "low")
+
+    def __init__(self, capacity: int = SUMMARY_BUFFER_SIZE):
+        self.total = 0.0
+        self.count = 0
+        self.high = Extremes(capacity)
+        # Lowest values are kept as the highest negated values
+        self.low = Extremes(capacity)
+
+    def add(self, value: float, key: str, movie: Dict[str, Any]) -> None:
+        self.high.add(value, key, movie, self.count)
+        self.low.add(-value, key, movie, self.count)
+        self.total += value
+        self.count += 1
+
+    def remove(self, key: str, value: float) -> None:
+        self.high.remove(key)
+        self.low.remove(key)
+        self.total -= value
+        self.count -= 1
+
+    def merge(self, other: "MetricSummary") -> None:
+        """Fold in the summary of a disjoint set of movies"""
+        self.high.merge(other.high, self.count, other.count)
+        self.low.merge(other.low, self.count, other.count)
+        self.total += other.total
+        self.count += other.count
+
+    def covers(self, list_size: int) -> bool:
+        """Whether both buffers still hold enough movies for lists of `list_size`"""
+        needed = min(list_size, self.count)
+        return len(self.high.items) >= needed and len(self.low.items) >= needed
+
+    def result(self, list_size: int, positions: Dict[str, int]) -> Tuple[float, List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        (average, highest movies, lowest movies), movies as `MovieData` field dicts.
+
+        Ties are ordered as a full recompute orders them, by the movies' `positions` in
+        the current export: the earlier movie first among the highest, the later one
+        first among the lowest.
+        """
+        average = self.total / self.count if self.count else 0.0
+        highest = sorted(self.high.items, key=lambda item: (-item[0], positions.get(item[1], 0)))
+        lowest = sorted(self.low.items, key=lambda item: (-item[0], -positions.get(item[1], 0)))
+        return (average, [item[2] for item in highest[:list_size]], [item[2] for item in lowest[:list_size]])
+
+    def to_document(self) -> Dict[str, Any]:
+        return {"total": self.total, "count": self.count, "high": self.high.items, "low": self.low.items}
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any], capacity: int = SUMMARY_BUFFER_SIZE) -> "MetricSummary":
+        summary = cls(capacity)
+        summary.total = document["total"]
+        summary.count = document["count"]
+        summary.high = Extremes(capacity, document["high"])
+        summary.low = Extremes(capacity, document["low"])
+        return summary
+
+class ProfileSummary:
+    """
+    Everything needed to update a profile's rating metrics from a newer export:
+    each rating with its metric values, and a `MetricSummary` per metric.
+    """
+
+    def __init__(self, profile_id: str, metric_names: Iterable[str]):
+        self.profile_id = profile_id
+        self.reset(metric_names)
+
+    def reset(self, metric_names: Iterable[str]) -> None:
+        """Start over, e.g. for a full rebuild"""
+        self.metric_names = list(metric_names)
+        self.metrics = {name: MetricSummary() for name in self.metric_names}
+        # key -> [user rating, metric values in `metric_names` order, or None if not enriched]
+        self.rows: Dict[str, List[Any]] = {}
+        self.built_at = utc_now()
+
+    def is_current(self, metric_names: Iterable[str]) -> bool:
+        """Whether this summary can be updated incrementally for these metrics"""
+        age = utc_now() - self.built_at
+        return self.metric_names == list(metric_names) and age < timedelta(seconds=SUMMARY_MAX_AGE)
+
+    def changed_keys(self, ratings: Dict[str, float]) -> Tuple[List[str], List[str]]:
+        """
+        Compare with the ratings of a newer export.
+
+        Returns:
+            (keys to add: new or re-rated, keys to remove: gone or re-rated)
+        """
+        added = [key for key, rating in ratings.items()
+                 if key not in self.rows or self.rows[key][0] != rating]
+        removed = [key for key, row in self.rows.items()
+                   if key not in ratings or ratings[key] != row[0]]
+        return added, removed
+
+    def to_document(self) -> Dict[str, Any]:
+        return {
+            "_id": self.profile_id,
+            "schema": SUMMARY_SCHEMA_VERSION,
+            "metric_names": self.metric_names,
+            "metrics": {name: summary.to_document() for name, summary in self.metrics.items()},
+            # Stored as a list: titles may contain characters MongoDB does not allow in field names
+            "rows": [[key, rating, values] for key, (rating, values) in self.rows.items()],
+            "built_at": self.built_at,
+            "updated_at": utc_now(),
+        }
+
+    @classmethod
+    def from_document(cls, document: Dict[str, Any]) -> "ProfileSummary":
+        summary = cls(document["_id"], document["metric_names"])
+        summary.metrics = {name: MetricSummary.from_document(metric)
+                           for name, metric in document["metrics"].items()}
+        summary.rows = {key: [rating, values] for key, rating, values in document["rows"]}
+        summary.built_at = as_utc(document["built_at"])
+        return summary
+
+def profile_id(username: str) -> str:
+    """Stable id for a Letterboxd username, keyed with PROFILE_ID_SECRET; the username itself is not stored"""
+    return hmac.new(PROFILE_ID_SECRET.encode(), username.strip().lower().encode(), hashlib.sha256).hexdigest()
+
+_summaries = None
+
+def _collection():
+    global _summaries
+    if _summaries is None:
+        from database import MovieDatabase
+        collection = MovieDatabase().db["profile-summaries"]
+        # Summaries this old are rebuilt anyway; this also expires those of older schemas
+        collection.create_index("updated_at", expireAfterSeconds=SUMMARY_MAX_AGE)
+        _summaries = collection
+    return _summaries
+
+def _reset_collection() -> None:
+    global _summaries
+    _summaries = None
+
+# The collection handle belongs to the parent's MongoClient
+os.register_at_fork(after_in_child=_reset_collection)
+
+def load_summary(profile: str) -> Optional[ProfileSummary]:
+    """The stored summary for a profile id, or None"""
+    try:
+        document = _collection().find_one({"_id": profile})
+        if document is None or document.get("schema") != SUMMARY_SCHEMA_VERSION:
+            return None
+        return ProfileSummary.from_document(document)
+    except Exception as e:
+        logger.error(f"Error loading summary for profile {profile[:12]}: {e}")
+        return None
+
+def save_summary(summary: ProfileSummary) -> bool:
+    """Store a profile's summary, replacing the previous one"""
+    try:
+        _collection().replace_one({"_id": summary.profile_id}, summary.to_document(), upsert=True)
+        return True
+    except Exception as e:
+        logger.error(f"Error saving summary for profile {summary.profile_id[:12]}: {e}")
+        return False
@@ -0,0 +1,91 @@
+"""
+Shared test setup: the backend modules run against an in-memory MongoDB (mongomock)
+and never reach TMDb. The environment is fixed before any backend module is imported,
+since most of them read their settings at import time.
+"""
+import io
+import os
+import sys
+import zipfile
+import tempfile
+from typing import Iterable, Optional, Tuple
+
+import mongomock
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ["MONGODB_URI"] = "mongodb://localhost:27017/meterboxd-test"
+# Set (even if empty) so that a developer's .env does not supply a real key
+os.environ["TMDB_API_KEY"] = ""
+os.environ["CATALOG_SNAPSHOT_PATH"] = os.path.join(tempfile.mkdtemp(), "catalog-snapshot")
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+os.environ["METRICS_ENABLED"] = "false"
+os.environ["METRICS_TOKEN"] = ""
+os.environ.setdefault("PROFILE_ID_SECRET", "test-secret")
+
+import database  # noqa: E402
+
+_client = mongomock.MongoClient(tz_aware=True)
+database.MongoClient = lambda *args, **kwargs: _client
+
+def stored_movie(title: str, year: int, rating: float = 7.0, votes: int = 1000,
+                 popularity: float = 10.0, tmdb_id: Optional[int] = None) -> dict:
+    """A movie document as `tmdbClient.movie_record` builds it"""
+    return {
+        "title": title,
+        "release_date": f"{year}-06-01",
+        "public_rating": rating,
+        "vote_count": votes,
+        "popularity": popularity,
+        "poster_path": f"/{title.lower().replace(' ', '-')}.jpg",
+        "tmdb_id": tmdb_id,
+    }
+
+def export_zip(ratings: Iterable[Tuple[str, int, float]], username: Optional[str] = None) -> bytes:
+    """A Letterboxd export ZIP holding these (title, year, rating) rows"""
+    lines = ["Date,Name,Year,Letterboxd URI,Rating"]
+    for position, (title, year, rating) in enumerate(ratings):
+        slug = title.lower().replace(" ", "-")
+        lines.append(f"2024-01-{position % 28 + 1:02d},{title},{year},https://boxd.it/{slug},{rating}")
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("ratings.csv", "\n".join(lines) + "\n")
+        if username is not None:
+            zip_file.writestr("profile.csv", f"Date Joined,Username,Given Name\n2020-01-01,{username},\n")
+    return archive.getvalue()
+
+@pytest.fixture
+def mongo():
+    """The in-memory database, emptied after the test"""
+    db = database.MovieDatabase().db
+    yield db
+    for name in db.list_collection_names():
+        db[name].delete_many({})
+
+FILMS = [("Film One", 2001), ("Film Two", 2002), ("Film Three", 2003), ("Film Four", 2004)]
+
+@pytest.fixture
+def client(mongo):
+    """Test client of the warmed-up app, with FILMS stored and nothing cached in memory"""
+    import app as app_module
+    import publicMovieData
+    import uploadPipeline
+
+    if app_module._warm_up_thread is not None:
+        app_module._warm_up_thread.join(timeout=30)
+    assert app_module.health.is_ready()
+    for number, (title, year) in enumerate(FILMS, start=1):
+        publicMovieData.db.add_or_update_movie(f"{title} ({year})", stored_movie(title, year, 6.0 + number,
+                                                                                 tmdb_id=number))
+    publicMovieData.clear_local_cache()
+    uploadPipeline.result_cache.clear()
+    yield app_module.app.test_client()
+    publicMovieData.clear_local_cache()
+
+def upload(client, archive: bytes, headers=None, **params):
+    """POST an export to /api/upload"""
+    return client.post("/api/upload", query_string=params,
+                       data={"zip": (io.BytesIO(archive), "export.zip")},
+                       content_type="multipart/form-data", headers=headers)
@@ -0,0 +1,60 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import catalog
+from catalog import MovieCatalog
+from snapshot import CatalogSnapshot
+
+T0 = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+
+def document(key, rating, updated_at=T0):
+    return {"title_with_year": key, "public_rating": rating, "vote_count": 100, "popularity": 1.0,
+            "poster_path": "", "updated_at": updated_at}
+
+class FakeDatabase:
+    def __init__(self, movies=()):
+        self.movies = list(movies)
+        self.queries = []
+
+    def get_movies_updated_since(self, since, projection=None, limit=None):
+        self.queries.append(since)
+        return [movie for movie in self.movies if since is None or movie["updated_at"] >= since]
+
+    def get_overrides_updated_since(self, since):
+        return []
+
+def test_sync_rereads_the_overlap_before_the_watermark():
+    database = FakeDatabase([document("A (2000)", 7.0, T0)])
+    movies = MovieCatalog(database)
+    movies.load()
+    # Stamped before A's write but committed after the load read past it
+    database.movies.append(document("B (2000)", 6.0, T0 - timedelta(seconds=1)))
+    assert movies.sync(force=True) == 1
+    assert database.queries[-1] == T0 - timedelta(seconds=catalog.CATALOG_SYNC_OVERLAP)
+    assert movies.peek("B (2000)").public_rating == 6.0
+    # Documents already held are not counted again
+    assert movies.sync(force=True) == 0
+
+def test_len_counts_keys_in_the_lru_and_the_snapshot_once():
+    snapshot = CatalogSnapshot.from_documents(
+        {key: dict(document(key, 7.0), is_override=False) for key in ("A (2000)", "B (2000)")}, T0, None)
+    movies = MovieCatalog(FakeDatabase(), max_entries=2)
+    movies.attach_snapshot(snapshot)
+    assert len(movies) == 2
+    movies.put("A (2000)", document("A (2000)", 8.0))
+    assert len(movies) == 2
+    movies.put("C (2000)", document("C (2000)", 8.0))
+    assert len(movies) == 3
+    # Evicting A leaves the snapshot's copy, evicting C drops the key
+    movies.put("D (2000)", document("D (2000)", 8.0))
+    movies.put("E (2000)", document("E (2000)", 8.0))
+    assert len(movies) == 4
+    assert len(movies) == len({*movies.keys(), "A (2000)", "B (2000)"})
+
+def test_len_after_expiry():
+    movies = MovieCatalog(FakeDatabase(), ttl=0.001)
+    movies.put("A (2000)", document("A (2000)", 8.0))
+    assert len(movies) == 1
+    time.sleep(0.01)
+    assert movies.get("A (2000)") is None
+    assert len(movies) == 0
@@ -0,0 +1,94 @@
+import io
+import math
+
+import pytest
+
+from csvReader import (DiaryRecord, RATINGS_COLUMNS, RatingRecord, iter_diary, iter_ratings, load_ratings_csv,
+                       read_username)
+
+BOM = "﻿"
+
+RATINGS = (
+    BOM + "Date, Name ,Year , Letterboxd URI,Rating \n"
+    "2024-01-01,Heat,1995,https://boxd.it/2bGk,4.5\n"
+    '2024-01-02,"Crouching Tiger, Hidden Dragon",2000,https://boxd.it/1Y6c,4\n'
+    "2024-01-03,Solaris,1972,https://boxd.it/26Mo,\n"
+    "2024-01-04,Stalker,,https://boxd.it/2a2o,5\n"
+)
+
+def as_bytes(text):
+    return io.BytesIO(text.encode("utf-8"))
+
+def test_ratings_are_read_from_paths_text_and_binary_files(tmp_path):
+    path = tmp_path / "ratings.csv"
+    path.write_text(RATINGS, encoding="utf-8")
+    expected = [
+        RatingRecord("Heat", 1995, 4.5, "https://boxd.it/2bGk"),
+        RatingRecord("Crouching Tiger, Hidden Dragon", 2000, 4.0, "https://boxd.it/1Y6c"),
+        RatingRecord("Solaris", 1972, None, "https://boxd.it/26Mo"),
+        RatingRecord("Stalker", None, 5.0, "https://boxd.it/2a2o"),
+    ]
+    assert list(iter_ratings(str(path))) == expected
+    assert list(iter_ratings(as_bytes(RATINGS))) == expected
+    # Text files are already decoded and read as they are
+    assert list(iter_ratings(io.StringIO(RATINGS.lstrip(BOM)))) == expected
+
+def test_ratings_match_the_pandas_reader():
+    records = list(iter_ratings(as_bytes(RATINGS)))
+    frame = load_ratings_csv(as_bytes(RATINGS), columns=RATINGS_COLUMNS)
+    assert sorted(frame.columns) == sorted(RATINGS_COLUMNS)
+    assert len(records) == len(frame)
+    for record, (_, row) in zip(records, frame.iterrows()):
+        assert record.name == row["Name"]
+        assert record.letterboxd_uri == row["Letterboxd URI"]
+        for value, expected in ((record.year, row["Year"]), (record.rating, row["Rating"])):
+            if value is None:
+                assert math.isnan(expected)
+            else:
+                assert value == expected
+
+def test_short_rows_missing_columns_and_malformed_values():
+    text = (
+        # The BOM must not hide the Name column
+        BOM + "Name,Year,Rating\n"
+        "Heat,1995\n"
+        "Solaris,nineteen seventy-two,4.5\n"
+        "Stalker,1979,five\n"
+        ",2000,3\n"
+        "Ran,1985.0,4\n"
+    )
+    assert list(iter_ratings(as_bytes(text))) == [
+        RatingRecord("Heat", 1995, None, ""),
+        RatingRecord("Solaris", None, 4.5, ""),
+        RatingRecord("Stalker", 1979, None, ""),
+        RatingRecord("Ran", 1985, 4.0, ""),
+    ]
+
+@pytest.mark.parametrize("text", ["", "Title,Year,Rating\nHeat,1995,4.5\n"])
+def test_a_file_without_a_name_column_is_rejected(text):
+    with pytest.raises(ValueError, match="'Name' column not found"):
+        list(iter_ratings(as_bytes(text)))
+
+def test_diary_falls_back_to_the_logged_date():
+    text = (
+        BOM + "Date,Name,Year,Letterboxd URI,Rating,Rewatch,Tags,Watched Date\n"
+        "2024-02-01,Heat,1995,https://boxd.it/a,4.5, Yes ,,2024-01-31\n"
+        "2024-02-02,Solaris,1972,https://boxd.it/b,,,,\n"
+        "2024-02-03,Stalker,1979,https://boxd.it/c\n"
+    )
+    assert list(iter_diary(as_bytes(text))) == [
+        DiaryRecord("Heat", 1995, 4.5, True, "2024-01-31", "https://boxd.it/a"),
+        DiaryRecord("Solaris", 1972, None, False, "2024-02-02", "https://boxd.it/b"),
+        DiaryRecord("Stalker", 1979, None, False, "2024-02-03", "https://boxd.it/c"),
+    ]
+
+@pytest.mark.parametrize("text, username", [
+    (BOM + "Date Joined, Username ,Given Name\n2020-01-01, cinephile ,Ada\n", "cinephile"),
+    ("Date Joined,Username\n2020-01-01,\n", None),
+    ("Date Joined,Username\n2020-01-01\n", None),
+    ("Date Joined,Username\n", None),
+    ("Date Joined,Given Name\n2020-01-01,Ada\n", None),
+    ("", None),
+])
+def test_username_is_read_from_the_profile(text, username):
+    assert read_username(as_bytes(text)) == username
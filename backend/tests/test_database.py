@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+import pytest
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from conftest import stored_movie
+from database import DUPLICATE_KEY_ERROR, MovieDatabase
+from timeutil import utc_now
+
+class RacingCollection:
+    """A movies collection whose first writes fail as if a concurrent upsert of the same key won"""
+
+    def __init__(self, collection, failures=1):
+        self._collection = collection
+        self.failures = failures
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def update_one(self, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise DuplicateKeyError("E11000 duplicate key error", DUPLICATE_KEY_ERROR)
+        return self._collection.update_one(*args, **kwargs)
+
+    def bulk_write(self, operations, ordered=True):
+        if self.failures:
+            self.failures -= 1
+            # The first operation loses the race; the others are written
+            result = self._collection.bulk_write(operations[1:], ordered=ordered) if len(operations) > 1 else None
+            raise BulkWriteError({"writeErrors": [{"index": 0, "code": DUPLICATE_KEY_ERROR}],
+                                  "writeConcernErrors": [], "nInserted": 0,
+                                  "nUpserted": result.upserted_count if result else 0})
+        return self._collection.bulk_write(operations, ordered=ordered)
+
+@pytest.fixture
+def db(mongo):
+    return MovieDatabase()
+
+def race(db, monkeypatch, failures):
+    racing = RacingCollection(db.movies_collection, failures)
+    monkeypatch.setattr(db, "movies_collection", racing)
+    return racing
+
+def test_racing_upsert_of_the_same_key_is_retried(db, monkeypatch):
+    db.movies_collection.insert_one(dict(stored_movie("Film", 2000, rating=6.0, tmdb_id=1), title_with_year="Film (2000)"))
+    race(db, monkeypatch, failures=1)
+    assert db.add_or_update_movie("Film (2000)", stored_movie("Film", 2000, rating=8.0, tmdb_id=1))
+    assert db.movies_collection.find_one({"title_with_year": "Film (2000)"})["public_rating"] == 8.0
+
+def test_second_duplicate_key_error_records_an_alias(db, monkeypatch):
+    db.movies_collection.insert_one(dict(stored_movie("Film", 2000, tmdb_id=1), title_with_year="Film (2000)"))
+    race(db, monkeypatch, failures=2)
+    assert db.add_or_update_movie("The Film (2000)", stored_movie("The Film", 2000, tmdb_id=1))
+    assert db.movies_collection.find_one({"title_with_year": "Film (2000)"})["aliases"] == ["The Film (2000)"]
+
+def test_bulk_write_retries_duplicate_key_errors_once(db, monkeypatch):
+    race(db, monkeypatch, failures=1)
+    movies = {f"Film {number} (2000)": stored_movie(f"Film {number}", 2000, tmdb_id=number) for number in range(3)}
+    assert db.add_or_update_movies_bulk(movies)
+    assert sorted(movie["title_with_year"] for movie in db.movies_collection.find()) == sorted(movies)
+
+def test_bulk_write_records_aliases_after_the_retry(db, monkeypatch):
+    db.movies_collection.insert_one(dict(stored_movie("Film", 2000, tmdb_id=1), title_with_year="Film (2000)"))
+    race(db, monkeypatch, failures=0)
+    movies = {"The Film (2000)": stored_movie("The Film", 2000, tmdb_id=1),
+              "Other (2000)": stored_movie("Other", 2000, tmdb_id=2)}
+    assert db.add_or_update_movies_bulk(movies)
+    assert db.movies_collection.find_one({"title_with_year": "Film (2000)"})["aliases"] == ["The Film (2000)"]
+    assert db.movies_collection.find_one({"title_with_year": "Other (2000)"}) is not None
+
+def test_stored_timestamps_read_back_in_utc(db):
+    before = utc_now()
+    db.add_or_update_movie("Heat (1995)", stored_movie("Heat", 1995))
+    updated_at = db.get_movie("Heat (1995)")["updated_at"]
+    assert updated_at.utcoffset() == timedelta(0)
+    # Stored to the millisecond
+    assert before - timedelta(milliseconds=1) <= updated_at <= utc_now()
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+
+import mongomock
+import pytest
+from pymongo import DeleteMany, UpdateOne
+from pymongo.errors import BulkWriteError
+
+import dedupe
+from database import TMDB_ID_INDEX_OPTIONS
+from dedupe import _merge_batch, dedupe as dedupe_collection, merge_duplicates
+
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+@pytest.fixture
+def movies():
+    """A collection from before the unique title index, so it can hold duplicate keys"""
+    collection = mongomock.MongoClient(tz_aware=True).db["movie-data"]
+    collection.create_index("tmdb_id", **TMDB_ID_INDEX_OPTIONS)
+    return collection
+
+def movie(_id, key, age, **fields):
+    return dict({"_id": _id, "title_with_year": key, "updated_at": T0 - timedelta(days=age)}, **fields)
+
+def test_fields_are_taken_from_the_newest_document_that_has_them():
+    documents = [
+        movie(1, "Heat (1995)", 1, public_rating=4.0, poster_path=None),
+        movie(2, "Heat (1995)", 3, public_rating=3.0, poster_path="/old.jpg", overview="Old"),
+        movie(3, "Heat (1995)", 2, public_rating=3.5, popularity=12.0),
+        {"_id": 4, "title_with_year": "Heat (1995)", "public_rating": 1.0, "vote_count": 5},
+    ]
+    survivor, fields, losers = merge_duplicates(documents)
+    assert survivor == 1
+    assert sorted(losers) == [2, 3, 4]
+    assert fields["public_rating"] == 4.0
+    assert fields["popularity"] == 12.0
+    # A null does not hide an older value
+    assert fields["poster_path"] == "/old.jpg"
+    # Documents without an updated_at count as the oldest
+    assert (fields["overview"], fields["vote_count"]) == ("Old", 5)
+    assert "_id" not in fields and "aliases" not in fields
+    assert fields["updated_at"] > T0
+
+def test_keys_merged_by_tmdb_id_become_aliases():
+    documents = [
+        movie(1, "Amelie (2001)", 2, tmdb_id=194, aliases=["Le Fabuleux Destin d'Amélie Poulain (2001)"]),
+        movie(2, "Amélie (2001)", 1, tmdb_id=194),
+        movie(3, "Amelie (2002)", 3, tmdb_id=194, aliases=["Amélie (2001)"]),
+    ]
+    survivor, fields, losers = merge_duplicates(documents)
+    assert survivor == 2
+    assert fields["title_with_year"] == "Amélie (2001)"
+    assert fields["aliases"] == ["Amelie (2001)", "Amelie (2002)", "Le Fabuleux Destin d'Amélie Poulain (2001)"]
+    assert losers == [3, 1]
+
+def test_losers_are_deleted_before_the_survivor_takes_their_unique_values(movies):
+    # The newest copy lacks the TMDb id the older one holds under the unique tmdb_id index
+    movies.insert_many([movie(1, "Heat (1995)", 2, tmdb_id=949), movie(2, "Heat (1995)", 1, public_rating=4.1)])
+    assert _merge_batch(movies, [[1, 2]], dry_run=False) == (1, 1)
+    assert [(document["_id"], document["tmdb_id"], document["public_rating"]) for document in movies.find()] == \
+        [(2, 949, 4.1)]
+
+    # The other way round the update collides with the document it replaces
+    movies.insert_one(movie(3, "Heat (1995)", 3, tmdb_id=1000))
+    movies.insert_one(movie(4, "Heat (1995)", 0))
+    survivor, fields, losers = merge_duplicates(list(movies.find({"_id": {"$in": [3, 4]}})))
+    with pytest.raises(BulkWriteError):
+        movies.bulk_write([UpdateOne({"_id": survivor}, {"$set": fields}),
+                           DeleteMany({"_id": {"$in": losers}})], ordered=True)
+
+def test_dedupe_merges_every_set_in_batches(movies, monkeypatch):
+    monkeypatch.setattr(dedupe.time, "sleep", lambda seconds: None)
+    movies.insert_many([
+        movie(1, "Heat (1995)", 2, public_rating=3.9), movie(2, "Heat (1995)", 1, public_rating=4.1),
+        movie(3, "Ran (1985)", 1), movie(4, "Ran (1985)", 2), movie(5, "Ran (1985)", 3),
+        movie(6, "Solaris (1972)", 1), movie(7, None, 1), movie(8, None, 2),
+    ])
+    assert dedupe_collection(movies, "title_with_year", batch_size=1, dry_run=True) == (2, 3)
+    assert movies.count_documents({}) == 8
+
+    assert dedupe_collection(movies, "title_with_year", batch_size=1) == (2, 3)
+    assert sorted(document["_id"] for document in movies.find()) == [2, 3, 6, 7, 8]
+    assert movies.find_one({"_id": 2})["public_rating"] == 4.1
+    assert dedupe_collection(movies, "title_with_year") == (0, 0)
+
+def test_sets_already_merged_elsewhere_are_skipped(movies):
+    movies.insert_many([movie(1, "Heat (1995)", 2), movie(2, "Heat (1995)", 1)])
+    # Members of a set may be gone by the time its batch is read
+    assert _merge_batch(movies, [[1, 2, 3], [4, 5]], dry_run=False) == (1, 1)
+    movies.delete_one({"_id": 2})
+    assert _merge_batch(movies, [[1, 2]], dry_run=False) == (0, 0)
@@ -0,0 +1,31 @@
+import os
+import time
+
+import pytest
+
+from health import HealthMonitor
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_child_starts_from_a_clean_probe_state():
+    monitor = HealthMonitor(time.time(), interval=3600)
+    monitor.mongodb_connected = True
+    monitor.mongodb_latency_ms = 1.0
+    monitor.last_probe_at = time.time()
+    monitor._lock.acquire()
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            clean = (not monitor.mongodb_connected and monitor.mongodb_latency_ms is None
+                     and monitor.last_probe_at is None and monitor._thread is None and monitor._pid is None
+                     and monitor._lock.acquire(timeout=1))
+            os.write(write_end, b"1" if clean else b"0")
+        finally:
+            os._exit(0)
+    os.close(write_end)
+    try:
+        assert os.read(read_end, 1) == b"1"
+    finally:
+        os.waitpid(pid, 0)
+        os.close(read_end)
+        monitor._lock.release()
@@ -0,0 +1,83 @@
+import time
+from datetime import timedelta
+
+import pytest
+
+import jobs
+from timeutil import utc_now
+from jobs import DONE, FAILED, QUEUED, RUNNING, InProcessJobQueue, MongoJobQueue
+
+def describe(error):
+    return str(error), 400
+
+def wait_for(queue, job_id, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in (DONE, FAILED):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_in_process_job_reports_progress_and_result():
+    def handler(payload, progress, scale=1):
+        progress(1, 2, {"partial": True})
+        return {"length": len(payload) * scale}
+
+    queue = InProcessJobQueue(handler, describe, workers=1)
+    job = wait_for(queue, queue.submit(b"abc", {"scale": 2}))
+    assert job["status"] == DONE
+    assert job["result"] == {"length": 6}
+    assert job["partial"] is None
+    assert job["progress"]["percent"] == 100.0
+
+def test_in_process_job_failure_is_described():
+    def handler(payload, progress):
+        raise ValueError("bad export")
+
+    queue = InProcessJobQueue(handler, describe, workers=1)
+    job = wait_for(queue, queue.submit(b""))
+    assert job["status"] == FAILED
+    assert job["error"] == "bad export"
+
+def test_unknown_job_is_none():
+    assert InProcessJobQueue(lambda *args: {}, describe).get("missing") is None
+
+@pytest.fixture
+def mongo_queue(mongo, monkeypatch):
+    queue = MongoJobQueue(lambda payload, progress: {"ok": True}, describe)
+    # Claims are made by the tests rather than by worker threads
+    monkeypatch.setattr(queue, "start", lambda: None)
+    yield queue
+    queue.collection.delete_many({})
+
+def test_mongo_claim_takes_oldest_queued_job(mongo_queue):
+    first = mongo_queue.submit(b"first")
+    mongo_queue.collection.update_one({"_id": first}, {"$set": {"created_at": utc_now() - timedelta(seconds=5)}})
+    second = mongo_queue.submit(b"second")
+    job_id, payload, options = mongo_queue._claim()
+    assert (job_id, payload, options) == (first, b"first", {})
+    stored = mongo_queue.collection.find_one({"_id": first})
+    assert stored["status"] == RUNNING and stored["attempts"] == 1
+    assert mongo_queue.collection.find_one({"_id": second})["status"] == QUEUED
+
+def _stale_job(queue, attempts):
+    job_id = jobs.uuid.uuid4().hex
+    job = jobs._new_job(job_id, utc_now() - timedelta(seconds=jobs.JOB_STALE_AFTER + 60))
+    job.update(_id=job_id, status=RUNNING, attempts=attempts, payload=b"payload", options={})
+    queue.collection.insert_one(job)
+    return job_id
+
+def test_mongo_stale_job_is_requeued(mongo_queue):
+    job_id = _stale_job(mongo_queue, attempts=1)
+    claimed = mongo_queue._claim()
+    assert claimed is not None and claimed[0] == job_id
+    assert mongo_queue.collection.find_one({"_id": job_id})["attempts"] == 2
+
+def test_mongo_job_is_failed_after_max_attempts(mongo_queue):
+    job_id = _stale_job(mongo_queue, attempts=jobs.JOB_MAX_ATTEMPTS)
+    assert mongo_queue._claim() is None
+    stored = mongo_queue.collection.find_one({"_id": job_id})
+    assert stored["status"] == FAILED
+    assert stored["error_status"] == 500
+    assert "payload" not in stored
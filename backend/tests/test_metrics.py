@@ -0,0 +1,34 @@
+from prometheus_client import REGISTRY
+
+import app as app_module
+import metrics
+from catalog import MovieCatalog
+from snapshot import CatalogSnapshot
+
+def test_metrics_are_hidden_by_default(client):
+    assert client.get("/metrics").status_code == 404
+
+def test_metrics_are_served_when_enabled(client, monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_ENABLED", True)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    assert b"meterboxd_movie_lookups_total" in response.data
+
+def test_metrics_token_is_required_when_set(client, monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_ENABLED", True)
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+def test_catalog_gauges_count_the_snapshot(client):
+    documents = {f"Film {number} (2000)": {"title_with_year": f"Film {number} (2000)", "public_rating": 7.0,
+                                           "vote_count": 10, "popularity": 1.0, "poster_path": "",
+                                           "is_override": False} for number in range(3)}
+    catalog = MovieCatalog(None)
+    catalog.attach_snapshot(CatalogSnapshot.from_documents(documents, None, None))
+    catalog.put("Other (2000)", dict(documents["Film 0 (2000)"], title_with_year="Other (2000)"))
+    metrics.observe_catalog(catalog)
+    assert REGISTRY.get_sample_value("meterboxd_catalog_entries") == 4
+    assert REGISTRY.get_sample_value("meterboxd_catalog_snapshot_entries") == 3
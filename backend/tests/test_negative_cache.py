@@ -0,0 +1,20 @@
+import time
+
+import publicMovieData
+
+def test_negative_cache_is_bounded_least_recently_used_first(monkeypatch):
+    monkeypatch.setattr(publicMovieData, "NEGATIVE_CACHE_MAX_ENTRIES", 2)
+    monkeypatch.setattr(publicMovieData, "_negatives", publicMovieData.OrderedDict())
+    expires_at = time.time() + 60
+    publicMovieData._remember_negative("A (2000)", expires_at)
+    publicMovieData._remember_negative("B (2000)", expires_at)
+    assert publicMovieData._is_negative("A (2000)")
+    publicMovieData._remember_negative("C (2000)", expires_at)
+    assert list(publicMovieData._negatives) == ["A (2000)", "C (2000)"]
+    assert not publicMovieData._is_negative("B (2000)")
+
+def test_expired_negatives_are_dropped(monkeypatch):
+    monkeypatch.setattr(publicMovieData, "_negatives", publicMovieData.OrderedDict())
+    publicMovieData._remember_negative("A (2000)", time.time() - 1)
+    assert not publicMovieData._is_negative("A (2000)")
+    assert "A (2000)" not in publicMovieData._negatives
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import refresher
+from database import MovieDatabase
+from refresher import MovieRefresher
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+@pytest.fixture
+def db(mongo):
+    return MovieDatabase()
+
+def store(db, key, release_date="1990-01-01", **fields):
+    tmdb_id = db.movies_collection.count_documents({}) + 1
+    db.movies_collection.insert_one(dict(title_with_year=key, release_date=release_date, tmdb_id=tmdb_id, **fields))
+
+def refresh_at(db, key):
+    return db.movies_collection.find_one({"title_with_year": key})["refresh_at"]
+
+def test_claim_takes_only_due_movies_not_claimed_elsewhere(db):
+    store(db, "Due (1990)", refresh_at=NOW - timedelta(days=1))
+    store(db, "Later (1990)", refresh_at=NOW + timedelta(days=1))
+    until = NOW + timedelta(hours=1)
+    assert db.claim_refresh(["Due (1990)", "Later (1990)"], NOW, until) == ["Due (1990)"]
+    assert refresh_at(db, "Due (1990)") == until
+    # Another process asking for the same movies gets none of them
+    assert db.claim_refresh(["Due (1990)", "Later (1990)"], NOW, until) == []
+
+def test_movies_without_refresh_time_are_spread_over_their_ttl(db):
+    for number in range(50):
+        store(db, f"Old {number} (1990)")
+    worker = MovieRefresher(db, lambda movie: True)
+    assert db.get_movies_due_for_refresh(NOW, 100) == []
+    assert worker.backfill(NOW) == 50
+    times = [refresh_at(db, f"Old {number} (1990)") for number in range(50)]
+    assert all(NOW <= time <= NOW + timedelta(seconds=refresher.REFRESH_TTL_CLASSIC) for time in times)
+    assert len(set(times)) > 1
+    assert worker.backfill(NOW) == 0
+
+def test_failed_refreshes_back_off_up_to_the_cap(db, monkeypatch):
+    import tmdbClient
+
+    monkeypatch.setattr(tmdbClient, "TMDB_API_KEY", "key")
+    store(db, "Gone (1990)", refresh_at=NOW - timedelta(days=1))
+    worker = MovieRefresher(db, lambda movie: False, rate=0)
+    delays = []
+    for _ in range(12):
+        before = datetime.now(timezone.utc)
+        assert worker.run_once() == 1
+        delays.append((refresh_at(db, "Gone (1990)") - before).total_seconds())
+        db.movies_collection.update_one({"title_with_year": "Gone (1990)"},
+                                        {"$set": {"refresh_at": NOW - timedelta(days=1)}})
+    assert delays[0] == pytest.approx(refresher.REFRESH_RETRY_AFTER, abs=5)
+    assert delays[1] == pytest.approx(2 * refresher.REFRESH_RETRY_AFTER, abs=5)
+    assert delays[-1] == pytest.approx(refresher.REFRESH_RETRY_MAX, abs=5)
+    assert db.movies_collection.find_one({"title_with_year": "Gone (1990)"})["refresh_failures"] == 12
+
+def test_demand_is_counted_per_key(db, monkeypatch):
+    worker = MovieRefresher(db, lambda movie: True)
+    monkeypatch.setattr(worker, "start", lambda: None)
+    worker.record_demand({"A (2000)": None, "B (2000)": None}.keys())
+    worker.record_demand(["A (2000)"])
+    assert worker._demand == {"A (2000)": 2, "B (2000)": 1}
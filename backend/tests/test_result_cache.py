@@ -0,0 +1,46 @@
+import publicMovieData
+import tmdbClient
+from conftest import FILMS, export_zip, stored_movie, upload
+
+EXPORT = export_zip([FILMS[0] + (4.0,), FILMS[1] + (2.5,)], "dana")
+
+def store(title, year, rating):
+    publicMovieData.db.add_or_update_movie(f"{title} ({year})", stored_movie(title, year, rating))
+    publicMovieData.catalog.sync(force=True)
+
+def test_repeated_export_is_answered_from_the_cache(client):
+    first = upload(client, EXPORT)
+    second = upload(client, EXPORT)
+    assert first.headers["X-Result-Cache"] == "miss"
+    assert second.headers["X-Result-Cache"] == "hit"
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert first.get_json() == second.get_json()
+
+def test_changes_to_other_films_keep_the_cached_result(client):
+    upload(client, EXPORT)
+    store(*FILMS[3], 9.5)
+    assert upload(client, EXPORT).headers["X-Result-Cache"] == "hit"
+
+def test_changes_to_the_exports_films_retire_the_cached_result(client):
+    first = upload(client, EXPORT)
+    store(*FILMS[0], 2.0)
+    second = upload(client, EXPORT)
+    assert second.headers["X-Result-Cache"] == "miss"
+    assert second.headers["ETag"] != first.headers["ETag"]
+
+def test_if_none_match_is_answered_with_304(client):
+    etag = upload(client, EXPORT).headers["ETag"]
+    response = upload(client, EXPORT, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.get_data() == b""
+
+def test_degraded_results_are_not_cached(client, monkeypatch):
+    # TMDb is unavailable: the unknown film is served without data
+    monkeypatch.setattr(tmdbClient, "search_movies", lambda titles, on_progress=None: {})
+    archive = export_zip([FILMS[0] + (4.0,), ("Unknown Film", 1999, 3.0)])
+    for _ in range(2):
+        response = upload(client, archive)
+        assert response.status_code == 200
+        assert response.headers["X-Result-Cache"] == "miss"
+        assert "ETag" not in response.headers
@@ -0,0 +1,133 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import json_util
+
+from database import MovieDatabase
+from seed import load_progress, seed_file, seed_operation, write_batch
+
+FETCHED_AT = datetime(2024, 3, 1, tzinfo=timezone.utc)
+NOW = datetime(2024, 3, 2, tzinfo=timezone.utc)
+
+def tmdb_details(tmdb_id, title, year, votes=1000, popularity=10.0):
+    """A line of a TMDb movie details dump"""
+    return {"id": tmdb_id, "title": title, "original_title": title, "release_date": f"{year}-06-01",
+            "vote_average": 7.0, "vote_count": votes, "popularity": popularity, "poster_path": f"/{tmdb_id}.jpg"}
+
+@pytest.fixture
+def movies(mongo):
+    return MovieDatabase().movies_collection
+
+def seeded(movies, *documents):
+    operations = [seed_operation(document, FETCHED_AT, NOW) for document in documents]
+    return write_batch(movies, operations)
+
+def write_lines(path, documents):
+    with open(path, "w", encoding="utf-8") as f:
+        for document in documents:
+            f.write((json_util.dumps(document) if isinstance(document, dict) else document) + "\n")
+    return str(path)
+
+def test_tmdb_details_are_stored_like_a_live_lookup(movies):
+    assert seeded(movies, tmdb_details(603, "The Matrix", 1999)) == (1, 0)
+    movie = movies.find_one({"title_with_year": "The Matrix (1999)"})
+    assert movie["public_rating"] == 3.5
+    assert movie["tmdb_id"] == 603
+    assert movie["fetched_at"] == FETCHED_AT
+    assert movie["updated_at"] == NOW
+    assert movie["refresh_at"] > FETCHED_AT
+
+def test_stored_documents_are_copied_as_they_are(movies):
+    fetched_at = FETCHED_AT - timedelta(days=3)
+    refresh_at = FETCHED_AT + timedelta(days=3)
+    document = {"_id": "exported-id", "title_with_year": "Heat (1995)", "public_rating": 4.1, "vote_count": 900,
+                "popularity": 20.0, "fetched_at": fetched_at, "refresh_at": refresh_at}
+    assert seeded(movies, document) == (1, 0)
+    movie = movies.find_one({"title_with_year": "Heat (1995)"})
+    assert movie["_id"] != "exported-id"
+    assert (movie["public_rating"], movie["fetched_at"], movie["refresh_at"]) == (4.1, fetched_at, refresh_at)
+    assert movie["updated_at"] == NOW
+
+def test_id_export_rows_only_update_the_popularity_of_stored_movies(movies):
+    seeded(movies, tmdb_details(603, "The Matrix", 1999))
+    assert seeded(movies, {"id": 603, "original_title": "The Matrix", "popularity": 99.5},
+                  {"id": 604, "original_title": "The Matrix Reloaded", "popularity": 50.0}) == (1, 0)
+    assert movies.find_one({"tmdb_id": 603})["popularity"] == 99.5
+    assert movies.count_documents({}) == 1
+
+@pytest.mark.parametrize("document", [
+    tmdb_details(605, "Unvoted", 2003, votes=0),
+    {"id": 606, "title": "Undated", "vote_count": 10},
+    {"title": "No Id", "release_date": "2003-01-01"},
+    {"something": "else"},
+])
+def test_unusable_lines_are_skipped(document):
+    assert seed_operation(document, FETCHED_AT, NOW) is None
+
+def test_movies_fetched_after_the_file_are_kept(movies):
+    newer = FETCHED_AT + timedelta(days=1)
+    seeded(movies, dict(tmdb_details(603, "The Matrix", 1999), title_with_year="The Matrix (1999)", fetched_at=newer))
+    stored = movies.find_one({"title_with_year": "The Matrix (1999)"})
+
+    written, kept = seeded(movies, dict(tmdb_details(603, "The Matrix", 1999), vote_average=2.0),
+                           tmdb_details(604, "The Matrix Reloaded", 2003))
+    assert (written, kept) == (1, 1)
+    assert movies.find_one({"title_with_year": "The Matrix (1999)"}) == stored
+
+    # An older copy is replaced
+    assert seeded(movies, dict(tmdb_details(604, "The Matrix Reloaded", 2003), vote_average=9.0)) == (1, 0)
+    assert movies.find_one({"title_with_year": "The Matrix Reloaded (2003)"})["public_rating"] == 4.5
+
+class FailingCollection:
+    """Passes writes through until `failures_after` bulk writes have been made, then fails"""
+
+    def __init__(self, collection, failures_after):
+        self._collection = collection
+        self.failures_after = failures_after
+
+    def bulk_write(self, operations, ordered=True):
+        if self.failures_after == 0:
+            raise ConnectionError("lost the connection")
+        self.failures_after -= 1
+        return self._collection.bulk_write(operations, ordered=ordered)
+
+def test_interrupted_runs_resume_from_the_checkpoint(movies, tmp_path):
+    path = write_lines(tmp_path / "movies.jsonl",
+                       [tmdb_details(number, f"Film {number}", 2000) for number in range(1, 6)])
+    with pytest.raises(ConnectionError):
+        seed_file(FailingCollection(movies, failures_after=1), path, batch_size=2, fetched_at=FETCHED_AT)
+    assert load_progress(path) == 2
+    assert movies.count_documents({}) == 2
+
+    counts = seed_file(movies, path, batch_size=2, fetched_at=FETCHED_AT)
+    assert counts == {"lines": 3, "written": 3, "skipped": 0, "kept": 0}
+    assert load_progress(path) == 5
+    assert movies.count_documents({}) == 5
+
+    # Nothing is left to read, unless the run is restarted
+    assert seed_file(movies, path, fetched_at=FETCHED_AT)["lines"] == 0
+    assert seed_file(movies, path, fetched_at=FETCHED_AT, resume=False)["lines"] == 5
+
+def test_a_changed_file_is_read_from_the_start(movies, tmp_path):
+    path = write_lines(tmp_path / "movies.jsonl", [tmdb_details(1, "Film 1", 2000), "not json", ""])
+    assert seed_file(movies, path, fetched_at=FETCHED_AT) == {"lines": 3, "written": 1, "skipped": 2, "kept": 0}
+    assert load_progress(path) == 3
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(tmdb_details(2, "Film 2", 2000)) + "\n")
+    assert load_progress(path) == 0
+    assert seed_file(movies, path, fetched_at=FETCHED_AT)["lines"] == 4
+    assert movies.count_documents({}) == 2
+
+def test_gzipped_files_are_dated_by_their_modification_time(movies, tmp_path):
+    path = str(tmp_path / "movies.jsonl.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps(tmdb_details(1, "Film 1", 2000)) + "\n")
+    modified = FETCHED_AT - timedelta(days=10)
+    os.utime(path, (modified.timestamp(), modified.timestamp()))
+
+    assert seed_file(movies, path)["written"] == 1
+    assert movies.find_one({"title_with_year": "Film 1 (2000)"})["fetched_at"] == modified
@@ -0,0 +1,39 @@
+"""
+Settings given in the project's .env file must reach every module, including those
+that read them at import. Each check imports the app in a fresh interpreter, from a
+copy of the backend next to its own .env.
+"""
+import os
+import shutil
+import subprocess
+import sys
+
+from conftest import BACKEND_DIR
+
+def run_with_env_file(tmp_path, settings, code):
+    backend = tmp_path / "backend"
+    shutil.copytree(BACKEND_DIR, backend, ignore=shutil.ignore_patterns(
+        "tests", "__pycache__", ".mypy_cache", ".pytest_cache", ".venv"))
+    (tmp_path / ".env").write_text("".join(f"{name}={value}\n" for name, value in settings.items()))
+    # Anything set in the environment would take precedence over the file
+    env = {name: value for name, value in os.environ.items() if name not in settings}
+    env["MONGODB_URI"] = "mongodb://localhost:1/meterboxd-test?serverSelectionTimeoutMS=100"
+    result = subprocess.run([sys.executable, "-c", code], cwd=backend, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+def test_job_queue_is_read_from_env_file(tmp_path):
+    output = run_with_env_file(tmp_path, {"JOB_QUEUE": "mongo"},
+                               "import app; print(type(app.job_queue).__name__)")
+    assert output == "MongoJobQueue"
+
+def test_profile_id_secret_is_read_from_env_file(tmp_path):
+    output = run_with_env_file(tmp_path, {"PROFILE_ID_SECRET": "abc", "SUMMARY_ENABLED": "true"},
+                               "import summaries; print(summaries.SUMMARY_ENABLED, summaries.PROFILE_ID_SECRET)")
+    assert output == "True abc"
+
+def test_result_cache_settings_are_read_from_env_file(tmp_path):
+    output = run_with_env_file(tmp_path, {"RESULT_CACHE_MONGO": "false", "RESULT_CACHE_TTL": "60"},
+                               "import resultCache as c; print(c.RESULT_CACHE_MONGO, c.RESULT_CACHE_TTL)")
+    assert output == "False 60"
@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+def test_second_claim_waits_for_the_leader():
+    flights = SingleFlight()
+    leading, waiting = flights.claim(["A", "B"])
+    assert leading == ["A", "B"] and waiting == {}
+    leading, waiting = flights.claim(["B", "C"])
+    assert leading == ["C"] and set(waiting) == {"B"}
+    flights.complete("B", 42)
+    assert waiting["B"].result(timeout=1) == 42
+    # A completed key can be claimed again
+    assert flights.claim(["B"])[0] == ["B"]
+
+def test_failure_reaches_waiters_and_releases_keys():
+    flights = SingleFlight()
+    flights.claim(["A"])
+    _, waiting = flights.claim(["A"])
+    flights.fail(["A"], RuntimeError("TMDb down"))
+    with pytest.raises(RuntimeError):
+        waiting["A"].result(timeout=1)
+    assert flights.in_flight() == 0
+
+def test_concurrent_claims_elect_one_leader():
+    flights = SingleFlight()
+    barrier = threading.Barrier(8)
+    leaders = []
+
+    def claim():
+        barrier.wait()
+        leading, _ = flights.claim(["A"])
+        leaders.extend(leading)
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert leaders == ["A"]
@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+
+from catalog import MovieCatalog
+from snapshot import load_snapshot, write_snapshot
+
+MOVIE_WATERMARK = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+OVERRIDE_WATERMARK = datetime(2024, 1, 2, 12, tzinfo=timezone.utc)
+
+DOCUMENTS = {
+    "Amélie (2001)": {"public_rating": 7.9, "vote_count": 11000.0, "popularity": 30.5,
+                      "poster_path": "/amelie.jpg", "is_override": False},
+    "Se7en (1995)": {"public_rating": 8.4, "vote_count": 20000.0, "popularity": 50.0,
+                     "poster_path": "", "is_override": True},
+    "Solaris (1972)": {"public_rating": 7.7, "vote_count": 1500.0, "popularity": 12.25,
+                       "poster_path": "/solaris.jpg", "is_override": False},
+}
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "snapshot")
+    assert write_snapshot(path, DOCUMENTS, MOVIE_WATERMARK, OVERRIDE_WATERMARK) == 3
+    snapshot = load_snapshot(path)
+    assert snapshot is not None
+    assert snapshot.documents() == DOCUMENTS
+    assert snapshot.watermarks() == (MOVIE_WATERMARK, OVERRIDE_WATERMARK)
+    assert snapshot.override_keys() == ["Se7en (1995)"]
+    assert snapshot.find("Missing (2000)") == -1
+
+    # Writing again replaces the snapshot in place
+    write_snapshot(path, {"Solaris (1972)": DOCUMENTS["Solaris (1972)"]}, MOVIE_WATERMARK, None)
+    assert list(load_snapshot(path).documents()) == ["Solaris (1972)"]
+
+def test_catalog_over_a_snapshot_lists_every_key_once(tmp_path):
+    path = str(tmp_path / "snapshot")
+    write_snapshot(path, DOCUMENTS, MOVIE_WATERMARK, OVERRIDE_WATERMARK)
+    catalog = MovieCatalog(None)
+    catalog.attach_snapshot(load_snapshot(path))
+    catalog.put("Amélie (2001)", dict(DOCUMENTS["Amélie (2001)"], public_rating=8.0))
+    catalog.put("Stalker (1979)", dict(DOCUMENTS["Solaris (1972)"], poster_path="/stalker.jpg"))
+
+    items = dict(catalog.items())
+    assert len(catalog) == len(list(catalog)) == len(catalog.keys()) == len(items) == 4
+    assert items["Amélie (2001)"].public_rating == 8.0
+    assert items["Solaris (1972)"].poster_path == "/solaris.jpg"
+    assert catalog["Se7en (1995)"].vote_count == 20000.0
+    assert "Stalker (1979)" in catalog
+
+def test_catalog_frame_includes_snapshot_movies(tmp_path, monkeypatch):
+    import publicMovieData
+
+    path = str(tmp_path / "snapshot")
+    write_snapshot(path, DOCUMENTS, MOVIE_WATERMARK, OVERRIDE_WATERMARK)
+    catalog = MovieCatalog(None)
+    catalog.attach_snapshot(load_snapshot(path))
+    monkeypatch.setattr(publicMovieData, "catalog", catalog)
+    monkeypatch.setattr(publicMovieData, "_catalog_frame", None)
+    assert sorted(publicMovieData.get_catalog_frame().index) == sorted(DOCUMENTS)
+
+def test_naive_watermarks_of_older_snapshots_read_as_utc(tmp_path):
+    path = str(tmp_path / "snapshot")
+    write_snapshot(path, DOCUMENTS, MOVIE_WATERMARK.replace(tzinfo=None), None)
+    assert load_snapshot(path).watermarks() == (MOVIE_WATERMARK, None)
@@ -0,0 +1,63 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stats import METRICS, _select_extremes, analyze_all, enrich_movies, summarize_metrics
+
+def titles(results):
+    return {name: (round(average, 9), [movie.title for movie in highest], [movie.title for movie in lowest])
+            for name, (average, highest, lowest) in results.items()}
+
+@pytest.mark.parametrize("list_size", [1, 3, 8, 50])
+def test_vectorized_path_orders_ties_like_the_row_path(list_size):
+    generator = random.Random(list_size)
+    resolved = {f"Film {number} (2000)": (float(5 + number % 3), 100.0 * (1 + number % 4), 10.0, "")
+                for number in range(40)}
+    frame = pd.DataFrame({
+        "Name": [f"Film {number}" for number in range(40)],
+        "Year": [2000] * 40,
+        "Rating": [float(generator.choice([4, 5, 6])) for _ in range(40)],
+        "Letterboxd URI": [f"https://boxd.it/{number}" for number in range(40)],
+    })
+    vectorized = analyze_all(frame, vectorized=True, resolved=resolved, list_size=list_size)
+    rows = analyze_all(frame, vectorized=False, resolved=resolved, list_size=list_size)
+    assert titles(vectorized) == titles(rows)
+
+def test_select_extremes_breaks_ties_by_position():
+    highest, lowest = _select_extremes(np.array([1.0, 2.0, 2.0, 1.0, 2.0, 1.0]), 2)
+    assert highest.tolist() == [1, 2]
+    assert lowest.tolist() == [5, 3]
+
+def full_sort(movies, metric_function, list_size):
+    """What summarize_metrics replaced: a stable sort of every movie"""
+    ranked = sorted(movies, key=metric_function, reverse=True)
+    average = sum(map(metric_function, movies)) / len(movies)
+    return average, ranked[:list_size], ranked[max(0, len(ranked) - list_size):][::-1]
+
+@pytest.mark.parametrize("list_size", [1, 3, 8, 29, 30, 31, 100])
+def test_bounded_heaps_select_like_a_full_sort(list_size):
+    generator = random.Random(list_size)
+    resolved = {f"Film {number} (2000)": (float(5 + number % 3), 100.0 * (1 + number % 4), 10.0, "")
+                for number in range(40)}
+    frame = pd.DataFrame({
+        "Name": [f"Film {number}" for number in range(40)],
+        "Year": [2000] * 40,
+        # A few values, so both metrics are full of ties; every fourth film is unrated
+        "Rating": [np.nan if number % 4 == 3 else float(generator.choice([4, 5, 6])) for number in range(40)],
+    })
+    movies = enrich_movies(frame.dropna(), resolved)
+    assert len(movies) == 30
+
+    expected = {name: full_sort(movies, metric_function, list_size) for name, metric_function in METRICS.items()}
+    assert titles(summarize_metrics(iter(movies), METRICS, list_size)) == titles(expected)
+    assert titles(analyze_all(frame, vectorized=False, resolved=resolved, list_size=list_size)) == titles(expected)
+
+def test_bounded_heaps_keep_input_order_among_equal_metrics():
+    movies = enrich_movies(pd.DataFrame({"Name": ["A", "B", "C", "D"], "Year": [2000] * 4, "Rating": [3.0] * 4}),
+                           {f"{title} (2000)": (3.5, 100.0, 10.0, "") for title in "ABCD"})
+    metric = {"rating": METRICS["rating"]}
+    assert titles(summarize_metrics(movies, metric, 2)) == {"rating": (-0.5, ["A", "B"], ["D", "C"])}
+    assert titles(summarize_metrics(movies, metric, 2)) == titles({"rating": full_sort(movies, metric["rating"], 2)})
+    assert titles(summarize_metrics([], metric, 2)) == {"rating": (0.0, [], [])}
@@ -0,0 +1,105 @@
+import io
+import random
+
+import stats
+import summaries
+import uploadPipeline
+from conftest import FILMS, export_zip
+from csvReader import RatingRecord
+from stats import analyze_all, analyze_incremental
+from summaries import Extremes, MetricSummary, ProfileSummary
+
+LIST_SIZE = 5
+
+def catalog(count):
+    """Public data with only a few distinct ratings and popularities, so metrics tie often"""
+    return {f"Film {number} (2000)": (float(5 + number % 3), 100.0 * (1 + number % 4), 10.0, "")
+            for number in range(count)}
+
+def records(ratings):
+    return [RatingRecord(f"Film {number}", 2000, rating, f"https://boxd.it/{number}")
+            for number, rating in ratings.items()]
+
+def titles(result):
+    average, highest, lowest = result
+    return round(average, 9), [movie.title for movie in highest], [movie.title for movie in lowest]
+
+def assert_matches_full_recompute(ratings, summary, resolved):
+    export = records(ratings)
+    incremental = analyze_incremental(export, summary, resolved=resolved, list_size=LIST_SIZE)
+    full = analyze_all(export, vectorized=False, resolved=resolved, list_size=LIST_SIZE)
+    assert {name: titles(result) for name, result in incremental.items()} == \
+        {name: titles(result) for name, result in full.items()}
+
+def test_incremental_updates_match_a_full_recompute_with_ties():
+    generator = random.Random(7)
+    resolved = catalog(300)
+    ratings = {number: float(generator.choice([4, 5, 6])) for number in range(200)}
+    summary = ProfileSummary("profile", ["rating", "obscurity"])
+    assert_matches_full_recompute(ratings, summary, resolved)
+    for _ in range(10):
+        for number in generator.sample(sorted(ratings), 15):
+            del ratings[number]
+        for number in generator.sample(range(300), 15):
+            ratings[number] = float(generator.choice([4, 5, 6]))
+        # Keep the export in a fresh order, as a new export may list films differently
+        ratings = dict(generator.sample(sorted(ratings.items()), len(ratings)))
+        assert_matches_full_recompute(ratings, summary, resolved)
+
+def test_ties_at_capacity_are_kept():
+    buffer = Extremes(2)
+    for population, (value, key) in enumerate([(3.0, "a"), (1.0, "b"), (1.0, "c"), (1.0, "d")]):
+        buffer.add(value, key, {}, population)
+    assert [item[1] for item in buffer.items] == ["a", "b", "c", "d"]
+    buffer.add(0.5, "e", {}, 4)
+    assert [item[1] for item in buffer.items] == ["a", "b", "c", "d"]
+
+def test_merge_keeps_only_values_known_for_both_sets():
+    partial = Extremes(2, [[9.0, "a", {}], [5.0, "b", {}]])
+    other = Extremes(2, [[7.0, "c", {}], [6.0, "d", {}]])
+    # `partial` summarizes 10 entries, so one of its unseen ones may be 4.9 but not 6
+    partial.merge(other, population=10, other_population=2)
+    assert [item[1] for item in partial.items] == ["a", "c"]
+
+def test_removals_below_the_list_size_need_a_rebuild():
+    summary = MetricSummary(capacity=3)
+    for population, value in enumerate([1.0, 2.0, 3.0, 4.0, 5.0]):
+        summary.add(value, str(value), {})
+    assert summary.covers(3)
+    summary.remove("5.0", 5.0)
+    assert not summary.covers(3)
+
+def test_profile_ids_are_keyed(monkeypatch):
+    first = summaries.profile_id(" Alice ")
+    assert first == summaries.profile_id("alice")
+    monkeypatch.setattr(summaries, "PROFILE_ID_SECRET", "other-secret")
+    assert summaries.profile_id("alice") != first
+
+def test_older_schema_is_not_loaded(mongo):
+    document = ProfileSummary(summaries.profile_id("alice"), ["rating"]).to_document()
+    document["schema"] = summaries.SUMMARY_SCHEMA_VERSION - 1
+    summaries._collection().insert_one(document)
+    assert summaries.load_summary(document["_id"]) is None
+
+def test_reuploads_are_analyzed_incrementally(client, monkeypatch):
+    monkeypatch.setattr(uploadPipeline, "RESULT_CACHE_ENABLED", False)
+    assert uploadPipeline.SUMMARY_ENABLED
+    incremental = []
+    analyze = stats.analyze_incremental
+
+    def spy(csv_data, summary, *args, **kwargs):
+        incremental.append(len(summary.rows))
+        return analyze(csv_data, summary, *args, **kwargs)
+
+    monkeypatch.setattr(stats, "analyze_incremental", spy)
+
+    first = [FILMS[0] + (4.0,), FILMS[1] + (2.0,), FILMS[2] + (3.0,)]
+    second = [FILMS[0] + (4.0,), FILMS[1] + (5.0,), FILMS[3] + (1.5,)]
+    uploadPipeline.process_export(io.BytesIO(export_zip(first, "alice")))
+    assert summaries._collection().count_documents({"_id": summaries.profile_id("alice")}) == 1
+    response = uploadPipeline.process_export(io.BytesIO(export_zip(second, "alice"))).response
+    # The second upload started from the three ratings stored by the first
+    assert incremental == [0, 3]
+
+    monkeypatch.setattr(uploadPipeline, "SUMMARY_ENABLED", False)
+    assert response == uploadPipeline.process_export(io.BytesIO(export_zip(second, "alice"))).response
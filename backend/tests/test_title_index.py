@@ -0,0 +1,116 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from titleIndex import TitleIndex
+
+class FakeDatabase:
+    """Movies and Letterboxd URIs as MovieDatabase returns them, newest first"""
+
+    def __init__(self, movies, uris=()):
+        self.movies = movies
+        self.uris = list(uris)
+        self.learned = {}
+        self.reads = 0
+
+    def get_movies_updated_since(self, since, projection=None, limit=None):
+        self.reads += 1
+        movies = [movie for movie in self.movies if since is None or movie["updated_at"] >= since]
+        return sorted(movies, key=lambda movie: movie["updated_at"], reverse=True)[:limit]
+
+    def get_letterboxd_ids_updated_since(self, since, limit=None):
+        return self.uris[:limit]
+
+    def add_letterboxd_ids(self, learned):
+        self.learned.update(learned)
+
+def movie(title, year, tmdb_id, age=0, **fields):
+    document = {"title_with_year": f"{title} ({year})", "release_date": f"{year}-06-01", "tmdb_id": tmdb_id,
+                "updated_at": datetime(2024, 1, 1, tzinfo=timezone.utc) - timedelta(seconds=age)}
+    document.update(fields)
+    return document
+
+def loaded(database, **options):
+    index = TitleIndex(database, **options)
+    index.sync(load=True)
+    return index
+
+def test_matches_spelling_and_year_variants():
+    index = loaded(FakeDatabase([movie("Amélie", 2001, 1), movie("Se7en", 1995, 2, original_title="Seven")]))
+    assert index.match("Amelie", 2001) == "Amélie (2001)"
+    assert index.match("Amelie", 2002) == "Amélie (2001)"
+    assert index.match("Seven", 1995) == "Se7en (1995)"
+    assert index.match("Amelie", 2005) is None
+
+def test_ambiguous_titles_are_not_matched():
+    index = loaded(FakeDatabase([movie("Solaris", 1972, 1), movie("Solyaris", 1972, 2, original_title="Solaris")]))
+    assert index.match("Solyaris", 1972) == "Solyaris (1972)"
+    assert index.match("Solaris", 1972) is None
+
+def test_index_keeps_only_the_most_recently_updated_movies():
+    movies = [movie(f"Film {number}", 2000, number, age=number) for number in range(5)]
+    index = loaded(FakeDatabase(movies), max_movies=3)
+    assert index.counters()["movies"] == 3
+    assert index.match("Film 0", 2000) == "Film 0 (2000)"
+    assert index.match("Film 4", 2000) is None
+    assert index.key_for_tmdb_id(4) is None
+
+    # A movie stored since then pushes out the oldest remaining one
+    index.add("Film 9 (2000)", movie("Film 9", 2000, 9))
+    assert index.match("Film 2", 2000) is None
+    assert index.key_for_tmdb_id(9) == "Film 9 (2000)"
+
+def test_uris_are_bounded_least_recently_used_first():
+    uris = [{"_id": f"https://boxd.it/{number}", "tmdb_id": number} for number in range(3)]
+    index = loaded(FakeDatabase([], uris), max_uris=2)
+    assert index.tmdb_id_for_uri("https://boxd.it/2") is None
+    assert index.tmdb_id_for_uri("https://boxd.it/0") == 0
+    index.learn({})
+    index.add("Film (2000)", movie("Film", 2000, 7))
+    index.learn({"Film (2000)": "https://boxd.it/film"})
+    assert index.tmdb_id_for_uri("https://boxd.it/1") is None
+    assert index.tmdb_id_for_uri("https://boxd.it/0") == 0
+
+def test_learns_only_keys_stored_under_exactly_that_key():
+    database = FakeDatabase([movie("Amélie", 2001, 1)])
+    index = loaded(database)
+    assert index.match("Amelie", 2001) == "Amélie (2001)"
+    learned = index.learn({"Amélie (2001)": "https://boxd.it/amelie", "Amelie (2001)": "https://boxd.it/other"})
+    assert learned == 1
+    assert database.learned == {"https://boxd.it/amelie": 1}
+
+def test_sync_before_load_starts_it_in_the_background():
+    database = FakeDatabase([movie("Film", 2000, 1)])
+    index = TitleIndex(database)
+    assert index.sync() == 0
+    deadline = time.time() + 10
+    while not index.is_loaded() and time.time() < deadline:
+        time.sleep(0.01)
+    assert index.match("Film", 2000) == "Film (2000)"
+    assert database.reads == 1
+
+def test_uploads_hand_uris_to_one_learner_thread(monkeypatch):
+    database = FakeDatabase([movie(f"Film {number}", 2000, number) for number in range(5)])
+    index = loaded(database, max_uris=3)
+    started = []
+    monkeypatch.setattr(index, "_ensure_learner", lambda: started.append(True))
+    for number in range(5):
+        index.learn_later({f"Film {number} (2000)": f"https://boxd.it/{number}"})
+    index.learn_later({"Film 4 (2000)": "https://boxd.it/4"})
+    index.learn_later({})
+    # Queued keys are coalesced and bounded, oldest dropped first
+    assert index.learn_pending() == 3
+    assert database.learned == {f"https://boxd.it/{number}": number for number in (2, 3, 4)}
+    assert index.learn_pending() == 0
+    assert len(started) == 6
+
+def test_learner_thread_is_started_once():
+    database = FakeDatabase([movie("Film", 2000, 1), movie("Other", 2000, 2)])
+    index = loaded(database)
+    index.learn_later({"Film (2000)": "https://boxd.it/film"})
+    learner = index._learner
+    index.learn_later({"Other (2000)": "https://boxd.it/other"})
+    assert index._learner is learner
+    deadline = time.time() + 10
+    while len(database.learned) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert database.learned == {"https://boxd.it/film": 1, "https://boxd.it/other": 2}
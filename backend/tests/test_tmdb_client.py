@@ -0,0 +1,162 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import tmdbClient
+from tmdbClient import CircuitBreaker, TMDBUnavailableError, TokenBucket
+
+class FakeClock:
+    """Stands in for the `time` module: sleeping only moves the clock forward"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+class FakeSession:
+    """Answers GETs from a script of status codes or exceptions, recording when each call was made"""
+
+    def __init__(self, clock, script):
+        self.clock = clock
+        self.script = list(script)
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(self.clock.now)
+        outcome = self.script.pop(0) if self.script else 200
+        if isinstance(outcome, Exception):
+            raise outcome
+        status, headers = outcome if isinstance(outcome, tuple) else (outcome, {})
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response._content = json.dumps({"id": 603, "status": status}).encode()
+        return response
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(tmdbClient, "time", clock)
+    # Backoff waits the full (un-jittered) delay so it can be checked exactly
+    monkeypatch.setattr(tmdbClient, "random", SimpleNamespace(uniform=lambda low, high: high))
+    monkeypatch.setattr(tmdbClient, "TMDB_API_KEY", "test-key")
+    monkeypatch.setattr(tmdbClient, "TMDB_MAX_RETRIES", 3)
+    monkeypatch.setattr(tmdbClient, "TMDB_BACKOFF_BASE", 0.5)
+    monkeypatch.setattr(tmdbClient, "TMDB_MAX_BACKOFF", 10.0)
+    monkeypatch.setattr(tmdbClient, "rate_limiter", TokenBucket(1000, 1000))
+    monkeypatch.setattr(tmdbClient, "breaker", CircuitBreaker(3, 30))
+    return clock
+
+@pytest.fixture
+def session(clock, monkeypatch):
+    def script(*outcomes):
+        fake = FakeSession(clock, outcomes)
+        monkeypatch.setattr(tmdbClient, "get_session", lambda: fake)
+        return fake
+    return script
+
+def test_throttled_and_server_errors_back_off(clock, session):
+    fake = session((429, {"Retry-After": "2"}), 503, requests.ConnectionError("reset"), 200)
+    assert tmdbClient.get_movie(603)["id"] == 603
+    assert len(fake.calls) == 4
+    # Retry-After raises the first delay; the others double from TMDB_BACKOFF_BASE
+    assert clock.sleeps == [2.0, 1.0, 2.0]
+    assert tmdbClient.breaker.state == CircuitBreaker.CLOSED
+
+def test_backoff_is_capped(clock, session, monkeypatch):
+    monkeypatch.setattr(tmdbClient, "TMDB_MAX_BACKOFF", 1.5)
+    session((429, {"Retry-After": "60"}), 500, 500, 200)
+    tmdbClient.get_movie(603)
+    assert clock.sleeps == [1.5, 1.0, 1.5]
+
+def test_exhausted_retries_raise_unavailable(clock, session):
+    fake = session(500, 502, 503, 504, 200)
+    with pytest.raises(TMDBUnavailableError):
+        tmdbClient.get_movie(603)
+    assert len(fake.calls) == tmdbClient.TMDB_MAX_RETRIES + 1
+    assert clock.sleeps == [0.5, 1.0, 2.0]
+    # One failed call, however many attempts it made
+    assert tmdbClient.breaker.state == CircuitBreaker.CLOSED
+
+def test_client_errors_are_not_retried(clock, session):
+    fake = session(404, 401)
+    assert tmdbClient.get_movie(603) == {}
+    with pytest.raises(requests.HTTPError):
+        tmdbClient.get_movie(603)
+    assert len(fake.calls) == 2
+    assert clock.sleeps == []
+
+def test_circuit_opens_half_opens_and_closes(clock, session, monkeypatch):
+    monkeypatch.setattr(tmdbClient, "TMDB_MAX_RETRIES", 0)
+    fake = session(500, 500, 500, 500, 200)
+    for _ in range(3):
+        with pytest.raises(TMDBUnavailableError):
+            tmdbClient.get_movie(603)
+    assert tmdbClient.breaker.state == CircuitBreaker.OPEN
+
+    # While open, calls fail fast without reaching TMDb
+    clock.now += 29
+    with pytest.raises(TMDBUnavailableError, match="circuit is open"):
+        tmdbClient.get_movie(603)
+    assert len(fake.calls) == 3
+
+    # After the cooldown one trial call goes through; its failure re-opens the circuit
+    clock.now += 1
+    with pytest.raises(TMDBUnavailableError):
+        tmdbClient.get_movie(603)
+    assert len(fake.calls) == 4
+    assert tmdbClient.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(TMDBUnavailableError, match="circuit is open"):
+        tmdbClient.get_movie(603)
+
+    # A successful trial closes it again
+    clock.now += 30
+    assert tmdbClient.get_movie(603)["id"] == 603
+    assert tmdbClient.breaker.state == CircuitBreaker.CLOSED
+    assert tmdbClient.get_movie(603)["id"] == 603
+    assert len(fake.calls) == 6
+
+def test_failed_retry_of_a_half_open_trial_reopens_the_circuit(clock, session):
+    breaker = tmdbClient.breaker
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+    clock.now += breaker.reset_timeout
+    fake = session(503, 200)
+    # The trial's retry is refused, which must not leave the circuit half-open
+    with pytest.raises(TMDBUnavailableError, match="circuit is open"):
+        tmdbClient.get_movie(603)
+    assert len(fake.calls) == 1
+    assert breaker.state == CircuitBreaker.OPEN
+
+def test_token_bucket_limits_the_request_rate(clock, session, monkeypatch):
+    monkeypatch.setattr(tmdbClient, "rate_limiter", TokenBucket(10, 2))
+    fake = session()
+    for _ in range(6):
+        tmdbClient.get_movie(603)
+    # A burst of two, then one request every 1/10 s
+    assert fake.calls == pytest.approx([0.0, 0.0, 0.1, 0.2, 0.3, 0.4])
+
+    # Idle time refills the bucket, but never beyond its capacity
+    clock.now += 60
+    del fake.calls[:]
+    for _ in range(3):
+        tmdbClient.get_movie(603)
+    assert fake.calls == pytest.approx([60.4, 60.4, 60.5])
+
+def test_unavailable_movies_are_left_out_of_batch_results(clock, session, monkeypatch):
+    monkeypatch.setattr(tmdbClient, "TMDB_MAX_WORKERS", 1)
+    monkeypatch.setattr(tmdbClient, "TMDB_MAX_RETRIES", 0)
+    session(200, 500, 404)
+    found = tmdbClient.get_movies([("A (2000)", 1), ("B (2000)", 2), ("C (2000)", 3)])
+    assert found == {"A (2000)": {"id": 603, "status": 200}, "C (2000)": {}}
@@ -0,0 +1,39 @@
+import io
+
+from conftest import FILMS, export_zip, upload
+
+def test_uploads_of_stored_films_all_succeed(client):
+    # Every film is a catalog hit after the first upload; each of these once failed with a 500
+    exports = {
+        "alice": [FILMS[0] + (4.0,), FILMS[1] + (3.5,), FILMS[2] + (2.0,)],
+        "bob": [FILMS[1] + (5.0,), FILMS[2] + (1.0,), FILMS[3] + (3.0,)],
+        "carol": [FILMS[0] + (2.5,), FILMS[3] + (4.5,)],
+    }
+    for username, ratings in exports.items():
+        response = upload(client, export_zip(ratings, username))
+        assert response.status_code == 200, response.get_json()
+        underrated = response.get_json()["rating_stats"]["underrated_movies"]
+        assert {movie["title"] for movie in underrated} == {title for title, _, _ in ratings}
+
+def test_upload_rejects_non_zip(client):
+    response = client.post("/api/upload", data={"zip": (io.BytesIO(b"not a zip"), "export.zip")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Invalid ZIP file"}
+
+def test_async_upload_streams_job_events(client):
+    response = upload(client, export_zip([FILMS[0] + (4.0,), FILMS[1] + (2.0,)]), **{"async": "1"})
+    assert response.status_code == 202
+    events = client.get(response.get_json()["events_url"]).get_data(as_text=True)
+    assert events.startswith("retry: ")
+    assert "event: done" in events
+
+def test_job_event_stream_is_closed_after_max_seconds(client, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "JOB_EVENTS_MAX_SECONDS", 0.0)
+    monkeypatch.setattr(app_module.job_queue, "get", lambda job_id: {
+        "job_id": job_id, "status": "running", "progress": {"resolved": 0, "total": 1}})
+    events = client.get("/api/jobs/slow/events").get_data(as_text=True)
+    # The current state is sent before the stream is closed
+    assert events.count("event: progress") == 1
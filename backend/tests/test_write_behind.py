@@ -0,0 +1,96 @@
+import pytest
+
+from writeBehind import WriteBehindBuffer
+
+class FakeDatabase:
+    """Records writes; keys in `poison` always fail, and everything fails while `down`"""
+
+    def __init__(self, poison=()):
+        self.poison = set(poison)
+        self.down = False
+        self.bulk_writes = []
+        self.single_writes = []
+        self.stored = {}
+
+    def add_or_update_movies_bulk(self, movies):
+        self.bulk_writes.append(dict(movies))
+        if self.down or self.poison & set(movies):
+            return False
+        self.stored.update(movies)
+        return True
+
+    def add_or_update_movie(self, key, movie_data):
+        self.single_writes.append(key)
+        if self.down or key in self.poison:
+            return False
+        self.stored[key] = movie_data
+        return True
+
+@pytest.fixture
+def make_buffer(monkeypatch):
+    def make(database, **options):
+        buffer = WriteBehindBuffer(database, **options)
+        # Flushes are made by the tests rather than by the background thread
+        monkeypatch.setattr(buffer, "_ensure_started", lambda: None)
+        return buffer
+    return make
+
+def test_adds_are_coalesced_by_key(make_buffer):
+    database = FakeDatabase()
+    buffer = make_buffer(database)
+    buffer.add("A (2000)", {"public_rating": 6.0})
+    buffer.add("B (2000)", {"public_rating": 7.0})
+    buffer.add("A (2000)", {"public_rating": 8.0})
+    assert buffer.pending() == 2
+    assert buffer.flush() == 2
+    assert len(database.bulk_writes) == 1
+    assert database.stored["A (2000)"]["public_rating"] == 8.0
+    assert buffer.flush() == 0
+
+def test_failed_flush_puts_the_batch_back(make_buffer):
+    database = FakeDatabase()
+    buffer = make_buffer(database)
+    buffer.add("A (2000)", {"public_rating": 6.0})
+    buffer.add("B (2000)", {"public_rating": 7.0})
+    database.down = True
+    assert buffer.flush() == 0
+    assert buffer.pending() == 2
+    # The retry waits out its delay unless everything is flushed
+    assert buffer.flush(include_retries=False) == 0
+    database.down = False
+    assert buffer.flush() == 2
+    assert set(database.stored) == {"A (2000)", "B (2000)"}
+    assert buffer.pending() == 0
+
+def test_poison_documents_are_dropped_without_holding_back_the_rest(make_buffer):
+    database = FakeDatabase(poison={"Bad (2000)"})
+    buffer = make_buffer(database, max_attempts=3)
+    buffer.add("Bad (2000)", {})
+    buffer.add("Good (2000)", {})
+    assert buffer.flush() == 0
+    # Retried one at a time, so the good movie gets through
+    assert buffer.flush() == 1
+    assert "Good (2000)" in database.stored
+    assert buffer.flush() == 0
+    assert buffer.pending() == 0
+    assert buffer.dropped == 1
+    assert database.single_writes.count("Bad (2000)") == 2
+
+def test_newer_data_gets_fresh_attempts(make_buffer):
+    database = FakeDatabase(poison={"A (2000)"})
+    buffer = make_buffer(database, max_attempts=2)
+    buffer.add("A (2000)", {"public_rating": 6.0})
+    buffer.flush()
+    database.poison.clear()
+    buffer.add("A (2000)", {"public_rating": 7.0})
+    assert buffer.flush() == 1
+    assert database.bulk_writes[-1] == {"A (2000)": {"public_rating": 7.0, "title_with_year": "A (2000)"}}
+
+def test_buffer_is_capped_dropping_the_oldest(make_buffer):
+    database = FakeDatabase()
+    buffer = make_buffer(database, max_pending=2)
+    for key in ("A (2000)", "B (2000)", "C (2000)"):
+        buffer.add(key, {})
+    assert buffer.dropped == 1
+    buffer.flush()
+    assert set(database.stored) == {"B (2000)", "C (2000)"}
@@ -0,0 +1,19 @@
+"""
+UTC timestamps for MeterBoxd
+
+Every stored timestamp is a timezone-aware UTC datetime. MongoDB clients are
+created with `tz_aware=True` so documents read back compare with `utc_now()`;
+`as_utc` covers the naive values still found in older snapshots, documents and
+command-line input.
+"""
+from datetime import datetime, timezone
+
+def utc_now() -> datetime:
+    """The current time as a timezone-aware UTC datetime"""
+    return datetime.now(timezone.utc)
+
+def as_utc(value: datetime) -> datetime:
+    """`value` as an aware datetime; naive values are taken to be UTC already"""
+    if value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
@@ -0,0 +1,378 @@
+"""
+Local title-resolution index for MeterBoxd
+"""
+import os
+import re
+import threading
+import time
+import logging
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from catalog import overlapped
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-title-index")
+
+# Match catalog misses against stored movies before searching TMDb; set to false to search every miss
+TITLE_INDEX_ENABLED = os.getenv("TITLE_INDEX_ENABLED", "true").lower() == "true"
+
+# Years a title's year may differ from the stored movie's and still match
+TITLE_INDEX_YEAR_TOLERANCE = int(os.getenv("TITLE_INDEX_YEAR_TOLERANCE", "1"))
+
+# Minimum number of seconds between two incremental syncs with MongoDB
+TITLE_INDEX_SYNC_INTERVAL = float(os.getenv("TITLE_INDEX_SYNC_INTERVAL", "30"))
+
+# Most recently updated movies, and most recently used Letterboxd URIs, held by each process
+# (about 45 MB at the defaults)
+TITLE_INDEX_MAX_MOVIES = int(os.getenv("TITLE_INDEX_MAX_MOVIES", "50000"))
+TITLE_INDEX_MAX_URIS = int(os.getenv("TITLE_INDEX_MAX_URIS", "100000"))
+
+# Fields of a stored movie the index reads
+INDEX_PROJECTION = {
+    "_id": 0,
+    "title_with_year": 1,
+    "original_title": 1,
+    "release_date": 1,
+    "tmdb_id": 1,
+    "aliases": 1,
+    "updated_at": 1,
+}
+
+# Leading articles ignored when comparing titles ("The Matrix" matches "Matrix")
+_ARTICLES = {"the", "a", "an", "la", "le", "les", "l", "el", "il", "lo", "der", "die", "das"}
+
+_SEPARATORS = re.compile(r"[\W_]+")
+
+def normalize_title(title: str) -> str:
+    """
+    Comparison form of a title: diacritics removed, lowercased, "&" read as "and",
+    punctuation collapsed to single spaces and a leading article dropped.
+    Letters of other scripts are kept, so non-Latin titles still compare.
+    """
+    decomposed = unicodedata.normalize("NFKD", str(title))
+    text = "".join(char for char in decomposed if not unicodedata.combining(char))
+    words = _SEPARATORS.sub(" ", text.lower().replace("&", " and ")).split()
+    if len(words) > 1 and words[0] in _ARTICLES:
+        words = words[1:]
+    return " ".join(words)
+
+def split_key(key: str) -> Tuple[str, Optional[int]]:
+    """(title, year) of a "Title (Year)" key; the year is None if it is missing or malformed"""
+    title, separator, year = key.rpartition(" (")
+    if not separator or not year.endswith(")"):
+        return key, None
+    return title, _to_year(year[:-1])
+
+def _to_year(value: Any) -> Optional[int]:
+    """Year from an int, a "1999" string or a "1999-03-31" release date"""
+    try:
+        return int(float(str(value)[:4] if isinstance(value, str) and len(value) > 4 else value))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+class TitleIndex:
+    """
+    In-process index of stored movies by normalized title and year.
+
+    Letterboxd and TMDb often spell a title differently ("Amélie" / "Amelie", "Se7en" /
+    "Seven" via the original title) or disagree on the release year by one, so an
+    export's exact "Title (Year)" key can miss the catalog even though the movie is
+    stored. The index maps the normalized title and the original title, under the key's
+    year and the release date's year, to the stored keys; a match is only used when it
+    identifies a single movie (one `tmdb_id`), otherwise TMDb decides.
+
+    It also keeps a Letterboxd URI to `tmdb_id` map learned from uploads and persisted
+    in the "letterboxd-ids" collection, which identifies a film however it is titled.
+
+    Both are bounded: the index holds the TITLE_INDEX_MAX_MOVIES most recently updated
+    movies and the TITLE_INDEX_MAX_URIS most recently used URIs, dropping the oldest
+    first. The initial load runs in a background thread of each process that uses the
+    index (never in a request, and never in a preloading gunicorn master, where the
+    dicts would not stay shared); after it, syncs only read documents changed since
+    the watermark. URIs from uploads are learned by a single background thread too
+    (`learn_later`), however many uploads hand them over.
+    """
+
+    def __init__(self, database, sync_interval: float = TITLE_INDEX_SYNC_INTERVAL,
+                 year_tolerance: int = TITLE_INDEX_YEAR_TOLERANCE,
+                 max_movies: int = TITLE_INDEX_MAX_MOVIES, max_uris: int = TITLE_INDEX_MAX_URIS):
+        self._db = database
+        self._sync_interval = sync_interval
+        self._year_tolerance = year_tolerance
+        self._max_movies = max_movies
+        self._max_uris = max_uris
+        # (normalized title, year) -> stored keys
+        self._names: Dict[Tuple[str, int], Set[str]] = {}
+        # Stored key -> its (normalized title, year) entries, oldest indexed first
+        self._movies: "OrderedDict[str, List[Tuple[str, int]]]" = OrderedDict()
+        # Stored key -> tmdb_id, and tmdb_id -> stored key
+        self._tmdb_ids: Dict[str, Any] = {}
+        self._keys_by_tmdb_id: Dict[Any, str] = {}
+        # Letterboxd URI -> tmdb_id, least recently used first
+        self._uris: "OrderedDict[str, Any]" = OrderedDict()
+        self._movie_watermark: Optional[datetime] = None
+        self._uri_watermark: Optional[datetime] = None
+        self._loaded = False
+        self._last_sync = 0.0
+        self._lock = threading.RLock()
+        self._loader: Optional[threading.Thread] = None
+        # Movie key -> Letterboxd URI waiting for the learner thread, oldest first
+        self._to_learn: "OrderedDict[str, str]" = OrderedDict()
+        self._learner: Optional[threading.Thread] = None
+        self._learner_pid: Optional[int] = None
+        self._learn_wakeup = threading.Event()
+        self.matches = 0
+        self.uri_matches = 0
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        self._lock = threading.RLock()
+        self._loader = None
+        # The parent's learner thread owns what was queued before the fork
+        self._to_learn = OrderedDict()
+        self._learner = None
+        self._learn_wakeup = threading.Event()
+
+    def is_loaded(self) -> bool:
+        return self._loaded
+
+    def load_in_background(self) -> None:
+        """Start the initial load in a background thread unless it is done or under way"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded or (self._loader is not None and self._loader.is_alive()):
+                return
+            self._loader = threading.Thread(target=self._load, name="title-index-load", daemon=True)
+            self._loader.start()
+
+    def _load(self) -> None:
+        try:
+            self.sync(force=True, load=True)
+        except Exception as e:
+            logger.error(f"Error loading title index: {e}")
+
+    def sync(self, force: bool = False, load: bool = False) -> int:
+        """
+        Bring the index up to date with MongoDB, reading only movies and Letterboxd URIs
+        changed since the last sync (at most every sync interval). Before the initial load
+        this only starts it in the background, unless `load` is set.
+
+        Returns:
+            Number of documents read
+        """
+        if not self._loaded and not load:
+            self.load_in_background()
+            return 0
+        if self._loaded and not force and time.time() - self._last_sync < self._sync_interval:
+            return 0
+        with self._lock:
+            if self._loaded and not force and time.time() - self._last_sync < self._sync_interval:
+                return 0
+            start_time = time.time()
+            # Newest first, so oldest-first insertion leaves the newest in the index
+            movies = self._db.get_movies_updated_since(overlapped(self._movie_watermark), INDEX_PROJECTION,
+                                                       self._max_movies)
+            uris = self._db.get_letterboxd_ids_updated_since(overlapped(self._uri_watermark), self._max_uris)
+            for movie in reversed(movies):
+                key = movie.get("title_with_year")
+                if key:
+                    self._index(key, movie)
+                self._movie_watermark = _later(self._movie_watermark, movie.get("updated_at"))
+            for document in reversed(uris):
+                self._remember_uri(document["_id"], document["tmdb_id"])
+                self._uri_watermark = _later(self._uri_watermark, document.get("updated_at"))
+            first_load = not self._loaded
+            self._loaded = True
+            self._last_sync = time.time()
+
+        if first_load:
+            elapsed = time.time() - start_time
+            logger.info(f"Indexed {len(movies)} movies and {len(uris)} Letterboxd URIs in {elapsed:.2f} seconds")
+        return len(movies) + len(uris)
+
+    def add(self, key: str, document: Dict[str, Any]) -> None:
+        """Index a movie stored by this process without waiting for the next sync"""
+        with self._lock:
+            self._index(key, document)
+
+    def _index(self, key: str, document: Dict[str, Any]) -> None:
+        """Add or re-add one stored movie as the newest, dropping the oldest over the limit (lock held)"""
+        self._drop(key)
+        names: List[Tuple[str, int]] = []
+        title, year = split_key(key)
+        if year is not None:
+            years = {year, _to_year(document.get("release_date")) or year}
+            for name in {title, document.get("original_title") or title}:
+                names.extend((name, indexed_year) for indexed_year in years)
+        # Keys rejected because the same TMDb movie is stored under this one (see database.py)
+        for alias in document.get("aliases") or ():
+            alias_title, alias_year = split_key(alias)
+            if alias_year is not None:
+                names.append((alias_title, alias_year))
+        entries = []
+        for name, name_year in names:
+            normalized = normalize_title(name)
+            if normalized:
+                self._names.setdefault((normalized, name_year), set()).add(key)
+                entries.append((normalized, name_year))
+        self._movies[key] = entries
+        tmdb_id = document.get("tmdb_id")
+        if tmdb_id is not None:
+            self._tmdb_ids[key] = tmdb_id
+            self._keys_by_tmdb_id.setdefault(tmdb_id, key)
+        while len(self._movies) > self._max_movies:
+            self._drop(next(iter(self._movies)))
+
+    def _drop(self, key: str) -> None:
+        """Remove a stored movie from the index (lock held)"""
+        for entry in self._movies.pop(key, ()):
+            keys = self._names.get(entry)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._names[entry]
+        tmdb_id = self._tmdb_ids.pop(key, None)
+        if tmdb_id is not None and self._keys_by_tmdb_id.get(tmdb_id) == key:
+            del self._keys_by_tmdb_id[tmdb_id]
+
+    def _remember_uri(self, uri: str, tmdb_id: Any) -> None:
+        """Record a URI as the most recently used, dropping the oldest over the limit (lock held)"""
+        self._uris[uri] = tmdb_id
+        self._uris.move_to_end(uri)
+        while len(self._uris) > self._max_uris:
+            self._uris.popitem(last=False)
+
+    def match(self, title: str, year: Any) -> Optional[str]:
+        """
+        Stored key for a movie titled or dated slightly differently, trying the exact
+        year first and then up to the year tolerance either side.
+
+        Returns:
+            The stored key, or None if there is no match or it is ambiguous
+        """
+        year = _to_year(year)
+        normalized = normalize_title(title)
+        if year is None or not normalized:
+            return None
+        with self._lock:
+            for distance in range(self._year_tolerance + 1):
+                candidates: Set[str] = set()
+                for candidate_year in {year - distance, year + distance}:
+                    candidates |= self._names.get((normalized, candidate_year), set())
+                movies = {self._tmdb_ids.get(candidate, candidate) for candidate in candidates}
+                if len(movies) > 1:
+                    # Remakes and namesakes: let a TMDb search pick
+                    return None
+                if movies:
+                    self.matches += 1
+                    return min(candidates)
+        return None
+
+    def tmdb_id_for_uri(self, uri: Optional[str]) -> Optional[Any]:
+        """The `tmdb_id` learned for a Letterboxd film URI, if any"""
+        if not uri:
+            return None
+        with self._lock:
+            tmdb_id = self._uris.get(uri)
+            if tmdb_id is not None:
+                self._uris.move_to_end(uri)
+                self.uri_matches += 1
+        return tmdb_id
+
+    def key_for_tmdb_id(self, tmdb_id: Any) -> Optional[str]:
+        """The stored key of the movie with this `tmdb_id`, if any"""
+        return self._keys_by_tmdb_id.get(tmdb_id)
+
+    def learn(self, uris: Dict[str, str]) -> int:
+        """
+        Record the `tmdb_id` of every key stored under exactly that key whose Letterboxd
+        URI is not known yet. Keys answered through `match` are left out: a fuzzy match
+        can be wrong, and a learned URI would keep repeating the mistake.
+
+        Args:
+            uris: Dictionary of movie key to Letterboxd film URI
+
+        Returns:
+            Number of new URIs persisted
+        """
+        with self._lock:
+            learned = {uri: self._tmdb_ids[key] for key, uri in uris.items()
+                       if uri and key in self._tmdb_ids and self._uris.get(uri) != self._tmdb_ids[key]}
+            if not learned:
+                return 0
+            for uri, tmdb_id in learned.items():
+                self._remember_uri(uri, tmdb_id)
+        self._db.add_letterboxd_ids(learned)
+        return len(learned)
+
+    def learn_later(self, uris: Dict[str, str]) -> None:
+        """
+        Queue URIs for `learn` on the learner thread, without waiting for it. The queue
+        holds at most TITLE_INDEX_MAX_URIS keys, dropping the oldest first.
+        """
+        if not uris:
+            return
+        with self._lock:
+            for key, uri in uris.items():
+                self._to_learn.pop(key, None)
+                self._to_learn[key] = uri
+            while len(self._to_learn) > self._max_uris:
+                self._to_learn.popitem(last=False)
+        self._ensure_learner()
+        self._learn_wakeup.set()
+
+    def learn_pending(self) -> int:
+        """
+        Learn every queued URI now
+
+        Returns:
+            Number of new URIs persisted
+        """
+        with self._lock:
+            uris, self._to_learn = self._to_learn, OrderedDict()
+        return self.learn(uris) if uris else 0
+
+    def _ensure_learner(self) -> None:
+        """Start the learner thread lazily, and again in a forked child where it no longer exists"""
+        if self._learner is not None and self._learner_pid == os.getpid() and self._learner.is_alive():
+            return
+        with self._lock:
+            if self._learner is not None and self._learner_pid == os.getpid() and self._learner.is_alive():
+                return
+            self._learner_pid = os.getpid()
+            self._learner = threading.Thread(target=self._run_learner, name="learn-letterboxd-ids", daemon=True)
+            self._learner.start()
+
+    def _run_learner(self) -> None:
+        while True:
+            self._learn_wakeup.wait()
+            self._learn_wakeup.clear()
+            try:
+                self.learn_pending()
+            except Exception as e:
+                logger.error(f"Error learning Letterboxd URIs: {e}")
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "movies": len(self._movies),
+            "titles": len(self._names),
+            "letterboxd_uris": len(self._uris),
+            "matches": self.matches,
+            "uri_matches": self.uri_matches,
+        }
+
+def _later(current: Optional[datetime], candidate: Any) -> Optional[datetime]:
+    if isinstance(candidate, datetime) and (current is None or candidate > current):
+        return candidate
+    return current
+
+def collect_uris(records: Iterable[Any]) -> Dict[str, str]:
+    """Movie key to Letterboxd film URI for records with both a year and a URI"""
+    return {f"{record.name} ({record.year})": record.letterboxd_uri for record in records
+            if record.year is not None and record.letterboxd_uri}
@@ -0,0 +1,342 @@
+"""
+TMDb HTTP client for MeterBoxd
+"""
+import os
+import random
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+import metrics
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-tmdb")
+
+# Load environment variables from .env file
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '..', '.env'))
+
+TMDB_API_KEY = os.getenv("TMDB_API_KEY")
+
+# Base URL of the TMDb API; point this at a local fake server for testing
+TMDB_API_URL = os.getenv("TMDB_API_URL", "https://api.themoviedb.org/3").rstrip("/")
+
+# Maximum number of TMDb requests in flight at once (also the connection pool size)
+TMDB_MAX_WORKERS = int(os.getenv("TMDB_MAX_WORKERS", "8"))
+
+# Connect and read timeouts for a single TMDb call, in seconds
+TMDB_CONNECT_TIMEOUT = float(os.getenv("TMDB_CONNECT_TIMEOUT", "3"))
+TMDB_READ_TIMEOUT = float(os.getenv("TMDB_READ_TIMEOUT", "10"))
+
+# Process-wide request rate towards TMDb (requests per second) and burst size
+TMDB_RATE_LIMIT = float(os.getenv("TMDB_RATE_LIMIT", "40"))
+TMDB_BURST = int(os.getenv("TMDB_BURST", "20"))
+
+# Retries for throttled (429), server (5xx) and connection errors, with jittered exponential backoff
+TMDB_MAX_RETRIES = int(os.getenv("TMDB_MAX_RETRIES", "3"))
+TMDB_BACKOFF_BASE = float(os.getenv("TMDB_BACKOFF_BASE", "0.5"))
+TMDB_MAX_BACKOFF = float(os.getenv("TMDB_MAX_BACKOFF", "10"))
+
+# Consecutive failed calls before the circuit opens, and seconds before a trial call is allowed
+TMDB_BREAKER_THRESHOLD = int(os.getenv("TMDB_BREAKER_THRESHOLD", "5"))
+TMDB_BREAKER_RESET = float(os.getenv("TMDB_BREAKER_RESET", "30"))
+
+class TMDBUnavailableError(Exception):
+    """Raised when TMDb cannot be reached: retries exhausted or circuit open"""
+
+class TokenBucket:
+    """Thread-safe token bucket; `acquire` blocks until a token is available"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing dependency.
+
+    After `threshold` consecutive failures the circuit opens and `allow` returns
+    False. Once `reset_timeout` seconds have passed a single trial call is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        return self.state != self.CLOSED
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.threshold:
+                if self.state != self.OPEN:
+                    logger.error(f"TMDb circuit opened after {self._failures} consecutive failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+rate_limiter = TokenBucket(TMDB_RATE_LIMIT, TMDB_BURST)
+breaker = CircuitBreaker(TMDB_BREAKER_THRESHOLD, TMDB_BREAKER_RESET)
+
+_session: Optional[requests.Session] = None
+
+def _reset_session() -> None:
+    """Pooled connections must not be shared with a forked child"""
+    global _session
+    _session = None
+
+os.register_at_fork(after_in_child=_reset_session)
+
+def get_session() -> requests.Session:
+    """Shared session so TMDb calls reuse keep-alive connections"""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TMDB_MAX_WORKERS)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
+def _backoff_delay(attempt: int, response: Optional[requests.Response] = None) -> float:
+    """Full-jitter exponential backoff, raised to the server's Retry-After when present"""
+    delay = random.uniform(0, min(TMDB_MAX_BACKOFF, TMDB_BACKOFF_BASE * (2 ** attempt)))
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), TMDB_MAX_BACKOFF))
+            except ValueError:
+                pass
+    return delay
+
+def _get(path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rate-limited GET against the TMDb API with retries and circuit breaking.
+
+    Raises:
+        TMDBUnavailableError: If the circuit is open or all retries failed
+        requests.HTTPError: For non-retryable client errors (e.g. an invalid API key)
+    """
+    last_error: Optional[Exception] = None
+    for attempt in range(TMDB_MAX_RETRIES + 1):
+        if not breaker.allow():
+            if last_error is not None:
+                # A failed half-open trial must re-open the circuit rather than leave it half-open
+                breaker.record_failure()
+            raise TMDBUnavailableError("TMDb circuit is open")
+        rate_limiter.acquire()
+
+        response = None
+        try:
+            with metrics.time_tmdb(path):
+                response = get_session().get(
+                    f"{TMDB_API_URL}{path}",
+                    params=params,
+                    timeout=(TMDB_CONNECT_TIMEOUT, TMDB_READ_TIMEOUT)
+                )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            last_error = e
+        else:
+            if response.status_code == 429 or response.status_code >= 500:
+                last_error = requests.HTTPError(f"TMDb returned {response.status_code}", response=response)
+            else:
+                # Any other response means TMDb is reachable
+                breaker.record_success()
+                response.raise_for_status()
+                return response.json()
+
+        if attempt < TMDB_MAX_RETRIES:
+            delay = _backoff_delay(attempt, response)
+            logger.warning(f"TMDb call failed ({last_error}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    breaker.record_failure()
+    raise TMDBUnavailableError(f"TMDb call failed after {TMDB_MAX_RETRIES + 1} attempts: {last_error}")
+
+def search_movie(title: str, year: Any) -> Dict[str, Any]:
+    """
+    Search TMDb for a movie by title and year.
+
+    Returns:
+        The full API response for the first matching movie, or empty dict if not found
+    """
+    if not TMDB_API_KEY:
+        raise ValueError("TMDB_API_KEY is not set!")
+
+    params = {
+        "api_key": TMDB_API_KEY,
+        "query": title,
+        "year": str(year),
+    }
+    data = _get("/search/movie", params)
+    if not data["results"]:
+        # No matching movie found
+        return {}
+
+    # Return the first matching movie's full data
+    return data["results"][0]
+
+def get_movie(tmdb_id: Any) -> Dict[str, Any]:
+    """
+    Fetch a movie by its TMDb id, skipping the search for films whose id is already known.
+
+    Returns:
+        The movie details, or empty dict if TMDb has no movie with this id
+    """
+    if not TMDB_API_KEY:
+        raise ValueError("TMDB_API_KEY is not set!")
+
+    try:
+        return _get(f"/movie/{int(tmdb_id)}", {"api_key": TMDB_API_KEY})
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return {}
+        raise
+
+def search_movies(titles: List[Tuple[str, str, Any]],
+                  on_progress: Optional[Callable[[int], None]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Search TMDb for many movies concurrently.
+    At most TMDB_MAX_WORKERS requests are in flight, all sharing one connection pool.
+    Titles that could not be fetched because TMDb is unavailable are left out of
+    the result so callers can fall back to cached-only data.
+
+    Args:
+        titles: List of (key, title, year) tuples
+        on_progress: Called with the number of searches finished so far as each one completes
+
+    Returns:
+        Dictionary keyed by `key` with the first matching movie, or empty dict if not found
+    """
+    return _fetch_all([(key, (title, year)) for key, title, year in titles],
+                      lambda arguments: search_movie(*arguments), on_progress, "searched")
+
+def get_movies(ids: List[Tuple[str, Any]],
+               on_progress: Optional[Callable[[int], None]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch many movies by TMDb id concurrently, with the same limits and fallbacks as `search_movies`.
+
+    Args:
+        ids: List of (key, tmdb_id) tuples
+        on_progress: Called with the number of lookups finished so far as each one completes
+
+    Returns:
+        Dictionary keyed by `key` with the movie details, or empty dict if not found
+    """
+    return _fetch_all(ids, get_movie, on_progress, "fetched by id")
+
+def _fetch_all(items: List[Tuple[str, Any]], fetch_one: Callable[[Any], Dict[str, Any]],
+               on_progress: Optional[Callable[[int], None]], label: str) -> Dict[str, Dict[str, Any]]:
+    """Run `fetch_one` over (key, argument) pairs on the shared worker pool; see `search_movies`"""
+    if not items:
+        return {}
+    if not TMDB_API_KEY:
+        raise ValueError("TMDB_API_KEY is not set!")
+
+    finished = 0
+    progress_lock = threading.Lock()
+
+    def fetch(item: Tuple[str, Any]) -> Optional[Dict[str, Any]]:
+        nonlocal finished
+        try:
+            return fetch_one(item[1])
+        except TMDBUnavailableError:
+            return None
+        finally:
+            if on_progress is not None:
+                with progress_lock:
+                    finished += 1
+                    on_progress(finished)
+
+    start_time = time.time()
+    workers = min(TMDB_MAX_WORKERS, len(items))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tmdb") as executor:
+        results = executor.map(fetch, items)
+        found = {key: result for (key, _), result in zip(items, results) if result is not None}
+
+    elapsed = time.time() - start_time
+    logger.info(f"Movies {label} on TMDb: {len(found)} in {elapsed:.2f} seconds with {workers} workers")
+    if len(found) < len(items):
+        logger.warning(f"TMDb unavailable for {len(items) - len(found)} movies, serving cached data only")
+    return found
+
+def movie_record(full_api_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a TMDb search result or movie details to the movie record stored in MongoDB.
+
+    Returns:
+        The movie record, without its key and timestamps
+    """
+    # Extract the values we need
+    public_rating = full_api_data.get("vote_average", 0.0) / 2.0  # Convert TMDB 10-point to 5-point scale
+    vote_count = full_api_data.get("vote_count", 0.0)
+    popularity = full_api_data.get("popularity", 0.0)
+
+    movie_data = {
+        # Our processed values (what we actually use)
+        "public_rating": public_rating,
+        "vote_count": vote_count,
+        "popularity": popularity,
+        
+        # Additional TMDB fields that might be useful later
+        "tmdb_id": full_api_data.get("id"),
+        "original_title": full_api_data.get("original_title"),
+        "overview": full_api_data.get("overview"),
+        "poster_path": full_api_data.get("poster_path", ""),
+        "backdrop_path": full_api_data.get("backdrop_path", ""),
+        # Search results carry genre ids, movie details full genre objects
+        "genre_ids": full_api_data.get("genre_ids") or [genre["id"] for genre in full_api_data.get("genres", [])],
+        "release_date": full_api_data.get("release_date", ""),
+        "original_language": full_api_data.get("original_language", ""),
+        "adult": full_api_data.get("adult", False),
+        "video": full_api_data.get("video", False),
+        
+        # Store original unprocessed rating for reference
+        "tmdb_vote_average": full_api_data.get("vote_average", 0.0)
+    }
+    
+    return movie_data
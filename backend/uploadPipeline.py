@@ -0,0 +1,334 @@
+"""
+Letterboxd export processing shared by synchronous uploads and upload jobs
+"""
+import os
+import io
+import time
+import hashlib
+import zipfile
+import logging
+from dataclasses import asdict
+from typing import IO, Any, Callable, Dict, NamedTuple, Optional, Tuple
+from csvReader import iter_diary, iter_ratings, load_ratings_csv, read_username, RATINGS_COLUMNS  # pandas is only imported on use
+from resultCache import ResultCache, RESULT_CACHE_ENABLED
+from summaries import ProfileSummary, SUMMARY_ENABLED, load_summary, profile_id, save_summary
+import metrics
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-uploads")
+
+# The most an uploaded ZIP may expand to, in bytes
+UPLOAD_MAX_EXTRACTED_BYTES = int(os.getenv("UPLOAD_MAX_EXTRACTED_BYTES", str(100 * 1024 * 1024)))
+
+# How ratings.csv is parsed: "pandas" builds a DataFrame for the vectorized stats path,
+# "stream" yields typed rows without one (see benchmark_ratings_reader.py)
+RATINGS_READER = os.getenv("RATINGS_READER", "pandas").lower()
+
+# Longest movie lists a request may ask for (e.g. for a "see more" view)
+MAX_LIST_SIZE = int(os.getenv("MAX_LIST_SIZE", "50"))
+
+# Export files read besides ratings.csv, and the reader for each
+EXPORT_FILES = {
+    "diary.csv": iter_diary,
+    "reviews.csv": iter_diary,
+    "watched.csv": iter_ratings,
+    "watchlist.csv": iter_ratings,
+}
+
+# Response section for each key of `stats.analyze_export`'s result
+_RESPONSE_SECTIONS = {
+    "rating": "rating_stats",
+    "obscurity": "obscurity_stats",
+    "activity": "activity_stats",
+    "library": "library_stats",
+}
+
+# Part of every result cache key; bump it when the response format or the stats change
+# so that results cached by older code are not served
+RESULT_SCHEMA_VERSION = "1"
+
+result_cache = ResultCache()
+
+class ExportError(ValueError):
+    """The upload is not a usable Letterboxd export; the message is safe to show to the user"""
+
+class UploadResult(NamedTuple):
+    """Response body for an upload, its ETag, and whether it came from the result cache"""
+    response: Dict[str, Any]
+    etag: Optional[str]
+    cached: bool
+
+def find_export_file(zip_contents: zipfile.ZipFile, name: str) -> Optional[str]:
+    """
+    Locate a file of the Letterboxd export by name. Exports also keep deleted and
+    orphaned entries in subfolders with the same file names, so the shallowest match wins.
+    """
+    matches = [filename for filename in zip_contents.namelist()
+               if filename.lower().rsplit("/", 1)[-1] == name]
+    return min(matches, key=lambda filename: filename.count("/")) if matches else None
+
+def open_export(upload: IO[bytes]) -> zipfile.ZipFile:
+    """
+    Open an uploaded export in place (only its central directory is read up front) and validate it.
+
+    Raises:
+        ExportError: If the file is not a ZIP, is unsafe to extract or has no ratings.csv
+    """
+    try:
+        zip_contents = zipfile.ZipFile(upload)
+    except zipfile.BadZipFile:
+        raise ExportError("Invalid ZIP file")
+
+    # Security: Check for zip bombs and directory traversal
+    total_extracted_size = 0
+    for file_info in zip_contents.infolist():
+        # Check for directory traversal attacks
+        if '..' in file_info.filename or file_info.filename.startswith('/'):
+            raise ExportError("Invalid file path in ZIP")
+
+        # Check for zip bombs (files that expand too much)
+        total_extracted_size += file_info.file_size
+        if total_extracted_size > UPLOAD_MAX_EXTRACTED_BYTES:
+            raise ExportError("ZIP contents too large")
+
+    # Letterboxd exports contain a ratings.csv file that we need to process
+    if find_export_file(zip_contents, "ratings.csv") is None:
+        raise ExportError("ratings.csv not found in ZIP archive")
+    return zip_contents
+
+def read_export(zip_contents: zipfile.ZipFile) -> Tuple[Any, Dict[str, list]]:
+    """
+    Parse the export's CSV files.
+
+    Returns:
+        (ratings as a DataFrame or `RatingRecord` list, {file name: records} for the other files found)
+
+    Raises:
+        ExportError: If the export has no ratings.csv
+    """
+    filename = find_export_file(zip_contents, "ratings.csv")
+    if filename is None:
+        raise ExportError("ratings.csv not found in ZIP archive")
+    # Decompress the member as it is parsed, keeping only the columns the stats use
+    with zip_contents.open(filename) as csvfile:
+        if RATINGS_READER == "pandas":
+            ratings_data = load_ratings_csv(csvfile, columns=RATINGS_COLUMNS)
+        else:
+            ratings_data = list(iter_ratings(csvfile))
+
+    # The rest of the export is optional; older exports or partial archives may lack any of it
+    extra_files = {}
+    for name, reader in EXPORT_FILES.items():
+        filename = find_export_file(zip_contents, name)
+        if filename is not None:
+            with zip_contents.open(filename) as csvfile:
+                extra_files[name] = list(reader(csvfile))
+    return ratings_data, extra_files
+
+def read_profile_summary(zip_contents: zipfile.ZipFile, metric_names) -> Optional[ProfileSummary]:
+    """
+    The stored summary for the export's profile (a new, empty one on a first upload),
+    or None if the export has no profile.csv to identify the user by.
+    """
+    filename = find_export_file(zip_contents, "profile.csv")
+    if filename is None:
+        return None
+    with zip_contents.open(filename) as csvfile:
+        username = read_username(csvfile)
+    if username is None:
+        return None
+    profile = profile_id(username)
+    return load_summary(profile) or ProfileSummary(profile, metric_names)
+
+def fingerprint_export(zip_contents: zipfile.ZipFile) -> str:
+    """
+    Hash the content of every analyzed file of an export.
+
+    The hash is normalized so that the same data exported again matches: a BOM,
+    line endings, surrounding whitespace and the order of rows are ignored. Rows
+    are hashed one by one and combined with an order-independent sum, so the files
+    are streamed rather than held in memory.
+    """
+    digest = hashlib.sha256(RESULT_SCHEMA_VERSION.encode())
+    for name in ("ratings.csv", *EXPORT_FILES):
+        filename = find_export_file(zip_contents, name)
+        if filename is None:
+            continue
+        with zip_contents.open(filename) as member:
+            lines = io.TextIOWrapper(member, encoding="utf-8-sig", errors="replace")
+            header = next(lines, "").strip()
+            rows_sum = 0
+            rows = 0
+            for line in lines:
+                line = line.strip()
+                if line:
+                    rows_sum += int.from_bytes(hashlib.blake2b(line.encode(), digest_size=16).digest(), "big")
+                    rows += 1
+        digest.update(f"{name}\n{header}\n{rows}\n{rows_sum % (1 << 128):032x}\n".encode())
+    return digest.hexdigest()
+
+def build_response(results: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert `analyze_export` results (complete or partial) to the JSON body sent to the frontend.
+    """
+    response: Dict[str, Any] = {}
+    if "rating" in results:
+        avg_rating_diff, underrated_list, overrated_list = results["rating"]
+        response["rating_stats"] = {
+            "average_rating_difference": avg_rating_diff,
+            "underrated_movies": [asdict(movie) for movie in underrated_list],
+            "overrated_movies": [asdict(movie) for movie in overrated_list]
+        }
+    if "obscurity" in results:
+        obscurity_score, most_obscure_list, least_obscure_list = results["obscurity"]
+        response["obscurity_stats"] = {
+            "obscurity_score": obscurity_score,
+            "most_obscure_movies": [asdict(movie) for movie in most_obscure_list],
+            "least_obscure_movies": [asdict(movie) for movie in least_obscure_list]
+        }
+    for key in ("activity", "library"):
+        if key in results:
+            response[_RESPONSE_SECTIONS[key]] = results[key]
+    return response
+
+def process_export(upload: IO[bytes],
+                   progress: Optional[Callable[[int, int, Dict[str, Any]], None]] = None,
+                   list_size: Optional[int] = None) -> UploadResult:
+    """
+    Validate, parse and analyze an uploaded export, answering from the result cache when
+    the same export was analyzed against the same data for its films before.
+
+    Args:
+        upload: Seekable file holding the ZIP
+        progress: Called with (films resolved, distinct films, partial response) while resolving
+        list_size: Movies in each list of the response (defaults to `stats.LIST_SIZE`)
+
+    Returns:
+        The response body with its ETag (None if the result was not cached)
+
+    Raises:
+        ExportError: If the upload is not a usable export
+    """
+    # Imported here so that loading the app does not wait for pandas and MongoDB
+    from stats import analyze_export, export_titles, METRICS, LIST_SIZE
+    from publicMovieData import load_cache, movie_data_version
+
+    request_start = time.time()
+    metrics.upload_bytes.observe(upload.seek(0, io.SEEK_END))
+    upload.seek(0)
+    zip_contents = open_export(upload)
+    list_size = LIST_SIZE if list_size is None else list_size
+
+    ratings_data, extra_files = read_export(zip_contents)
+    export_files: Dict[str, Any] = {
+        "diary": extra_files.get("diary.csv", ()),
+        "watched": extra_files.get("watched.csv", ()),
+        "reviews": extra_files.get("reviews.csv", ()),
+        "watchlist": extra_files.get("watchlist.csv", ()),
+    }
+
+    fingerprint = None
+    if RESULT_CACHE_ENABLED:
+        # Results are keyed by the data held for the export's own films, so changes to other
+        # films leave them valid; a film this process does not know yet can't be answered here
+        titles = export_titles(ratings_data, **export_files)
+        load_cache()
+        data_version = movie_data_version(titles)
+        if data_version is not None:
+            fingerprint = fingerprint_export(zip_contents)
+            cache_key = f"{fingerprint}:{list_size}:{data_version}"
+            cached = result_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Answered upload from the result cache")
+                metrics.upload_processing.labels("cached").observe(time.time() - request_start)
+                return UploadResult(cached, _etag(cache_key), True)
+
+    # Returning users only pay for the ratings that changed since their last upload
+    summary = read_profile_summary(zip_contents, list(METRICS)) if SUMMARY_ENABLED else None
+
+    # TMDb traffic is bounded by the process-wide rate limiter and circuit breaker
+    # in tmdbClient, so large exports no longer need a row cap
+
+    # Calculate processing time
+    start_time = time.time()
+
+    # Calculate statistics (every distinct film across the export is resolved once)
+    results = analyze_export(
+        ratings_data,
+        **export_files,
+        progress=(lambda done, total, partial: progress(done, total, build_response(partial)))
+        if progress is not None else None,
+        summary=summary,
+        list_size=list_size
+    )
+    if summary is not None:
+        save_summary(summary)
+
+    # Log timing and data source statistics
+    elapsed = time.time() - start_time
+    extra_rows = sum(len(records) for records in extra_files.values())
+    logger.info(f"Processed {len(ratings_data)} ratings and {extra_rows} other export rows "
+                f"in {elapsed:.2f} seconds")
+
+    metrics.upload_ratings.observe(len(ratings_data))
+    metrics.upload_processing.labels("computed").observe(time.time() - request_start)
+
+    response = build_response(results)
+    if not RESULT_CACHE_ENABLED:
+        return UploadResult(response, None, False)
+    # A film still unknown after resolving was served without data (TMDb or MongoDB
+    # unavailable); such a degraded result is not cached
+    data_version = movie_data_version(titles)
+    if data_version is None:
+        logger.info("Not caching the upload result: some films could not be resolved")
+        return UploadResult(response, None, False)
+    cache_key = f"{fingerprint or fingerprint_export(zip_contents)}:{list_size}:{data_version}"
+    result_cache.put(cache_key, response)
+    return UploadResult(response, _etag(cache_key), False)
+
+def _etag(cache_key: str) -> str:
+    return hashlib.blake2b(cache_key.encode(), digest_size=16).hexdigest()
+
+def parse_list_size(value: Optional[str]) -> Optional[int]:
+    """
+    Validate a requested list size.
+
+    Returns:
+        The size, or None if none was requested
+
+    Raises:
+        ExportError: If the value is not a whole number from 1 to MAX_LIST_SIZE
+    """
+    if value is None or value == "":
+        return None
+    try:
+        list_size = int(value)
+    except ValueError:
+        list_size = 0
+    if not 1 <= list_size <= MAX_LIST_SIZE:
+        raise ExportError(f"list_size must be a whole number from 1 to {MAX_LIST_SIZE}")
+    return list_size
+
+def describe_error(error: Exception) -> Tuple[str, int]:
+    """
+    User-facing message and HTTP status for an error raised while processing an upload.
+    Internal details are logged, never returned.
+    """
+    if isinstance(error, ExportError):
+        return str(error), 400
+    if isinstance(error, ValueError):
+        error_message = str(error)
+        logger.warning(f"Validation error: {error_message}")
+
+        # Provide specific error messages for known issues
+        if "TMDB_API_KEY is not set" in error_message:
+            return "Movie database service is temporarily unavailable. Please try again later.", 503
+        elif "not found" in error_message.lower() or "invalid" in error_message.lower():
+            return "Invalid file format", 400
+        else:
+            return "Error processing file data", 400
+
+    logger.exception(f"Unexpected error processing upload: {str(error)}", exc_info=error)
+    return "Server error while processing file", 500
@@ -0,0 +1,184 @@
+"""
+Write-behind buffer for movie upserts
+"""
+import os
+import atexit
+import threading
+import time
+import logging
+from typing import Any, Dict, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("meterboxd-write-behind")
+
+# Buffer writes and flush them as one bulk_write; set to false to write each movie immediately
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+
+# Flush as soon as this many movies are buffered...
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "500"))
+
+# ...and otherwise at least every this many seconds
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "2"))
+
+# Writes of a movie tried before it is dropped; retries wait twice as long each time,
+# up to WRITE_BEHIND_RETRY_MAX seconds
+WRITE_BEHIND_MAX_ATTEMPTS = int(os.getenv("WRITE_BEHIND_MAX_ATTEMPTS", "8"))
+WRITE_BEHIND_RETRY_MAX = float(os.getenv("WRITE_BEHIND_RETRY_MAX", "300"))
+
+# Movies held at most; beyond this the oldest are dropped (they are fetched from TMDb again when next needed)
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+
+class WriteBehindBuffer:
+    """
+    Collects new and updated movie documents and writes them to MongoDB in batches.
+
+    A background thread flushes the buffer when a request finishes (`request_flush`),
+    when it reaches WRITE_BEHIND_MAX_BATCH documents, or every WRITE_BEHIND_INTERVAL
+    seconds. Remaining documents are flushed at interpreter shutdown.
+
+    Movies whose write failed are retried with a growing delay, each on its own so
+    that one document MongoDB keeps rejecting does not hold back the rest, and are
+    dropped after WRITE_BEHIND_MAX_ATTEMPTS attempts. The buffer holds at most
+    WRITE_BEHIND_MAX_PENDING movies, dropping the oldest first.
+    """
+
+    def __init__(self, database, max_batch: int = WRITE_BEHIND_MAX_BATCH,
+                 interval: float = WRITE_BEHIND_INTERVAL, max_attempts: int = WRITE_BEHIND_MAX_ATTEMPTS,
+                 retry_max: float = WRITE_BEHIND_RETRY_MAX, max_pending: int = WRITE_BEHIND_MAX_PENDING):
+        self._db = database
+        self._max_batch = max_batch
+        self._interval = interval
+        self._max_attempts = max_attempts
+        self._retry_max = retry_max
+        self._max_pending = max_pending
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # Failed writes so far, and when the next may be tried (time.monotonic), by key
+        self._attempts: Dict[str, int] = {}
+        self._retry_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.flushed = 0
+        self.batches = 0
+        self.dropped = 0
+        atexit.register(self.flush)
+
+    def add(self, title_with_year: str, movie_data: Dict[str, Any]) -> None:
+        """Queue a movie upsert; a later add for the same key replaces the earlier one"""
+        movie_data["title_with_year"] = title_with_year
+        with self._lock:
+            # Newer data for the key gets a fresh set of attempts, and counts as the newest
+            self._pending.pop(title_with_year, None)
+            self._forget(title_with_year)
+            self._pending[title_with_year] = movie_data
+            while len(self._pending) > self._max_pending:
+                oldest = next(iter(self._pending))
+                del self._pending[oldest]
+                self._forget(oldest)
+                self.dropped += 1
+                logger.warning(f"Write-behind buffer full; dropped unwritten movie {oldest}")
+            size = len(self._pending)
+        self._ensure_started()
+        if size >= self._max_batch:
+            self._wakeup.set()
+
+    def request_flush(self) -> None:
+        """Ask the background flusher to write everything buffered so far without waiting for it"""
+        if self._pending:
+            self._ensure_started()
+            self._wakeup.set()
+
+    def flush(self, include_retries: bool = True) -> int:
+        """
+        Write buffered movies: new ones as one unordered bulk_write, those whose write
+        failed before one at a time.
+
+        Args:
+            include_retries: Also retry failed movies still waiting out their delay
+                (the background flusher leaves them until it is over)
+
+        Returns:
+            Number of movies written
+        """
+        with self._flush_lock:
+            now = time.monotonic()
+            with self._lock:
+                batch = {key: movie_data for key, movie_data in self._pending.items()
+                         if include_retries or self._retry_at.get(key, 0.0) <= now}
+                for key in batch:
+                    del self._pending[key]
+                retries = {key: batch.pop(key) for key in list(batch) if key in self._attempts}
+            if not batch and not retries:
+                return 0
+
+            start_time = time.time()
+            failed: Dict[str, Dict[str, Any]] = {}
+            written = 0
+            if batch:
+                if self._db.add_or_update_movies_bulk(batch):
+                    written += len(batch)
+                    self.batches += 1
+                else:
+                    failed.update(batch)
+            for key, movie_data in retries.items():
+                if self._db.add_or_update_movie(key, movie_data):
+                    written += 1
+                else:
+                    failed[key] = movie_data
+
+            with self._lock:
+                for key in retries:
+                    if key not in failed and key not in self._pending:
+                        self._forget(key)
+                # Upserts are idempotent, so put back anything not superseded meanwhile and retry later
+                for key, movie_data in failed.items():
+                    if key in self._pending:
+                        continue
+                    attempts = self._attempts.get(key, 0) + 1
+                    if attempts >= self._max_attempts:
+                        self._forget(key)
+                        self.dropped += 1
+                        logger.error(f"Dropped movie {key} after {attempts} failed writes")
+                        continue
+                    self._attempts[key] = attempts
+                    self._retry_at[key] = now + min(self._interval * 2 ** attempts, self._retry_max)
+                    self._pending[key] = movie_data
+
+            self.flushed += written
+            if written:
+                elapsed = time.time() - start_time
+                logger.info(f"Flushed {written} movies to MongoDB in {elapsed*1000:.1f}ms")
+            return written
+
+    def _forget(self, key: str) -> None:
+        """Clear a key's failed attempts (lock held)"""
+        self._attempts.pop(key, None)
+        self._retry_at.pop(key, None)
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _ensure_started(self) -> None:
+        """Start the flusher thread lazily, and again in a forked child where it no longer exists"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._wakeup = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self._interval)
+            self._wakeup.clear()
+            try:
+                self.flush(include_retries=False)
+            except Exception as e:
+                logger.error(f"Write-behind flush failed: {e}")